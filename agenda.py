@@ -0,0 +1,420 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from skyfield import almanac
+
+from nucleo import EphemerisSession, SiteProfile, metricas, diferenca_angular
+
+log = logging.getLogger('rastreamento.agenda')
+
+# Critérios da sessão de observação
+ALTITUDE_MINIMA_SESSAO = 25.0       # graus; abaixo disso a massa de ar prejudica a observação
+ALTITUDE_SOL_NOITE = -12.0          # graus; a noite vai do fim ao início do crepúsculo náutico
+DURACAO_OBSERVACAO = 30 * 60        # segundos de rastreamento por alvo
+DURACAO_MINIMA_OBSERVACAO = 5 * 60  # trechos mais curtos que isso não entram no plano
+DIRETORIO_CACHE_NOITES = 'cache_noites'  # dentro do diretório das efemérides
+PASSO_POSICOES = 300.0              # segundos entre as posições usadas para ordenar os alvos
+PRAZO_PLANEJAMENTO = 1.0            # segundos de busca local; depois vale a melhor ordem achada
+PASSADAS_PLANEJAMENTO = 4           # passadas completas da busca local, no máximo
+
+# Instantes Unix; nascer/culminacao/ocaso podem ser None (astro circumpolar ou que não nasce)
+JanelasAstro = namedtuple('JanelasAstro', 'nome nascer culminacao ocaso altitude_culminacao acima')
+# inicio é a saída do POS; o rastreamento começa `apontamento` segundos depois
+Observacao = namedtuple('Observacao', 'nome inicio fim apontamento', defaults=(0.0,))
+
+def data_da_noite(instante=None, longitude=None):
+    """Data local da tarde em que começa a noite que contém o instante."""
+    instante = time.time() if instante is None else instante
+    longitude = SiteProfile.atual().longitude if longitude is None else longitude
+    # Hora solar média do local; antes do meio-dia ainda é a noite anterior
+    local = datetime.fromtimestamp(instante + longitude / 15.0 * 3600, tz=timezone.utc)
+    return (local - timedelta(hours=12)).date()
+
+# Janelas de observação da noite
+class NightScheduler:
+    """Nascer, culminação, ocaso e trechos acima da altitude mínima de cada alvo.
+
+    As buscas usam o find_discrete do Skyfield, que avalia cada função em
+    vetores de instantes. O resultado fica em cache por observador e data,
+    em memória e num JSON por noite, então só alvos novos são calculados.
+    """
+    def __init__(self, sessao=None, altitude_minima=ALTITUDE_MINIMA_SESSAO, diretorio_cache=None):
+        self._sessao = sessao
+        self.altitude_minima = altitude_minima
+        self.diretorio_cache = diretorio_cache
+        self._noites = {}  # chave -> {'noite': (inicio, fim), 'alvos': {nome: JanelasAstro}}
+        self._lock = threading.Lock()
+
+    @property
+    def sessao(self):
+        if self._sessao is None:
+            self._sessao = EphemerisSession.get()
+        return self._sessao
+
+    def data_da_sessao(self, data=None):
+        """A data pedida ou, sem ela, a da noite atual; depois do amanhecer, a da próxima noite."""
+        with self._lock:
+            return self._noite(data)[0]
+
+    def noite(self, data=None):
+        """(início, fim) da noite em instantes Unix."""
+        with self._lock:
+            _, _, noite = self._noite(data)
+            return noite['noite']
+
+    def janelas(self, nomes, data=None):
+        """JanelasAstro de cada nome (astro da sessão ou estrela já registrada nela)."""
+        with self._lock:
+            data, chave, noite = self._noite(data)
+            faltando = [nome for nome in nomes if nome not in noite['alvos']]
+            for nome in faltando:
+                inicio = time.perf_counter()
+                noite['alvos'][nome] = self._calcular_astro(nome, data, *noite['noite'])
+                metricas.registrar('agenda_janelas', time.perf_counter() - inicio)
+            if faltando:
+                self._gravar(chave, noite)
+            return {nome: noite['alvos'][nome] for nome in nomes}
+
+    def planejar(self, nomes, data=None, duracao=DURACAO_OBSERVACAO, inicio=None, movimentos=None, origem=(0.0, 0.0),
+                 prazo=PRAZO_PLANEJAMENTO):
+        """Ordem da sessão: cada alvo rastreado por até `duracao` segundos, sem sobreposição.
+
+        Guloso por prazo: entre os alvos já acima da altitude mínima vai
+        primeiro o que sai da janela antes. Com um SlewPlanner em `movimentos`
+        (partindo da posição `origem` da montagem) o tempo de apontamento entra
+        no plano e a ordem é refinada para reduzir o tempo total de POS, por no
+        máximo `prazo` segundos (cada passada custa O(n³) com n alvos).
+        Retorna uma lista de Observacao; alvos sem trecho útil ficam de fora.
+        """
+        data = self.data_da_sessao(data)  # Uma só resolução, mesmo que amanheça no meio
+        janelas = self.janelas(nomes, data)
+        noite_inicio, noite_fim = self.noite(data)
+        instante = noite_inicio if inicio is None else max(inicio, noite_inicio)
+        plano = self._por_prazo(janelas, instante, duracao)
+        if movimentos is None or instante >= noite_fim:
+            return plano
+
+        posicao = self._posicoes(list(janelas), instante, noite_fim)
+
+        def simular(ordem):
+            return self._simular(ordem, janelas, posicao, movimentos, origem, instante, duracao)
+
+        # Busca local a partir da ordem por prazo: move um alvo para outra
+        # posição enquanto isso observar mais alvos ou apontar menos tempo
+        ordem = [o.nome for o in plano] + [nome for nome in janelas if nome not in {o.nome for o in plano}]
+        melhor = simular(ordem)
+        limite = time.monotonic() + prazo
+        passadas = 0
+        melhorou = True
+        while melhorou and passadas < PASSADAS_PLANEJAMENTO:
+            melhorou = False
+            passadas += 1
+            for i in range(len(ordem)):
+                for j in range(len(ordem)):
+                    if i == j:
+                        continue
+                    if time.monotonic() > limite:
+                        log.debug("Busca local interrompida pelo prazo (%d alvos, passada %d)", len(ordem), passadas)
+                        return melhor[1]
+                    vizinha = ordem[:]
+                    vizinha.insert(j, vizinha.pop(i))
+                    resultado = simular(vizinha)
+                    if resultado[0] < melhor[0]:
+                        ordem, melhor, melhorou = vizinha, resultado, True
+        return melhor[1]
+
+    def _por_prazo(self, janelas, instante, duracao):
+        pendentes = {nome: janela.acima for nome, janela in janelas.items()}
+        plano = []
+        while pendentes:
+            # Primeiro trecho ainda útil de cada alvo a partir do instante atual
+            candidatos = []
+            for nome, trechos in pendentes.items():
+                for a, b in trechos:
+                    if b - max(a, instante) >= DURACAO_MINIMA_OBSERVACAO:
+                        candidatos.append((max(a, instante), b, nome))
+                        break
+            if not candidatos:
+                break
+            disponiveis = [c for c in candidatos if c[0] <= instante]
+            if not disponiveis:
+                instante = min(c[0] for c in candidatos)
+                continue
+            _, fim, nome = min(disponiveis, key=lambda c: c[1])
+            termino = min(instante + duracao, fim)
+            plano.append(Observacao(nome, instante, termino))
+            del pendentes[nome]
+            instante = termino
+        return plano
+
+    def _simular(self, ordem, janelas, posicao, movimentos, origem, instante, duracao):
+        # Plano e custo (-alvos observados, segundos apontando) de uma ordem fixa
+        plano = []
+        total = 0.0
+        for nome in ordem:
+            for a, b in janelas[nome].acima:
+                if b - instante < DURACAO_MINIMA_OBSERVACAO:
+                    continue
+                # Sai a tempo de chegar quando o trecho abre, não antes
+                movimento = movimentos.interceptar(origem, posicao(nome), instante)
+                partida = max(instante, a - movimento.duracao)
+                if partida > instante:
+                    movimento = movimentos.interceptar(origem, posicao(nome), partida)
+                chegada = max(partida + movimento.duracao, a)
+                if b - chegada < DURACAO_MINIMA_OBSERVACAO:
+                    continue
+                fim = min(chegada + duracao, b)
+                plano.append(Observacao(nome, partida, fim, chegada - partida))
+                total += movimento.duracao
+                # O rastreamento leva o azimute da montagem junto, sem dar a volta
+                _, azi_chegada = posicao(nome)(chegada)
+                alt_fim, azi_fim = posicao(nome)(fim)
+                origem = (alt_fim, movimento.azi + diferenca_angular(azi_fim, azi_chegada))
+                instante = fim
+                break
+        return (-len(plano), total), plano
+
+    def _posicoes(self, nomes, inicio, fim):
+        # Alt/az de cada alvo numa grade da noite, uma avaliação vetorizada por alvo
+        instantes = np.arange(inicio, fim + PASSO_POSICOES, PASSO_POSICOES)
+        t = self.sessao.tempo_unix(instantes)
+        grade = {}
+        for nome in nomes:
+            alt, azi, _ = self.sessao.altaz(nome, t)
+            grade[nome] = (alt.degrees, np.rad2deg(np.unwrap(azi.radians)))
+
+        def posicao(nome):
+            alt, azi = grade[nome]
+            return lambda instante: (float(np.interp(instante, instantes, alt)),
+                                     float(np.interp(instante, instantes, azi)) % 360.0)
+        return posicao
+
+    def _data(self):
+        return data_da_noite(longitude=self.sessao.longitude)
+
+    def _chave(self, data):
+        # Tudo o que muda as janelas: local (com elevação e refração) e critérios da noite
+        sessao = self.sessao
+        refracao = sessao.refracao
+        refracao = (f"{refracao['temperature_C']:g}C{refracao['pressure_mbar']:.0f}mbar" if refracao
+                    else "semrefracao")
+        return (f"{data.isoformat()}_{sessao.latitude:+.4f}_{sessao.longitude:+.4f}_{sessao.elevacao:.0f}m"
+                f"_{refracao}_{self.altitude_minima:g}_{ALTITUDE_SOL_NOITE:g}")
+
+    def _noite(self, data):
+        # Sem data, a noite atual; depois do amanhecer ela já passou e vale a próxima
+        if data is None:
+            data = self._data()
+            if self._noite_da_data(data)[1]['noite'][1] <= time.time():
+                data += timedelta(days=1)
+        chave, noite = self._noite_da_data(data)
+        return data, chave, noite
+
+    def _noite_da_data(self, data):
+        chave = self._chave(data)
+        noite = self._noites.get(chave)
+        if noite is None:
+            noite = self._ler(chave) or {'noite': self._calcular_noite(data), 'alvos': {}}
+            self._noites[chave] = noite
+        return chave, noite
+
+    def _dia(self, data):
+        # Meio-dia local (solar médio) da data até o do dia seguinte
+        meio_dia = datetime(data.year, data.month, data.day, 12, tzinfo=timezone.utc).timestamp()
+        meio_dia -= self.sessao.longitude / 15.0 * 3600
+        return meio_dia, meio_dia + 86400.0
+
+    def _calcular_noite(self, data):
+        sessao = self.sessao
+        sol_acima = almanac.risings_and_settings(sessao.planets, sessao.planets['sun'], sessao.topos,
+                                                 horizon_degrees=ALTITUDE_SOL_NOITE)
+
+        def sol_abaixo(t):
+            return np.logical_not(sol_acima(t))
+
+        sol_abaixo.step_days = sol_acima.step_days
+        trechos = self._trechos(sol_abaixo, *self._dia(data))
+        if not trechos:
+            meio_dia, _ = self._dia(data)
+            return (meio_dia, meio_dia)  # Sem noite escura (latitudes altas no verão)
+        return max(trechos, key=lambda trecho: trecho[1] - trecho[0])
+
+    def _calcular_astro(self, nome, data, noite_inicio, noite_fim):
+        sessao = self.sessao
+        corpo = sessao.corpo(nome)
+        dia_inicio, dia_fim = self._dia(data)
+        t0, t1 = sessao.tempo_unix([dia_inicio, dia_fim])
+
+        # Nascer e ocaso no horizonte (refração padrão) no dia que contém a noite
+        t, acima = almanac.find_discrete(t0, t1, almanac.risings_and_settings(sessao.planets, corpo, sessao.topos))
+        instantes = self._unix(t)
+        nascer = next((x for x, v in zip(instantes, acima) if v), None)
+        ocaso = next((x for x, v in zip(instantes, acima) if not v), None)
+
+        # Culminação superior: passagem para o lado oeste do meridiano
+        t, oeste = almanac.find_discrete(t0, t1, almanac.meridian_transits(sessao.planets, corpo, sessao.topos))
+        culminacoes = [i for i, v in enumerate(oeste) if v]
+        culminacao = altitude = None
+        if culminacoes:
+            meio_noite = (noite_inicio + noite_fim) / 2
+            instantes = self._unix(t)
+            i = min(culminacoes, key=lambda k: abs(instantes[k] - meio_noite))
+            culminacao = float(instantes[i])
+            altitude = float(sessao.observador.at(t[i]).observe(corpo).apparent().altaz(**sessao.refracao)[0].degrees)
+
+        # Trechos acima da altitude mínima, só dentro da noite
+        acima = []
+        if noite_fim > noite_inicio:
+            funcao = almanac.risings_and_settings(sessao.planets, corpo, sessao.topos,
+                                                  horizon_degrees=self.altitude_minima)
+            acima = self._trechos(funcao, noite_inicio, noite_fim)
+
+        return JanelasAstro(nome, None if nascer is None else float(nascer), culminacao,
+                            None if ocaso is None else float(ocaso), altitude, acima)
+
+    def _trechos(self, funcao, inicio, fim):
+        # Trechos [a, b) em que funcao(t) é verdadeira, pelas mudanças encontradas no find_discrete
+        t0, t1 = self.sessao.tempo_unix([inicio, fim])
+        t, valores = almanac.find_discrete(t0, t1, funcao)
+        trechos = []
+        aberto = inicio if funcao(t0) else None
+        for instante, valor in zip(self._unix(t), valores):
+            if valor and aberto is None:
+                aberto = float(instante)
+            elif not valor and aberto is not None:
+                trechos.append((aberto, float(instante)))
+                aberto = None
+        if aberto is not None:
+            trechos.append((aberto, fim))
+        return trechos
+
+    @staticmethod
+    def _unix(t):
+        if len(t.tt) == 0:
+            return np.empty(0)
+        return np.array([d.timestamp() for d in t.utc_datetime()])
+
+    # Cache em disco: um JSON por noite e observador
+
+    def _arquivo(self, chave):
+        diretorio = self.diretorio_cache or os.path.join(self.sessao.loader.directory, DIRETORIO_CACHE_NOITES)
+        return os.path.join(diretorio, f"noite_{chave}.json")
+
+    def _ler(self, chave):
+        try:
+            with open(self._arquivo(chave), encoding='utf-8') as f:
+                dados = json.load(f)
+        except (OSError, ValueError):
+            return None
+        alvos = {}
+        for nome, campos in dados['alvos'].items():
+            campos['acima'] = [tuple(trecho) for trecho in campos['acima']]
+            alvos[nome] = JanelasAstro(**campos)
+        return {'noite': tuple(dados['noite']), 'alvos': alvos}
+
+    def _gravar(self, chave, noite):
+        arquivo = self._arquivo(chave)
+        dados = {'noite': noite['noite'], 'alvos': {nome: j._asdict() for nome, j in noite['alvos'].items()}}
+        try:
+            os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+            temporario = arquivo + '.tmp'
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(dados, f, ensure_ascii=False)
+            os.replace(temporario, arquivo)
+        except OSError as e:
+            log.warning("Cache da noite não gravado: %s", e)
+
+def preparar_alvos(nucleo, nomes):
+    """Nomes canônicos dos alvos, com as estrelas do catálogo já registradas na sessão."""
+    alvos = []
+    for nome in nomes:
+        astro = nucleo.encontrar(nome)
+        if astro is None:
+            raise ValueError(f"astro desconhecido: {nome}")
+        if 'satelite' in astro:
+            raise ValueError(f"{astro['nome']} é um satélite: as passagens duram minutos, não entram na sessão")
+        nucleo.registrar(astro)
+        alvos.append(astro['nome'])
+    return alvos
+
+# Estados informados pela sessão
+ESTADO_AGUARDANDO = 'aguardando'
+ESTADO_APONTANDO = 'apontando'
+ESTADO_RASTREANDO = 'rastreando'
+ESTADO_PERDIDO = 'perdido'    # janela já passou quando chegou a vez do alvo
+ESTADO_FALHOU = 'falhou'      # POS recusado ou sem resposta
+ESTADO_CONCLUIDA = 'concluida'
+
+# Execução automática do plano
+class ObservingSession:
+    """Executa o plano no TrackingCore: aponta, rastreia e troca de alvo nos horários."""
+    def __init__(self, nucleo, plano, ao_mudar=None):
+        self.nucleo = nucleo
+        self.plano = list(plano)
+        self.ao_mudar = ao_mudar  # callback(observacao, estado), chamado da thread da sessão
+        self.atual = None
+        self.estado = ESTADO_AGUARDANDO
+        self._parar = threading.Event()
+        self._thread = None
+
+    @property
+    def ativa(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self.stop()
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name="sessao", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # Interrompe a sessão; o rastreamento em curso fica a cargo de quem chamou
+        self._parar.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+
+    def _informar(self, observacao, estado):
+        self.atual = observacao
+        self.estado = estado
+        log.info("Sessão: %s %s", estado, observacao.nome if observacao is not None else '')
+        if self.ao_mudar is not None:
+            self.ao_mudar(observacao, estado)
+
+    def _aguardar_ate(self, instante):
+        # True se a sessão foi interrompida antes do instante
+        return self._parar.wait(max(0.0, instante - time.time()))
+
+    def _executar(self):
+        for observacao in self.plano:
+            if time.time() >= observacao.fim:
+                self._informar(observacao, ESTADO_PERDIDO)
+                continue
+            self._informar(observacao, ESTADO_AGUARDANDO)
+            if self._aguardar_ate(observacao.inicio):
+                return
+
+            self._informar(observacao, ESTADO_APONTANDO)
+            _, _, futuro = self.nucleo.selecionar(self.nucleo.encontrar(observacao.nome))
+            while not futuro.done():
+                if self._parar.wait(0.2):
+                    return
+            if futuro.cancelled() or futuro.exception() is not None:
+                log.warning("Sessão: %s não foi apontado: %s", observacao.nome,
+                            None if futuro.cancelled() else futuro.exception())
+                self._informar(observacao, ESTADO_FALHOU)
+                continue
+
+            self.nucleo.rastrear()
+            self._informar(observacao, ESTADO_RASTREANDO)
+            if self._aguardar_ate(observacao.fim):
+                return
+
+        self.nucleo.parar()
+        self._informar(None, ESTADO_CONCLUIDA)
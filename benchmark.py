@@ -0,0 +1,260 @@
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from nucleo import (
+    TrajectoryEngine, TrackingLoop, ClosedLoopController, MotionPlanner, SegmentStreamer,
+    TelemetryBuffer, SerialReader, SerialLink, FixedTargetTransform, SiteProfile, SlewPlanner, TAXAS_RASTREAMENTO,
+    separacao_angular
+)
+from skyfield.api import Star
+from simulador import VirtualMount, LATENCIA_SERIAL
+from agenda import NightScheduler, PRAZO_PLANEJAMENTO
+
+AZIMUTH_OFFSET = SiteProfile.atual().azimuth_offset  # mesmo ajuste usado pela interface
+AMOSTRAS_RTT = 50
+TICKS_EFEMERIDES = 200
+ALVOS_FIXOS = 10000  # estrelas aleatórias na medição da transformação pré-calculada
+ALVOS_AGENDA = 80    # estrelas aleatórias numa sessão da noite (a busca local é O(n³) por passada)
+INTERVALO_AMOSTRAGEM = 0.1  # segundos entre medições do erro de apontamento
+TOLERANCIA_SEGMENTOS = 1.0  # arcsec que o RMS dos segmentos pode passar do melhor SPEED
+
+def percentis(valores):
+    valores = np.asarray(valores, dtype=float)
+    if len(valores) == 0:
+        return {'n': 0}
+    return {
+        'n': len(valores),
+        'p50': float(np.percentile(valores, 50)),
+        'p95': float(np.percentile(valores, 95)),
+        'max': float(valores.max()),
+    }
+
+# Montagem simulada já ligada a um SerialLink/SerialReader, como na interface
+class Bancada:
+    def __init__(self, latencia):
+        self.montagem = VirtualMount(latencia=latencia)
+        self.telemetria = TelemetryBuffer()
+        self.reader = SerialReader(self.telemetria)
+        self.link = SerialLink()
+        self.telemetria.assinar(self.link.processar_evento)
+        self.link.abrir(self.montagem)
+        self.reader.abrir(self.montagem)
+
+    def fechar(self):
+        self.reader.fechar()
+        self.link.fechar()
+        self.montagem.close()
+
+def medir_rtt(latencia, amostras=AMOSTRAS_RTT):
+    """Ida e volta de um SPEED até a posição informada, em texto e em quadro binário."""
+    resultado = {}
+    for binario in (False, True):
+        bancada = Bancada(latencia)
+        try:
+            if binario:
+                bancada.link.negociar().result(timeout=5)
+            tempos = []
+            for i in range(amostras):
+                inicio = time.perf_counter()
+                bancada.link.enviar_velocidade(0.0, 0.0).result(timeout=5)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            resultado['binario' if bancada.link.binario else 'texto'] = percentis(tempos)
+        finally:
+            bancada.fechar()
+    return resultado
+
+def medir_efemerides(trajetorias, alvo, ticks=TICKS_EFEMERIDES):
+    """Custo por tick (µs): duas avaliações do skyfield por astro contra a tabela interpolada."""
+    sessao = trajetorias.sessao
+    nomes = trajetorias.nomes
+
+    # Forma antiga: posição agora e daqui a 1 s para derivar a velocidade
+    inicio = time.perf_counter()
+    for _ in range(ticks // 10):
+        agora = time.time()
+        for nome in nomes:
+            sessao.altaz(nome, sessao.tempo_unix(agora))
+            sessao.altaz(nome, sessao.tempo_unix(agora + 1))
+    direto = (time.perf_counter() - inicio) / (ticks // 10) * 1e6
+
+    trajetorias.amostra(alvo)  # tabela montada fora da medição
+    inicio = time.perf_counter()
+    for _ in range(ticks):
+        trajetorias.amostra(alvo, time.time())
+    interpolado = (time.perf_counter() - inicio) / ticks * 1e6
+
+    return {'skyfield_todos_astros_us': direto, 'tabela_alvo_us': interpolado}
+
+def medir_transformacao(sessao, alvos=ALVOS_FIXOS, ticks=TICKS_EFEMERIDES):
+    """alt/az de muitas estrelas por tick: pipeline do Skyfield contra FixedTargetTransform."""
+    rng = np.random.default_rng(0)
+    estrelas = Star(ra_hours=rng.uniform(0, 24, alvos), dec_degrees=np.degrees(np.arcsin(rng.uniform(-1, 1, alvos))))
+    agora = time.time()
+
+    inicio = time.perf_counter()
+    for k in range(ticks // 20):
+        t = sessao.tempo_unix(agora + k)
+        alt, azi, _ = sessao.observador.at(t).observe(estrelas).apparent().altaz(**sessao.refracao)
+    direto = (time.perf_counter() - inicio) / (ticks // 20) * 1e3
+
+    transformacao = FixedTargetTransform(sessao, estrelas, agora)
+    inicio = time.perf_counter()
+    for k in range(ticks):
+        transformacao.altaz(agora + k)
+    matriz = (time.perf_counter() - inicio) / ticks * 1e3
+
+    # Diferença ao fim da validade, o pior caso entre duas preparações
+    fim = agora + 3600.0
+    alt, azi, _ = sessao.observador.at(sessao.tempo_unix(fim)).observe(estrelas).apparent().altaz(**sessao.refracao)
+    alt_matriz, azi_matriz = transformacao.altaz(fim)
+    acima = alt.degrees > 5
+    erro = separacao_angular(alt.degrees, azi.degrees, alt_matriz[:, 0], azi_matriz[:, 0])[acima] * 3600
+    return {'alvos': alvos, 'skyfield_ms': direto, 'matriz_ms': matriz, 'erro_max_arcsec': float(erro.max())}
+
+def medir_agenda(sessao, alvos=ALVOS_AGENDA):
+    """Tempo do plano da noite com muitos alvos: guloso por prazo contra a busca local limitada."""
+    rng = np.random.default_rng(0)
+    nomes = []
+    for i in range(alvos):
+        nome = f"Teste {i}"
+        sessao.registrar_estrela(nome, Star(ra_hours=rng.uniform(0, 24), dec_degrees=rng.uniform(-70, 20)))
+        nomes.append(nome)
+    with tempfile.TemporaryDirectory() as diretorio:
+        agenda = NightScheduler(sessao, diretorio_cache=diretorio)
+        inicio = time.perf_counter()
+        agenda.janelas(nomes)
+        janelas = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        guloso = agenda.planejar(nomes)
+        tempo_guloso = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        plano = agenda.planejar(nomes, movimentos=SlewPlanner(AZIMUTH_OFFSET))
+        tempo_busca = time.perf_counter() - inicio
+    return {'alvos': alvos, 'janelas_s': janelas, 'guloso_ms': tempo_guloso * 1000, 'busca_s': tempo_busca,
+            'observados_guloso': len(guloso), 'observados_busca': len(plano)}
+
+def medir_rastreamento(trajetorias, alvo, taxa, duracao, latencia):
+    """Roda o laço em malha fechada contra a montagem simulada e mede o erro real de apontamento."""
+    bancada = Bancada(latencia)
+    envios = [0]
+
+    def enviar(vel_alt, vel_azi):
+        envios[0] += 1
+        return bancada.link.enviar_velocidade(vel_alt, vel_azi)
+
+    controlador = ClosedLoopController(trajetorias, AZIMUTH_OFFSET)
+    bancada.telemetria.assinar(controlador.on_telemetria)
+    tracker = TrackingLoop(trajetorias, enviar, taxa, controlador)
+    resultado = acompanhar(bancada, trajetorias, alvo, tracker, duracao)
+    resultado.update(taxa=taxa, comandos_speed=envios[0])
+    return resultado
+
+def medir_segmentos(trajetorias, alvo, duracao, latencia):
+    """Mesma medição com a fila de segmentos do protocolo v2 em vez de SPEED a cada tick."""
+    bancada = Bancada(latencia)
+    bancada.link.negociar().result(timeout=5)
+    controlador = ClosedLoopController(trajetorias, AZIMUTH_OFFSET)
+    streamer = SegmentStreamer(trajetorias, bancada.link, MotionPlanner(trajetorias), AZIMUTH_OFFSET,
+                               controlador=controlador)
+    bancada.telemetria.assinar(streamer.on_telemetria)
+    resultado = acompanhar(bancada, trajetorias, alvo, streamer, duracao)
+    resultado.update(segmentos=streamer.segmentos_enviados)
+    return resultado
+
+def acompanhar(bancada, trajetorias, alvo, tracker, duracao):
+    try:
+        # Começa apontada para o alvo, como depois de um POS bem-sucedido
+        alt, azi, _, _ = trajetorias.amostra(alvo)
+        bancada.montagem.definir_posicao(alt, azi + AZIMUTH_OFFSET)
+
+        erros = []
+        cpu_inicio = time.process_time()
+        inicio = time.monotonic()
+        tracker.start(alvo)
+        while time.monotonic() - inicio < duracao:
+            time.sleep(INTERVALO_AMOSTRAGEM)
+            real_alt, real_azi = bancada.montagem.posicao_real()
+            alt, azi, _, _ = trajetorias.amostra(alvo)
+            erro = float(separacao_angular(alt, azi, real_alt, real_azi - AZIMUTH_OFFSET))
+            erros.append((time.monotonic() - inicio, erro * 3600))
+        tracker.stop()
+        cpu = time.process_time() - cpu_inicio
+        parede = time.monotonic() - inicio
+        trafego = bancada.montagem.bytes_recebidos
+    finally:
+        tracker.stop()
+        bancada.fechar()
+
+    arcsec = np.array([e for _, e in erros])
+    return {
+        'bytes_por_segundo': trafego / parede,
+        'erro_rms_arcsec': float(np.sqrt(np.mean(arcsec ** 2))),
+        'erro_max_arcsec': float(arcsec.max()),
+        'erro_final_arcsec': float(arcsec[-1]),
+        'cpu_percentual': 100 * cpu / parede,
+        'serie_erro': erros,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do rastreamento contra a montagem simulada")
+    parser.add_argument('--alvo', default='Saturno')
+    parser.add_argument('--taxas', type=float, nargs='+', default=TAXAS_RASTREAMENTO)
+    parser.add_argument('--duracao', type=float, default=30.0, help="segundos de rastreamento por taxa")
+    parser.add_argument('--latencia', type=float, default=LATENCIA_SERIAL, help="atraso da serial em segundos")
+    parser.add_argument('--json', help="grava os resultados (com a série de erro) neste arquivo")
+    args = parser.parse_args()
+
+    trajetorias = TrajectoryEngine()
+    resultados = {'alvo': args.alvo, 'latencia_serial': args.latencia}
+
+    resultados['rtt_ms'] = medir_rtt(args.latencia)
+    for modo, r in resultados['rtt_ms'].items():
+        print(f"RTT {modo}: p50 {r['p50']:.2f} ms | p95 {r['p95']:.2f} ms | max {r['max']:.2f} ms")
+
+    resultados['efemerides'] = medir_efemerides(trajetorias, args.alvo)
+    print("Efemérides por tick: skyfield {skyfield_todos_astros_us:.0f} µs | tabela {tabela_alvo_us:.1f} µs".format(
+        **resultados['efemerides']))
+
+    resultados['transformacao'] = medir_transformacao(trajetorias.sessao)
+    print("{alvos} alvos fixos por tick: skyfield {skyfield_ms:.1f} ms | matriz {matriz_ms:.2f} ms | "
+          "diferença máx. {erro_max_arcsec:.2f}\" após 1 h".format(**resultados['transformacao']))
+
+    resultados['agenda'] = r = medir_agenda(trajetorias.sessao)
+    print(f"Agenda com {r['alvos']} alvos: janelas {r['janelas_s']:.1f} s | guloso {r['guloso_ms']:.1f} ms "
+          f"({r['observados_guloso']} alvos, sem apontamento) | busca local {r['busca_s']:.2f} s ({r['observados_busca']} alvos)")
+    if r['busca_s'] > 2 * PRAZO_PLANEJAMENTO:
+        print(f"⚠️ Busca local passou do prazo ({PRAZO_PLANEJAMENTO:g} s)")
+
+    resultados['rastreamento'] = []
+    for taxa in args.taxas:
+        r = medir_rastreamento(trajetorias, args.alvo, taxa, args.duracao, args.latencia)
+        resultados['rastreamento'].append(r)
+        print(f"{taxa:g} Hz: erro RMS {r['erro_rms_arcsec']:.1f}\" | max {r['erro_max_arcsec']:.1f}\" | "
+              f"final {r['erro_final_arcsec']:.1f}\" | {r['comandos_speed']} SPEED | "
+              f"{r['bytes_por_segundo']:.0f} B/s | CPU {r['cpu_percentual']:.1f}%")
+
+    r = resultados['segmentos'] = medir_segmentos(trajetorias, args.alvo, args.duracao, args.latencia)
+    print(f"Segmentos: erro RMS {r['erro_rms_arcsec']:.1f}\" | max {r['erro_max_arcsec']:.1f}\" | "
+          f"final {r['erro_final_arcsec']:.1f}\" | {r['segmentos']} SEG | "
+          f"{r['bytes_por_segundo']:.0f} B/s | CPU {r['cpu_percentual']:.1f}%")
+
+    # O modo de segmentos não pode apontar pior que o SPEED a cada tick
+    if resultados['rastreamento']:
+        melhor = min(resultados['rastreamento'], key=lambda x: x['erro_rms_arcsec'])
+        resultados['segmentos_ok'] = r['erro_rms_arcsec'] <= melhor['erro_rms_arcsec'] + TOLERANCIA_SEGMENTOS
+        if not resultados['segmentos_ok']:
+            print(f"⚠️ Segmentos com erro RMS acima do SPEED a {melhor['taxa']:g} Hz "
+                  f"({melhor['erro_rms_arcsec']:.1f}\")")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
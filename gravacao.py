@@ -0,0 +1,344 @@
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from nucleo import (
+    TrajectoryEngine, EphemerisSession, ClosedLoopController, TelemetryEvent, EVENTO_RECEBIDO, EVENTO_POSICAO,
+    EVENTO_POSICAO_ATUAL, EVENTO_ERRO, SiteProfile, metricas, diferenca_angular
+)
+
+log = logging.getLogger('rastreamento.gravacao')
+
+# Gravação da sessão: blocos .npz com uma coluna por campo, só acrescentados
+VERSAO_GRAVACAO = 1
+BLOCO_GRAVACAO = 4096        # registros por bloco (memória fixa do gravador)
+INTERVALO_GRAVACAO = 5.0     # segundos; um bloco incompleto vai para o disco depois disso
+FILA_GRAVACAO = 8            # blocos aguardando a escrita; além disso são descartados
+ARQUIVO_SESSAO = 'sessao.json'
+PADRAO_BLOCO = 'bloco-{:06d}.npz'
+GLOB_BLOCOS = 'bloco-*.npz'
+# Campo do SiteProfile -> chave nos metadados da gravação
+CAMPOS_LOCAL = {'nome': 'local', 'latitude': 'latitude', 'longitude': 'longitude', 'elevacao': 'elevacao',
+                'temperatura': 'temperatura', 'pressao': 'pressao', 'azimuth_offset': 'azimuth_offset'}
+
+# Tipo de cada registro. Ticks: alvo previsto (alt/azi do céu), taxas, comando e erro.
+# 'pos' e 'seg': comandos enviados. Eventos: posição informada (referencial da montagem)
+TIPOS_GRAVACAO = ('speed', 'segmentos', 'pos', 'seg',
+                  EVENTO_RECEBIDO, EVENTO_POSICAO, EVENTO_POSICAO_ATUAL, EVENTO_ERRO)
+CODIGO_TIPO = {tipo: codigo for codigo, tipo in enumerate(TIPOS_GRAVACAO)}
+TIPOS_TICK = ('speed', 'segmentos')
+EVENTOS_GRAVADOS = (EVENTO_RECEBIDO, EVENTO_POSICAO, EVENTO_POSICAO_ATUAL, EVENTO_ERRO)
+
+# Registro de largura fixa (57 bytes); campos ausentes ficam NaN e alvo -1
+REGISTRO_GRAVACAO = np.dtype([
+    ('instante', 'f8'),   # Unix; nos 'seg', o início do segmento
+    ('tipo', 'u1'),       # índice em TIPOS_GRAVACAO
+    ('alvo', 'i2'),       # índice na lista de alvos da gravação
+    ('alt', 'f8'),
+    ('azi', 'f8'),
+    ('vel_alt', 'f4'),    # graus/s
+    ('vel_azi', 'f4'),
+    ('cmd_alt', 'f4'),    # velocidade comandada pela malha fechada
+    ('cmd_azi', 'f4'),
+    ('erro_alt', 'f4'),   # graus
+    ('erro_azi', 'f4'),
+    ('latencia', 'f4'),   # ida e volta estimada, segundos
+    ('periodo', 'f4'),    # período do tick ou duração do segmento
+])
+
+def _valor(snapshot, campo):
+    valor = snapshot.get(campo)
+    return np.nan if valor is None else valor
+
+# Gravador da sessão, com memória limitada
+class TelemetryRecorder:
+    """Acrescenta ticks, comandos e telemetria a um diretório de blocos colunares.
+
+    Os registros vão para um bloco pré-alocado (custo de uma atribuição por
+    registro); blocos cheios, ou mais velhos que INTERVALO_GRAVACAO, são
+    comprimidos e escritos por uma thread própria. Se o disco não acompanhar,
+    blocos são descartados e contados em `descartados`, sem travar o rastreamento.
+    """
+    def __init__(self, diretorio, metadados=None, bloco=BLOCO_GRAVACAO, intervalo=INTERVALO_GRAVACAO):
+        self.diretorio = diretorio
+        self.intervalo = intervalo
+        self.alvos = []
+        self.registros = 0
+        self.descartados = 0
+        self._indices = {}
+        self._bloco = np.empty(bloco, dtype=REGISTRO_GRAVACAO)
+        self._n = 0
+        self._inicio_bloco = None
+        self._lock = threading.Lock()
+        self._fila = queue.Queue(maxsize=FILA_GRAVACAO)
+
+        # Gravar de novo no mesmo diretório continua a numeração dos blocos
+        os.makedirs(diretorio, exist_ok=True)
+        self._proximo = len(glob.glob(os.path.join(diretorio, GLOB_BLOCOS)))
+        caminho = os.path.join(diretorio, ARQUIVO_SESSAO)
+        if not os.path.exists(caminho):
+            with open(caminho, 'w', encoding='utf-8') as f:
+                json.dump(dict(metadados or {}, versao=VERSAO_GRAVACAO, inicio=time.time(),
+                               tipos=list(TIPOS_GRAVACAO)), f, indent=2, ensure_ascii=False)
+
+        self._thread = threading.Thread(target=self._escrever, name="gravacao", daemon=True)
+        self._thread.start()
+
+    # Registro (threads de rastreamento, de leitura e a principal)
+
+    def registrar_tick(self, snapshot, modo, periodo):
+        if snapshot['erro']:
+            return
+        self._adicionar(
+            snapshot['instante'], modo, snapshot['nome'], snapshot['altitude'], snapshot['azimute'],
+            snapshot['vel_alt'], snapshot['vel_azi'], _valor(snapshot, 'cmd_alt'), _valor(snapshot, 'cmd_azi'),
+            _valor(snapshot, 'erro_alt'), _valor(snapshot, 'erro_azi'), _valor(snapshot, 'latencia'), periodo)
+
+    def registrar_comando(self, tipo, instante, alt=np.nan, azi=np.nan, vel_alt=np.nan, vel_azi=np.nan,
+                          periodo=np.nan):
+        self._adicionar(instante, tipo, None, alt, azi, vel_alt, vel_azi, np.nan, np.nan, np.nan, np.nan,
+                        np.nan, periodo)
+
+    def on_telemetria(self, evento):
+        # Assinante da telemetria (thread de leitura)
+        if evento.tipo in EVENTOS_GRAVADOS:
+            alt = np.nan if evento.alt is None else evento.alt
+            azi = np.nan if evento.azi is None else evento.azi
+            self._adicionar(evento.instante, evento.tipo, None, alt, azi, np.nan, np.nan, np.nan, np.nan,
+                            np.nan, np.nan, np.nan, np.nan)
+
+    def _adicionar(self, instante, tipo, nome, *campos):
+        with self._lock:
+            if nome is None:
+                alvo = -1
+            else:
+                alvo = self._indices.get(nome)
+                if alvo is None:
+                    alvo = self._indices[nome] = len(self.alvos)
+                    self.alvos.append(nome)
+            self._bloco[self._n] = (instante, CODIGO_TIPO[tipo], alvo) + campos
+            self._n += 1
+            self.registros += 1
+            # Idade do bloco no relógio do host: os 'seg' levam instantes futuros
+            agora = time.monotonic()
+            if self._inicio_bloco is None:
+                self._inicio_bloco = agora
+            if self._n == len(self._bloco) or agora - self._inicio_bloco >= self.intervalo:
+                self._descarregar()
+
+    def _descarregar(self):
+        # Chamado com o lock: entrega uma cópia do bloco à thread de escrita
+        if self._n == 0:
+            return
+        try:
+            self._fila.put_nowait((self._proximo, self._bloco[:self._n].copy(), list(self.alvos)))
+            self._proximo += 1
+        except queue.Full:
+            self.descartados += self._n
+            log.warning("Gravação atrasada: %d registros descartados", self._n)
+        self._n = 0
+        self._inicio_bloco = None
+
+    def fechar(self):
+        """Escreve o bloco em aberto e espera a thread de escrita terminar."""
+        with self._lock:
+            self._descarregar()
+        self._fila.put(None)
+        self._thread.join()
+
+    def _escrever(self):
+        while True:
+            item = self._fila.get()
+            if item is None:
+                return
+            numero, registros, alvos = item
+            inicio = time.perf_counter()
+            caminho = os.path.join(self.diretorio, PADRAO_BLOCO.format(numero))
+            try:
+                # Arquivo temporário e rename: um bloco no disco está sempre completo
+                with open(caminho + '.tmp', 'wb') as f:
+                    np.savez_compressed(f, alvos=np.array(alvos, dtype=str),
+                                        **{campo: registros[campo] for campo in REGISTRO_GRAVACAO.names})
+                os.replace(caminho + '.tmp', caminho)
+            except OSError as e:
+                self.descartados += len(registros)
+                log.error("Falha ao gravar %s: %s", caminho, e)
+            metricas.registrar('gravacao', time.perf_counter() - inicio)
+
+def gravar(nucleo, diretorio):
+    """Liga um TelemetryRecorder ao núcleo e o retorna; ao terminar, `nucleo.gravar(None)` e `fechar()`."""
+    local = nucleo.trajetorias.sessao.local if nucleo.carregado else SiteProfile.atual()
+    gravador = TelemetryRecorder(diretorio, {
+        'porta': nucleo.porta,
+        'identificador': nucleo.identificador,
+        'azimuth_offset': nucleo.azimuth_offset,
+        'taxa': nucleo.laco.taxa,
+        'local': local.nome,
+        'latitude': local.latitude,
+        'longitude': local.longitude,
+        'elevacao': local.elevacao,
+        'temperatura': local.temperatura,
+        'pressao': local.pressao,
+    })
+    nucleo.gravar(gravador)
+    return gravador
+
+# Leitura de uma gravação, bloco a bloco
+class TelemetryRecording:
+    """Gravação de um TelemetryRecorder. Iterar percorre os blocos em ordem: (colunas, alvos)."""
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        caminho = os.path.join(diretorio, ARQUIVO_SESSAO)
+        if not os.path.exists(caminho):
+            raise FileNotFoundError(f"Gravação não encontrada em {diretorio}")
+        with open(caminho, encoding='utf-8') as f:
+            self.metadados = json.load(f)
+        self.tipos = tuple(self.metadados.get('tipos', TIPOS_GRAVACAO))
+        self.blocos = sorted(glob.glob(os.path.join(diretorio, GLOB_BLOCOS)))
+
+    def local(self):
+        """SiteProfile da sessão gravada; campos que a gravação não tem vêm do local atual."""
+        campos = {campo: self.metadados[chave] for campo, chave in CAMPOS_LOCAL.items() if chave in self.metadados}
+        return SiteProfile.atual()._replace(**campos)
+
+    def __iter__(self):
+        for caminho in self.blocos:
+            with np.load(caminho) as dados:
+                colunas = {campo: dados[campo] for campo in REGISTRO_GRAVACAO.names if campo in dados.files}
+                yield colunas, [str(nome) for nome in dados['alvos']]
+
+    def colunas(self, campos=None):
+        """Todas as colunas pedidas concatenadas (para análise; ocupa memória proporcional à gravação)."""
+        partes = {}
+        for colunas, _ in self:
+            for campo in campos or colunas:
+                partes.setdefault(campo, []).append(colunas[campo])
+        return {campo: np.concatenate(valores) for campo, valores in partes.items()}
+
+# Acumulador de média, RMS, máximo e tendência linear sem guardar as amostras
+class RunningStats:
+    def __init__(self):
+        self.n = 0
+        self.maximo = 0.0
+        self._soma = self._quadrados = 0.0
+        self._t = self._tt = self._te = 0.0
+        self._t0 = None
+
+    def adicionar(self, instante, valor):
+        if self._t0 is None:
+            self._t0 = instante
+        t = instante - self._t0
+        self.n += 1
+        self.maximo = max(self.maximo, abs(valor))
+        self._soma += valor
+        self._quadrados += valor * valor
+        self._t += t
+        self._tt += t * t
+        self._te += t * valor
+
+    def resumo(self):
+        if self.n == 0:
+            return {'n': 0}
+        media = self._soma / self.n
+        variancia_t = self._tt / self.n - (self._t / self.n) ** 2
+        # Inclinação por mínimos quadrados, por minuto
+        tendencia = (self._te / self.n - self._t / self.n * media) / variancia_t * 60 if variancia_t > 0 else 0.0
+        return {'n': self.n, 'media': media, 'rms': (self._quadrados / self.n) ** 0.5,
+                'max': self.maximo, 'tendencia_por_minuto': tendencia}
+
+def reproduzir(gravacao, velocidade=0.0, controlador=None, ao_registro=None):
+    """Passa a gravação de novo pelas efemérides e pela malha fechada, mais rápido que o tempo real.
+
+    Para cada tick compara o alvo gravado com o recalculado agora, visto do
+    local da gravação (deriva de efemérides), e, nos ticks de SPEED, o comando
+    gravado com o que o `controlador` atual calcularia com a mesma telemetria.
+    `velocidade` é o fator sobre o tempo real (0 = sem espera);
+    `ao_registro(tipo, nome, registro)` recebe cada registro, por exemplo para
+    animar o mapa do céu.
+    Valores em segundos de arco (e arcsec/s nos comandos).
+    """
+    local, atual = gravacao.local(), SiteProfile.atual()
+    outro_sitio = ceu_do_local(local) != ceu_do_local(atual)
+    if outro_sitio:
+        log.warning("Gravação feita em %s (%.4f°, %.4f°, %.0f m), diferente do local atual %s (%.4f°, %.4f°, %.0f m)",
+                    local.nome, local.latitude, local.longitude, local.elevacao,
+                    atual.nome, atual.latitude, atual.longitude, atual.elevacao)
+    if controlador is None:
+        # O observador é o da gravação; no mesmo local vale a sessão compartilhada
+        sessao = EphemerisSession(local=local) if outro_sitio else EphemerisSession.get()
+        controlador = ClosedLoopController(TrajectoryEngine(sessao), local.azimuth_offset)
+    trajetorias = controlador.trajetorias
+    estatisticas = {nome: RunningStats() for nome in
+                    ('erro_gravado', 'efemerides', 'comando_alt', 'comando_azi')}
+    contagem = dict.fromkeys(gravacao.tipos, 0)
+    ignorados = set()
+
+    inicio_real = time.monotonic()
+    inicio_gravacao = None
+    for colunas, alvos in gravacao:
+        for k in range(len(colunas['instante'])):
+            registro = {campo: valores[k].item() for campo, valores in colunas.items()}
+            instante = registro['instante']
+            tipo = gravacao.tipos[registro['tipo']]
+            nome = alvos[registro['alvo']] if registro['alvo'] >= 0 else None
+            contagem[tipo] += 1
+
+            if velocidade > 0 and tipo != 'seg':
+                # Mantém o ritmo relativo da gravação, acelerado (os 'seg' são agendados à frente)
+                if inicio_gravacao is None:
+                    inicio_gravacao = instante
+                espera = (instante - inicio_gravacao) / velocidade - (time.monotonic() - inicio_real)
+                if espera > 0:
+                    time.sleep(espera)
+
+            if tipo in (EVENTO_POSICAO, EVENTO_POSICAO_ATUAL):
+                controlador.on_telemetria(TelemetryEvent(tipo, instante, '', registro['alt'], registro['azi']))
+            elif tipo in TIPOS_TICK and nome is not None:
+                if nome not in trajetorias.nomes:
+                    ignorados.add(nome)  # estrela do catálogo: não está na tabela padrão
+                else:
+                    _reproduzir_tick(controlador, tipo, nome, registro, estatisticas)
+
+            if ao_registro is not None:
+                ao_registro(tipo, nome, registro)
+
+    resultado = {nome: e.resumo() for nome, e in estatisticas.items()}
+    resultado.update(registros=contagem, alvos_ignorados=sorted(ignorados),
+                     duracao_reproducao=time.monotonic() - inicio_real)
+    return resultado
+
+def ceu_do_local(local):
+    # Só o que muda o alt/az calculado (nome e azimuth_offset não mudam)
+    return (local.latitude, local.longitude, local.elevacao, local.refracao())
+
+def _reproduzir_tick(controlador, tipo, nome, registro, estatisticas):
+    instante = registro['instante']
+    cos_alt = np.cos(np.radians(registro['alt']))
+
+    # Erro de apontamento medido durante a sessão
+    if not np.isnan(registro['erro_alt']):
+        erro = np.hypot(registro['erro_alt'], registro['erro_azi'] * cos_alt) * 3600
+        estatisticas['erro_gravado'].adicionar(instante, erro)
+
+    # Alvo recalculado agora contra o gravado
+    alt, azi, _, _ = controlador.trajetorias.amostra(nome, instante)
+    desvio = np.hypot(alt - registro['alt'], diferenca_angular(azi, registro['azi']) * cos_alt) * 3600
+    estatisticas['efemerides'].adicionar(instante, desvio)
+
+    # Malha fechada atual com a mesma latência e a mesma telemetria
+    if tipo == 'speed' and not np.isnan(registro['cmd_alt']):
+        if not np.isnan(registro['latencia']):
+            controlador.latencia.rtt = registro['latencia']
+        comando = controlador.calcular(nome, instante, registro['periodo'])
+        estatisticas['comando_alt'].adicionar(instante, (comando['cmd_alt'] - registro['cmd_alt']) * 3600)
+        estatisticas['comando_azi'].adicionar(instante, (comando['cmd_azi'] - registro['cmd_azi']) * 3600)
+        if comando['enviar']:
+            # Sem Arduino na reprodução: o Future nunca conclui e a latência fica a gravada
+            controlador.registrar_envio(Future(), instante, comando['cmd_alt'], comando['cmd_azi'])
@@ -0,0 +1,2538 @@
+from skyfield.api import Loader, Topos, Star
+from skyfield.earthlib import refract, refraction
+import numpy as np
+import serial
+import time
+import threading
+import queue
+import math
+import re
+import os
+import sys
+import csv
+import json
+import logging
+import gzip
+import heapq
+import struct
+import binascii
+from collections import deque, namedtuple, Counter
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+# Local de observação e montagem: padrão (Formosa-GO) sobrescrito por um JSON
+# com qualquer subconjunto dos campos, ex.: {"nome": "Sítio", "latitude": -15.8,
+# "longitude": -47.9, "elevacao": 1100, "temperatura": 20, "azimuth_offset": 18.5}
+ARQUIVO_LOCAL = '~/skyfield-data/local.json'  # ou a variável de ambiente RASTREAMENTO_LOCAL
+LOCAL_PADRAO = {
+    'nome': 'Formosa-GO',
+    'latitude': -15.541232599693457,   # graus
+    'longitude': -47.33334646343277,   # graus
+    'elevacao': 0.0,                   # metros acima do nível do mar
+    'temperatura': None,               # °C, ou 'standard' (10 °C); None desliga a refração
+    'pressao': 'standard',             # mbar, ou 'standard' (estimada pela elevação)
+    'azimuth_offset': 21.0,            # ajuste manual do zero de azimute da montagem (graus)
+}
+
+class SiteProfile(namedtuple('SiteProfile', list(LOCAL_PADRAO), defaults=list(LOCAL_PADRAO.values()))):
+    """Local e montagem em uso. O processo inteiro usa o mesmo (ver atual())."""
+    __slots__ = ()
+    _atual = None
+
+    @classmethod
+    def carregar(cls, caminho=None):
+        # Só o arquivo padrão pode faltar (vale LOCAL_PADRAO); campos desconhecidos são erro de digitação
+        caminho = caminho or os.environ.get('RASTREAMENTO_LOCAL')
+        if caminho is None:
+            caminho = ARQUIVO_LOCAL
+            if not os.path.exists(os.path.expanduser(caminho)):
+                return cls()
+        caminho = os.path.expanduser(caminho)
+        with open(caminho, encoding='utf-8') as f:
+            campos = json.load(f)
+        desconhecidos = set(campos) - set(cls._fields)
+        if desconhecidos:
+            raise ValueError(f"{caminho}: campos desconhecidos {', '.join(sorted(desconhecidos))}")
+        local = cls(**campos)
+        log.info("Local %s (%.4f°, %.4f°, %.0f m) lido de %s",
+                 local.nome, local.latitude, local.longitude, local.elevacao, caminho)
+        return local
+
+    @classmethod
+    def atual(cls):
+        # Lido do arquivo na primeira chamada
+        if cls._atual is None:
+            cls._atual = cls.carregar()
+        return cls._atual
+
+    @classmethod
+    def definir(cls, local):
+        # Antes de EphemerisSession.get(): a sessão guarda o local com que foi criada
+        cls._atual = local
+
+    def refracao(self):
+        """Argumentos de refração do altaz() do Skyfield ({} sem refração), já resolvidos em números."""
+        if self.temperatura is None:
+            return {}
+        temperatura = 10.0 if self.temperatura == 'standard' else float(self.temperatura)
+        pressao = (1010.0 * math.exp(-self.elevacao / 9.1e3) if self.pressao == 'standard'
+                   else float(self.pressao))
+        return {'temperature_C': temperatura, 'pressure_mbar': pressao}
+
+# Astros disponíveis para seleção: nome exibido -> chave no kernel de efemérides
+ASTROS_RASTREAVEIS = [
+    ('Lua', 'moon'),
+    ('Saturno', 'saturn barycenter'),
+]
+
+# Log com níveis: mensagens por comando ficam em DEBUG e não são formatadas
+# quando o nível está desligado
+log = logging.getLogger('rastreamento')
+
+# Instrumentação dos caminhos críticos
+JANELA_METRICAS = 2048                # últimas medições guardadas por caminho
+INTERVALO_AMOSTRAGEM_PERFIL = 0.005   # segundos entre amostras do perfilador
+
+class TimingStats:
+    """Durações recentes de cada caminho crítico, com p50/p95/máximo sob demanda.
+
+    `registrar` só faz um append num deque limitado; os percentis são
+    calculados apenas quando alguém pede o resumo.
+    """
+    def __init__(self, janela=JANELA_METRICAS):
+        self.janela = janela
+        self.ativo = True
+        self._amostras = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nome, duracao):
+        if not self.ativo:
+            return
+        amostras = self._amostras.get(nome)
+        if amostras is None:
+            with self._lock:
+                amostras = self._amostras.setdefault(nome, deque(maxlen=self.janela))
+        amostras.append(duracao)
+
+    def limpar(self):
+        with self._lock:
+            self._amostras.clear()
+
+    def resumo(self):
+        """{caminho: {'n', 'p50_ms', 'p95_ms', 'max_ms'}} das medições na janela."""
+        with self._lock:
+            copias = {nome: np.array(amostras, dtype=float) for nome, amostras in self._amostras.items()}
+        resumo = {}
+        for nome, valores in sorted(copias.items()):
+            if len(valores) == 0:
+                continue
+            p50, p95 = np.percentile(valores, [50, 95]) * 1000
+            resumo[nome] = {'n': len(valores), 'p50_ms': float(p50), 'p95_ms': float(p95),
+                            'max_ms': float(valores.max() * 1000)}
+        return resumo
+
+    def exportar(self, caminho):
+        # Formato pela extensão: .json, ou CSV (uma linha por caminho) nos demais casos
+        resumo = self.resumo()
+        with open(caminho, 'w', newline='', encoding='utf-8') as f:
+            if caminho.lower().endswith('.json'):
+                json.dump({'instante': time.time(), 'caminhos': resumo}, f, indent=2, ensure_ascii=False)
+            else:
+                escritor = csv.writer(f)
+                escritor.writerow(['caminho', 'n', 'p50_ms', 'p95_ms', 'max_ms'])
+                for nome, r in resumo.items():
+                    escritor.writerow([nome, r['n'], f"{r['p50_ms']:.4f}", f"{r['p95_ms']:.4f}", f"{r['max_ms']:.4f}"])
+        return caminho
+
+# Medições compartilhadas pelo processo (efemérides, serial, tick e interface)
+metricas = TimingStats()
+
+def capturar_perfil(segundos, caminho, intervalo=INTERVALO_AMOSTRAGEM_PERFIL):
+    """Amostra as pilhas de todas as threads por `segundos` (bloqueante).
+
+    O cProfile só enxerga a thread que o ativou; aqui as threads de
+    rastreamento e de serial também aparecem. Grava no formato "collapsed"
+    (thread;função;...;função contagem), lido por flamegraph.pl e speedscope.
+    """
+    contagens = Counter()
+    proprio = threading.get_ident()
+    fim = time.monotonic() + segundos
+    while time.monotonic() < fim:
+        nomes = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == proprio:
+                continue
+            pilha = []
+            while frame is not None:
+                codigo = frame.f_code
+                pilha.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                frame = frame.f_back
+            pilha.append(nomes.get(ident, str(ident)))
+            contagens[';'.join(reversed(pilha))] += 1
+        time.sleep(intervalo)
+
+    with open(caminho, 'w', encoding='utf-8') as f:
+        for pilha, n in contagens.most_common():
+            f.write(f"{pilha} {n}\n")
+    log.info("Perfil de %.0f s gravado em %s (%d amostras)", segundos, caminho, sum(contagens.values()))
+    return caminho
+
+# Sessão de efemérides compartilhada por todo o processo
+class EphemerisSession:
+    """Carrega o kernel, a escala de tempo e o observador uma única vez."""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, directory='~/skyfield-data', kernel='de421.bsp', local=None):
+        self.loader = Loader(directory)
+        self.local = local if local is not None else SiteProfile.atual()
+        self.latitude = self.local.latitude
+        self.longitude = self.local.longitude
+        self.elevacao = self.local.elevacao
+        self.refracao = self.local.refracao()
+        caminho = os.path.join(self.loader.directory, kernel)
+        if not os.path.exists(caminho):
+            # O local de observação não tem rede: falha na hora em vez de tentar baixar
+            raise FileNotFoundError(
+                f"Efemérides não encontradas: {caminho}. "
+                f"Sem acesso à rede, copie {kernel} para {self.loader.directory}")
+        # O jplephem mapeia os segmentos do kernel em memória (mmap), então
+        # só as páginas realmente usadas são lidas do disco
+        self.planets = self.loader(kernel)
+        self.ts = self.loader.timescale()
+        self.topos = Topos(latitude_degrees=self.latitude, longitude_degrees=self.longitude,
+                           elevation_m=self.elevacao)
+        self.observador = self.planets['earth'] + self.topos
+
+        # Vetores observador -> astro montados uma vez e reaproveitados a cada tick
+        self.chaves = dict(ASTROS_RASTREAVEIS)
+        self.vetores = {
+            nome: self.planets[chave] - self.observador
+            for nome, chave in ASTROS_RASTREAVEIS
+        }
+        # Estrelas do catálogo registradas ao serem selecionadas
+        self.estrelas = {}
+
+    @classmethod
+    def get(cls):
+        # Criação preguiçosa e thread-safe da instância compartilhada
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def registrar_estrela(self, nome, estrela):
+        self.estrelas[nome] = estrela
+
+    def corpo(self, nome):
+        # Alvo no formato aceito por observe() e pelas buscas do almanac
+        estrela = self.estrelas.get(nome)
+        return estrela if estrela is not None else self.planets[self.chaves[nome]]
+
+    def altaz(self, nome, t):
+        estrela = self.estrelas.get(nome)
+        if estrela is not None:
+            return self.observador.at(t).observe(estrela).apparent().altaz(**self.refracao)
+        return self.vetores[nome].at(t).altaz(**self.refracao)
+
+    def radec_do_altaz(self, alt, azi, instante=None):
+        # Direção apontada (alt/az, em graus) -> RA/Dec ICRS em graus
+        t = self.tempo_unix(time.time() if instante is None else instante)
+        if self.refracao:
+            # A montagem aponta a posição refratada; o from_altaz espera a geométrica
+            alt = alt - refraction(alt, self.refracao['temperature_C'], self.refracao['pressure_mbar'])
+        ra, dec, _ = self.observador.at(t).from_altaz(alt_degrees=alt, az_degrees=azi).radec()
+        return ra.hours * 15.0, dec.degrees
+
+    def tempo_unix(self, instantes):
+        # Converte instantes Unix (escalar ou array) num objeto Time do Skyfield
+        instantes = np.asarray(instantes, dtype=float)
+        base = float(instantes.flat[0])
+        t_base = self.ts.from_datetime(datetime.fromtimestamp(base, tz=timezone.utc))
+        return self.ts.tt_jd(t_base.tt, (instantes - base) / 86400.0)
+
+# Janela de previsão da tabela de trajetórias
+JANELA_TRAJETORIA = 30 * 60  # segundos
+PASSO_TRAJETORIA = 1.0       # segundos entre amostras
+MARGEM_TRAJETORIA = 60.0     # segundos de histórico mantidos antes do instante pedido
+
+def bases_hermite(u, h):
+    # Bases da spline de Hermite cúbica (valor) e suas derivadas (taxa), com u em [0, 1]
+    h00 = 2 * u**3 - 3 * u**2 + 1
+    h10 = u**3 - 2 * u**2 + u
+    h01 = -2 * u**3 + 3 * u**2
+    h11 = u**3 - u**2
+    d00 = (6 * u**2 - 6 * u) / h
+    d10 = 3 * u**2 - 4 * u + 1
+    d01 = -d00
+    d11 = 3 * u**2 - 2 * u
+    return (h00, h10, h01, h11), (d00, d10, d01, d11)
+
+# Tabela de trajetórias pré-calculada para os astros rastreáveis
+class TrajectoryEngine:
+    """Avalia alt/az de todos os astros numa janela e interpola por spline de Hermite."""
+    def __init__(self, sessao=None, janela=JANELA_TRAJETORIA, passo=PASSO_TRAJETORIA):
+        self._sessao = sessao
+        self.janela = janela
+        self.passo = passo
+        # Os nomes não dependem do kernel: a sessão só é carregada no primeiro cálculo
+        self.nomes = list(sessao.vetores) if sessao is not None else [nome for nome, _ in ASTROS_RASTREAVEIS]
+        self._lock = threading.Lock()
+        self._inicio = None
+        self._fim = None
+        self._alt = self._azi = self._dalt = self._dazi = None
+        self._colunas = {}  # nome -> linha da tabela atual; trocado junto com ela
+        self.caminhos = {}  # alvos rápidos (satélites): nome -> PathTable
+
+    @property
+    def sessao(self):
+        if self._sessao is None:
+            self._sessao = EphemerisSession.get()
+        return self._sessao
+
+    def _recalcular(self, inicio):
+        # Uma única chamada vetorizada do Skyfield por astro cobre a janela inteira
+        offsets = np.arange(0.0, self.janela + self.passo, self.passo)
+        t = self.sessao.tempo_unix(inicio + offsets)
+
+        alt = np.empty((len(self.nomes), offsets.size))
+        azi = np.empty_like(alt)
+        for i, nome in enumerate(self.nomes):
+            pos = self.sessao.altaz(nome, t)
+            alt[i] = pos[0].degrees
+            # Desenrola o azimute para a interpolação não saltar em 360° -> 0°
+            azi[i] = np.rad2deg(np.unwrap(pos[1].radians))
+
+        # Derivadas nos nós (diferenças centrais) usadas pela spline de Hermite
+        self._dalt = np.gradient(alt, self.passo, axis=1)
+        self._dazi = np.gradient(azi, self.passo, axis=1)
+        self._alt, self._azi = alt, azi
+        self._colunas = {nome: i for i, nome in enumerate(self.nomes)}
+        self._inicio = inicio
+        self._fim = inicio + offsets[-1]
+
+    def interpolar(self, instante=None):
+        """Retorna (alt, azi, vel_alt, vel_azi) de todos os astros, em graus e graus/s."""
+        return self._interpolar(instante)[1:]
+
+    def _interpolar(self, instante):
+        # Os arrays e o mapa nome -> linha saem do mesmo lock: um adicionar()
+        # concorrente não desalinha a linha de um nome com a tabela devolvida
+        if instante is None:
+            instante = time.time()
+
+        inicio = time.perf_counter()
+        with self._lock:
+            # Só recalcula a tabela quando o instante sai da janela; a margem
+            # cobre consultas ligeiramente no passado (posições já medidas)
+            if self._inicio is None or not (self._inicio <= instante < self._fim):
+                self._recalcular(instante - MARGEM_TRAJETORIA)
+                metricas.registrar('efemerides_recalculo', time.perf_counter() - inicio)
+
+            x = (instante - self._inicio) / self.passo
+            i = min(int(x), self._alt.shape[1] - 2)
+            h = self.passo
+            (h00, h10, h01, h11), (d00, d10, d01, d11) = bases_hermite(x - i, h)
+
+            resultado = []
+            for p, m in ((self._alt, self._dalt), (self._azi, self._dazi)):
+                p0, p1 = p[:, i], p[:, i + 1]
+                m0, m1 = m[:, i], m[:, i + 1]
+                valor = h00 * p0 + h10 * h * m0 + h01 * p1 + h11 * h * m1
+                taxa = d00 * p0 + d10 * m0 + d01 * p1 + d11 * m1
+                resultado.append((valor, taxa))
+            colunas = self._colunas
+
+        (alt, vel_alt), (azi, vel_azi) = resultado
+        metricas.registrar('efemerides', time.perf_counter() - inicio)
+        return colunas, alt, azi % 360, vel_alt, vel_azi
+
+    def adicionar(self, nome):
+        # Inclui um alvo registrado na sessão (ex.: estrela do catálogo)
+        with self._lock:
+            if nome not in self.nomes:
+                self.nomes.append(nome)
+                self._inicio = None  # Força o recálculo da tabela
+
+    def adicionar_caminho(self, nome, fonte):
+        """Alvo fora da tabela comum (ex.: satélite), com trajetória densa própria.
+
+        `fonte(instantes) -> (alt, azi)` em graus; não entra em `nomes`.
+        """
+        self.caminhos[nome] = PathTable(fonte)
+
+    def amostra(self, nome, instante=None):
+        caminho = self.caminhos.get(nome)
+        if caminho is not None:
+            return caminho.amostra(instante)
+        colunas, alt, azi, vel_alt, vel_azi = self._interpolar(instante)
+        i = colunas.get(nome)
+        if i is None:
+            raise ValueError(f"{nome} não está na tabela de trajetórias")
+        return float(alt[i]), float(azi[i]), float(vel_alt[i]), float(vel_azi[i])
+
+    def prever(self, nome, instante):
+        """(alt, azi) em qualquer instante; fora da janela avalia direto, sem trocar a tabela."""
+        if nome in self.caminhos:
+            return self.amostra(nome, instante)[:2]
+        with self._lock:
+            na_tabela = self._inicio is not None and self._inicio <= instante < self._fim
+        if na_tabela:
+            return self.amostra(nome, instante)[:2]
+        alt, azi, _ = self.sessao.altaz(nome, self.sessao.tempo_unix(instante))
+        return float(alt.degrees), float(azi.degrees)
+
+    def caminho(self, nome, inicio, fim, passo=60.0):
+        """Nós da tabela de `nome` entre inicio e fim (limitado à janela atual), sem recalcular."""
+        with self._lock:
+            i = self._colunas.get(nome) if self._inicio is not None else None
+            if i is None:
+                return np.empty(0), np.empty(0)
+            k0 = max(0, int(math.ceil((inicio - self._inicio) / self.passo)))
+            k1 = int((min(fim, self._fim) - self._inicio) / self.passo) + 1
+            salto = max(1, int(passo / self.passo))
+            return self._alt[i, k0:k1:salto].copy(), self._azi[i, k0:k1:salto] % 360
+
+    def posicoes(self, instante=None):
+        colunas, alt, azi, vel_alt, vel_azi = self._interpolar(instante)
+        return [
+            {
+                'nome': nome,
+                'altitude': float(alt[i]),
+                'azimute': float(azi[i]),
+                'vel_alt': float(vel_alt[i]),
+                'vel_azi': float(vel_azi[i])
+            }
+            for nome, i in colunas.items()
+        ]
+
+# Alvos rápidos (satélites): tabela própria, mais densa e mais curta
+JANELA_CAMINHO = 10 * 60  # segundos
+PASSO_CAMINHO = 0.25      # segundos entre amostras
+MARGEM_CAMINHO = 5.0      # segundos de histórico mantidos antes do instante pedido
+
+class PathTable:
+    """Trajetória densa de um único alvo, calculada por `fonte(instantes) -> (alt, azi)`.
+
+    Mesma interpolação de Hermite do TrajectoryEngine; a janela é recalculada
+    quando o instante sai dela, numa única chamada vetorizada da fonte.
+    """
+    def __init__(self, fonte, janela=JANELA_CAMINHO, passo=PASSO_CAMINHO):
+        self.fonte = fonte
+        self.janela = janela
+        self.passo = passo
+        self._lock = threading.Lock()
+        self._inicio = None
+        self._fim = None
+
+    def _recalcular(self, inicio):
+        instantes = inicio + np.arange(0.0, self.janela + self.passo, self.passo)
+        alt, azi = self.fonte(instantes)
+        azi = np.rad2deg(np.unwrap(np.deg2rad(azi)))
+        self._alt, self._azi = alt, azi
+        self._dalt = np.gradient(alt, self.passo)
+        self._dazi = np.gradient(azi, self.passo)
+        self._inicio = inicio
+        self._fim = instantes[-1]
+
+    def amostra(self, instante=None):
+        if instante is None:
+            instante = time.time()
+        with self._lock:
+            if self._inicio is None or not (self._inicio <= instante < self._fim):
+                inicio = time.perf_counter()
+                self._recalcular(instante - MARGEM_CAMINHO)
+                metricas.registrar('caminho_recalculo', time.perf_counter() - inicio)
+            x = (instante - self._inicio) / self.passo
+            i = min(int(x), len(self._alt) - 2)
+            (h00, h10, h01, h11), (d00, d10, d01, d11) = bases_hermite(x - i, self.passo)
+            h = self.passo
+            resultado = []
+            for p, m in ((self._alt, self._dalt), (self._azi, self._dazi)):
+                resultado.append((h00 * p[i] + h10 * h * m[i] + h01 * p[i + 1] + h11 * h * m[i + 1],
+                                  d00 * p[i] + d10 * m[i] + d01 * p[i + 1] + d11 * m[i + 1]))
+        (alt, vel_alt), (azi, vel_azi) = resultado
+        return float(alt), float(azi % 360), float(vel_alt), float(vel_azi)
+
+# Catálogo de estrelas local (hip_main.dat do Hipparcos ou CSV nome,ra,dec,mag[,tipo])
+CATALOGO_ESTRELAS = '~/skyfield-data/hip_main.dat'
+EPOCA_HIPPARCOS = 2448349.0625  # J1991.25 (TT), época das posições do Hipparcos
+MAGNITUDE_LIMITE_LISTA = 2.5    # estrelas mais fracas não entram na lista de astros
+INTERVALO_CATALOGO = 10         # segundos entre recálculos de alt/az do catálogo (FixedTargetTransform)
+
+# Catálogo de estrelas em colunas NumPy
+class StarCatalog:
+    """Converte o catálogo uma vez em colunas .npy, abertas memory-mapped nas próximas execuções."""
+    COLUNAS = ('nome', 'ra', 'dec', 'mag', 'pm_ra', 'pm_dec', 'tipo')
+
+    def __init__(self, colunas):
+        # ra/dec em graus, pm_ra/pm_dec em mas/ano
+        for coluna in self.COLUNAS:
+            setattr(self, coluna, colunas[coluna])
+        self.posicoes = None  # (instante, alt, azi, visivel) do último recálculo
+        self._estrelas = None
+        self._transformacao = None  # FixedTargetTransform do catálogo inteiro
+
+    def __len__(self):
+        return len(self.ra)
+
+    @classmethod
+    def carregar(cls, caminho, diretorio_cache=None):
+        caminho = os.path.expanduser(caminho)
+        diretorio_cache = diretorio_cache or os.path.join(os.path.dirname(caminho), 'cache_catalogo')
+        base = os.path.join(diretorio_cache, os.path.basename(caminho))
+        arquivos = {coluna: f"{base}.{coluna}.npy" for coluna in cls.COLUNAS}
+
+        # Cache ausente ou mais antigo que o catálogo: converte uma única vez
+        fonte = os.path.getmtime(caminho)
+        if not all(os.path.exists(a) and os.path.getmtime(a) >= fonte for a in arquivos.values()):
+            colunas = cls._ler(caminho)
+            os.makedirs(diretorio_cache, exist_ok=True)
+            for coluna, arquivo in arquivos.items():
+                temporario = arquivo + '.tmp'
+                with open(temporario, 'wb') as f:
+                    np.save(f, colunas[coluna])
+                os.replace(temporario, arquivo)
+
+        return cls({coluna: np.load(arquivo, mmap_mode='r') for coluna, arquivo in arquivos.items()})
+
+    @classmethod
+    def _ler(cls, caminho):
+        if caminho.lower().endswith('.csv'):
+            linhas = cls._ler_csv(caminho)
+        else:
+            linhas = cls._ler_hipparcos(caminho)
+        nome, ra, dec, mag, pm_ra, pm_dec, tipo = zip(*linhas) if linhas else ((),) * 7
+        return {
+            'nome': np.array(nome, dtype='U32'),
+            'ra': np.array(ra, dtype=np.float64),
+            'dec': np.array(dec, dtype=np.float64),
+            'mag': np.array(mag, dtype=np.float32),
+            'pm_ra': np.array(pm_ra, dtype=np.float64),
+            'pm_dec': np.array(pm_dec, dtype=np.float64),
+            'tipo': np.array(tipo, dtype='U8'),
+        }
+
+    @staticmethod
+    def _ler_hipparcos(caminho):
+        # Campos do hip_main.dat separados por "|": HIP=1, Vmag=5, RAdeg=8,
+        # DEdeg=9, pmRA=12, pmDE=13, SpType=76
+        with open(caminho, 'rb') as f:
+            compactado = f.read(2) == b'\x1f\x8b'
+        abrir = gzip.open if compactado else open
+        linhas = []
+        with abrir(caminho, 'rt', encoding='ascii', errors='replace') as f:
+            for linha in f:
+                campos = linha.split('|')
+                try:
+                    ra, dec = float(campos[8]), float(campos[9])
+                except (IndexError, ValueError):
+                    continue  # Entradas sem posição astrométrica
+                mag = float(campos[5]) if campos[5].strip() else np.nan
+                pm_ra = float(campos[12]) if campos[12].strip() else 0.0
+                pm_dec = float(campos[13]) if campos[13].strip() else 0.0
+                tipo = campos[76].strip()[:1] if len(campos) > 76 else ''
+                linhas.append((f"HIP {campos[1].strip()}", ra, dec, mag, pm_ra, pm_dec, tipo))
+        return linhas
+
+    @staticmethod
+    def _ler_csv(caminho):
+        linhas = []
+        with open(caminho, newline='', encoding='utf-8') as f:
+            for registro in csv.DictReader(f):
+                linhas.append((
+                    registro['nome'],
+                    float(registro['ra']),
+                    float(registro['dec']),
+                    float(registro.get('mag') or np.nan),
+                    float(registro.get('pm_ra') or 0.0),
+                    float(registro.get('pm_dec') or 0.0),
+                    registro.get('tipo') or '',
+                ))
+        return linhas
+
+    def estrelas(self):
+        # Um único objeto Star com todas as entradas, para o cálculo vetorizado
+        if self._estrelas is None:
+            self._estrelas = Star(
+                ra_hours=np.asarray(self.ra) / 15.0,
+                dec_degrees=np.asarray(self.dec),
+                ra_mas_per_year=np.asarray(self.pm_ra),
+                dec_mas_per_year=np.asarray(self.pm_dec),
+                epoch=EPOCA_HIPPARCOS
+            )
+        return self._estrelas
+
+    def estrela(self, indice):
+        return Star(
+            ra_hours=float(self.ra[indice]) / 15.0,
+            dec_degrees=float(self.dec[indice]),
+            ra_mas_per_year=float(self.pm_ra[indice]),
+            dec_mas_per_year=float(self.pm_dec[indice]),
+            epoch=EPOCA_HIPPARCOS
+        )
+
+    def atualizar(self, sessao, instante=None, horizonte=0.0):
+        """Calcula alt/az e a máscara acima do horizonte de todo o catálogo numa passada."""
+        instante = time.time() if instante is None else instante
+        # O Skyfield só roda ao preparar a transformação (uma vez por VALIDADE_TRANSFORMACAO)
+        if self._transformacao is None or self._transformacao.sessao is not sessao:
+            self._transformacao = FixedTargetTransform(sessao, self.estrelas(), instante)
+        alt, azi = self._transformacao.altaz(instante)
+        alt, azi = alt[:, 0], azi[:, 0]
+        self.posicoes = (instante, alt, azi, alt > horizonte)
+        return self.posicoes
+
+    def visiveis(self, magnitude_maxima=MAGNITUDE_LIMITE_LISTA):
+        # Índices das estrelas acima do horizonte, das mais brilhantes às mais fracas
+        if self.posicoes is None:
+            return np.empty(0, dtype=int)
+        _, _, _, visivel = self.posicoes
+        indices = np.flatnonzero(visivel & (np.asarray(self.mag) <= magnitude_maxima))
+        return indices[np.argsort(np.asarray(self.mag)[indices], kind='stable')]
+
+# Índice espacial do catálogo para buscas em torno do apontamento
+RAIO_CAMPO = 1.0      # graus; raio da busca "o que há no campo"
+VIZINHOS_CAMPO = 5    # quantidade de objetos mais próximos exibidos
+PONTOS_POR_CELULA = 16
+
+def radec_para_vetores(ra, dec):
+    # RA/Dec em graus -> vetores unitários (n, 3)
+    ra, dec = np.radians(ra), np.radians(dec)
+    cos_dec = np.cos(dec)
+    return np.stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)], axis=-1)
+
+def separacao_angular(alt1, azi1, alt2, azi2):
+    # Distância angular em graus entre direções alt/az (aceita arrays)
+    alt1, azi1, alt2, azi2 = map(np.radians, (alt1, azi1, alt2, azi2))
+    cos_sep = (np.sin(alt1) * np.sin(alt2)
+               + np.cos(alt1) * np.cos(alt2) * np.cos(azi1 - azi2))
+    return np.degrees(np.arccos(np.clip(cos_sep, -1.0, 1.0)))
+
+class SkyIndex:
+    """Índice de vetores unitários em células das 6 faces de um cubo, com busca em cone e k vizinhos."""
+    def __init__(self, ra, dec, pontos_por_celula=PONTOS_POR_CELULA):
+        vetores = radec_para_vetores(np.asarray(ra, dtype=float), np.asarray(dec, dtype=float))
+        self.divisoes = max(1, int(math.sqrt(len(vetores) / (6 * pontos_por_celula))))
+
+        # Pontos ordenados por célula: cada célula vira uma fatia contígua
+        celulas = self._celula(vetores)
+        self._ordem = np.argsort(celulas, kind='stable')
+        self._vetores = vetores[self._ordem]
+        total = 6 * self.divisoes ** 2
+        self._offsets = np.zeros(total + 1, dtype=np.int64)
+        np.cumsum(np.bincount(celulas, minlength=total), out=self._offsets[1:])
+
+        # Centro de cada célula e o maior raio angular entre centro e cantos
+        n = self.divisoes
+        meio = (np.arange(n) + 0.5) / n * 2 - 1
+        borda = np.arange(n + 1) / n * 2 - 1
+        self._centros = self._vetores_da_face(meio)
+        cantos = self._vetores_da_face(borda)  # (6, n+1, n+1, 3)
+        cantos_por_celula = np.stack([cantos[:, :-1, :-1], cantos[:, 1:, :-1],
+                                      cantos[:, :-1, 1:], cantos[:, 1:, 1:]], axis=3)
+        centros = self._centros.reshape(6, n, n, 1, 3)
+        menor_cos = np.clip((cantos_por_celula * centros).sum(axis=-1).min(), -1.0, 1.0)
+        self._raio_celula = math.acos(menor_cos)
+        self._centros = self._centros.reshape(-1, 3)
+
+    def __len__(self):
+        return len(self._ordem)
+
+    def _celula(self, vetores):
+        # Face = eixo dominante (com sinal); (u, v) = coordenadas na face em [-1, 1]
+        absolutos = np.abs(vetores)
+        eixo = np.argmax(absolutos, axis=1)
+        linhas = np.arange(len(vetores))
+        maior = vetores[linhas, eixo]
+        face = eixo * 2 + (maior < 0)
+        u = vetores[linhas, (eixo + 1) % 3] / absolutos[linhas, eixo]
+        v = vetores[linhas, (eixo + 2) % 3] / absolutos[linhas, eixo]
+        n = self.divisoes
+        i = np.clip(((u + 1) / 2 * n).astype(np.int64), 0, n - 1)
+        j = np.clip(((v + 1) / 2 * n).astype(np.int64), 0, n - 1)
+        return (face * n + i) * n + j
+
+    def _vetores_da_face(self, coordenadas):
+        # Vetores unitários da grade (u, v) em cada face, na mesma ordem de _celula
+        u, v = np.meshgrid(coordenadas, coordenadas, indexing='ij')
+        faces = []
+        for face in range(6):
+            eixo, sinal = face // 2, (-1.0 if face % 2 else 1.0)
+            vetor = np.empty(u.shape + (3,))
+            vetor[..., eixo] = sinal
+            vetor[..., (eixo + 1) % 3] = u
+            vetor[..., (eixo + 2) % 3] = v
+            faces.append(vetor / np.linalg.norm(vetor, axis=-1, keepdims=True))
+        return np.stack(faces)
+
+    def _candidatos(self, centro, raio):
+        # Células que podem conter pontos dentro do cone
+        limite = math.cos(min(raio + self._raio_celula, math.pi))
+        celulas = np.flatnonzero(self._centros @ centro >= limite)
+        inicio = self._offsets[celulas]
+        quantidade = self._offsets[celulas + 1] - inicio
+        posicoes = np.repeat(inicio - (np.cumsum(quantidade) - quantidade), quantidade)
+        return posicoes + np.arange(posicoes.size)
+
+    def cone(self, ra, dec, raio):
+        """Índices (no catálogo) e distâncias em graus dos pontos a até `raio` graus de (ra, dec)."""
+        centro = radec_para_vetores(ra, dec)
+        posicoes = self._candidatos(centro, math.radians(raio))
+        cossenos = self._vetores[posicoes] @ centro
+        dentro = cossenos >= math.cos(math.radians(raio))
+        posicoes, cossenos = posicoes[dentro], cossenos[dentro]
+        ordem = np.argsort(-cossenos)
+        distancias = np.degrees(np.arccos(np.clip(cossenos[ordem], -1.0, 1.0)))
+        return self._ordem[posicoes[ordem]], distancias
+
+    def vizinhos(self, ra, dec, k=VIZINHOS_CAMPO):
+        """Os k pontos mais próximos de (ra, dec): (índices, distâncias em graus)."""
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # Raio inicial que conteria ~k pontos numa distribuição uniforme; dobra até bastar
+        raio = math.degrees(math.acos(max(-1.0, 1 - 4 * k / len(self))))
+        while True:
+            indices, distancias = self.cone(ra, dec, raio)
+            if len(indices) >= k or raio >= 180:
+                return indices[:k], distancias[:k]
+            raio = min(raio * 2, 180.0)
+
+# Alvos fixos em RA/Dec (estrelas): alt/az por produto de matrizes
+VALIDADE_TRANSFORMACAO = 3600.0  # segundos; precessão, nutação e aberração anual mudam < 0.1" por hora
+ROTACAO_TERRA = 2 * math.pi * 1.00273781191135448 / 86400.0  # rad/s de tempo sidéreo
+
+def matriz_horizonte(latitude, longitude):
+    # Linhas: leste, norte e zênite locais em coordenadas terrestres (ITRF)
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    return np.array([
+        [-np.sin(lon), np.cos(lon), 0.0],
+        [-np.sin(lat) * np.cos(lon), -np.sin(lat) * np.sin(lon), np.cos(lat)],
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)],
+    ])
+
+class FixedTargetTransform:
+    """alt/az de muitos alvos fixos a cada tick sem o pipeline completo do Skyfield.
+
+    preparar() passa uma vez pelo Skyfield: direções aparentes (movimento
+    próprio, aberração, deflexão) no equador verdadeiro da data e o tempo
+    sidéreo aparente do instante de referência. Até VALIDADE_TRANSFORMACAO
+    depois, só o ângulo sidéreo muda, e cada instante custa uma rotação em z,
+    a matriz fixa do horizonte e a refração (se o local a usa).
+    """
+    def __init__(self, sessao, estrelas, instante=None):
+        self.sessao = sessao
+        self.estrelas = estrelas  # Star com arrays, como StarCatalog.estrelas()
+        self.horizonte = matriz_horizonte(sessao.latitude, sessao.longitude)
+        self.preparar(instante)
+
+    def preparar(self, instante=None):
+        inicio = time.perf_counter()
+        instante = time.time() if instante is None else float(instante)
+        t = self.sessao.tempo_unix(instante)
+        ra, dec, _ = self.sessao.observador.at(t).observe(self.estrelas).apparent().radec(epoch='date')
+        vetores = radec_para_vetores(np.atleast_1d(ra.hours) * 15.0, np.atleast_1d(dec.degrees)).T  # (3, n)
+        # Trocados juntos: outra thread pode estar em altaz()
+        self._estado = (instante, math.radians(float(t.gast) * 15.0), vetores)
+        metricas.registrar('transformacao', time.perf_counter() - inicio)
+
+    def altaz(self, instantes=None):
+        """alt/az em graus, arrays (alvos, instantes); refaz preparar() fora da validade."""
+        instantes = np.atleast_1d(time.time() if instantes is None else np.asarray(instantes, dtype=float))
+        referencia, angulo, vetores = self._estado
+        if np.abs(instantes - referencia).max() > VALIDADE_TRANSFORMACAO:
+            self.preparar(float(np.median(instantes)))
+            referencia, angulo, vetores = self._estado
+
+        # Equador verdadeiro da data -> terrestre (rotação pelo ângulo sidéreo) -> horizonte local
+        theta = angulo + ROTACAO_TERRA * (instantes - referencia)
+        cos, sen = np.cos(theta), np.sin(theta)
+        rotacao = np.zeros((len(instantes), 3, 3))
+        rotacao[:, 0, 0] = rotacao[:, 1, 1] = cos
+        rotacao[:, 0, 1] = sen
+        rotacao[:, 1, 0] = -sen
+        rotacao[:, 2, 2] = 1.0
+        leste, norte, zenite = np.moveaxis((self.horizonte @ rotacao) @ vetores, 1, 0)  # (instantes, alvos)
+
+        alt = np.degrees(np.arcsin(np.clip(zenite, -1.0, 1.0)))
+        azi = np.degrees(np.arctan2(leste, norte)) % 360.0
+        if self.sessao.refracao:
+            alt = refract(alt, self.sessao.refracao['temperature_C'], self.sessao.refracao['pressure_mbar'])
+        return alt.T, azi.T
+
+# Satélites artificiais de um arquivo TLE local, propagados em lote (SGP4)
+ARQUIVO_TLE = '~/skyfield-data/satelites.tle'
+ALTITUDE_MINIMA_PASSAGEM = 10.0  # graus
+PASSO_BUSCA_PASSAGENS = 30.0     # segundos; passagens de LEO acima de 10° duram minutos
+LOTE_SATELITES = 256             # satélites por chamada do SGP4 (limita a memória da busca)
+PASSO_VELOCIDADE_SATELITE = 1.0  # segundos entre amostras ao estimar o pico de velocidade de uma passagem
+RAIO_EQUATORIAL_WGS84 = 6378.137          # km
+ACHATAMENTO_WGS84 = 1 / 298.257223563
+
+# Nascer/ocaso None quando a passagem já começou ou ainda não terminou dentro da busca
+Passagem = namedtuple('Passagem', 'nome nascer culminacao ocaso altitude_maxima')
+
+class SatelliteCatalog:
+    """Elementos TLE de todos os satélites num SatrecArray, com alt/az vetorizados.
+
+    A cadeia é toda em arrays: SGP4 (TEME) para satélites x instantes, rotação
+    pelo GMST para ITRF e projeção no horizonte local do observador. Sem
+    objetos do Skyfield por satélite, milhares de TLEs são avaliados de uma vez.
+    """
+    def __init__(self, nomes, satelites, latitude=None, longitude=None, elevacao=None, refracao=None):
+        self.nomes = list(nomes)
+        self.satelites = satelites
+        self.indices = {nome.lower(): i for i, nome in reversed(list(enumerate(self.nomes)))}
+
+        # Observador em ITRF (km) e a base leste/norte/zênite do horizonte local
+        local = SiteProfile.atual()
+        latitude = local.latitude if latitude is None else latitude
+        longitude = local.longitude if longitude is None else longitude
+        elevacao = local.elevacao if elevacao is None else elevacao
+        self.refracao = local.refracao() if refracao is None else refracao
+        lat, lon = np.radians(latitude), np.radians(longitude)
+        e2 = ACHATAMENTO_WGS84 * (2 - ACHATAMENTO_WGS84)
+        n = RAIO_EQUATORIAL_WGS84 / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+        h = elevacao / 1000.0
+        self.observador = np.array([(n + h) * np.cos(lat) * np.cos(lon),
+                                    (n + h) * np.cos(lat) * np.sin(lon),
+                                    (n * (1 - e2) + h) * np.sin(lat)])
+        self.horizonte = matriz_horizonte(latitude, longitude)
+
+    def __len__(self):
+        return len(self.nomes)
+
+    @classmethod
+    def carregar(cls, caminho, **observador):
+        """Lê um arquivo TLE (com ou sem a linha de nome antes de cada par)."""
+        from sgp4.api import Satrec
+
+        nomes, satelites = [], []
+        nome = None
+        with open(os.path.expanduser(caminho), encoding='utf-8', errors='replace') as f:
+            linhas = [linha.rstrip() for linha in f if linha.strip()]
+        i = 0
+        while i < len(linhas):
+            linha = linhas[i]
+            if linha.startswith('1 ') and i + 1 < len(linhas) and linhas[i + 1].startswith('2 '):
+                try:
+                    satelites.append(Satrec.twoline2rv(linha, linhas[i + 1]))
+                    nomes.append(nome or linha[2:7].strip())
+                except ValueError as e:
+                    log.warning("TLE ignorado (%s): %s", nome or linha[2:7], e)
+                nome = None
+                i += 2
+            else:
+                nome = linha[2:].strip() if linha.startswith('0 ') else linha.strip()
+                i += 1
+        log.info("%d satélites lidos de %s", len(satelites), caminho)
+        return cls(nomes, satelites, **observador)
+
+    def indice(self, nome):
+        return self.indices.get(nome.strip().lower())
+
+    def altaz(self, instantes, indices=None):
+        """alt/az em graus, arrays (satélites, instantes); NaN onde o SGP4 falha (satélite decaído)."""
+        from sgp4.api import SatrecArray
+        from skyfield.sgp4lib import theta_GMST1982
+
+        instantes = np.atleast_1d(np.asarray(instantes, dtype=float))
+        satelites = self.satelites if indices is None else [self.satelites[i] for i in indices]
+        # Data juliana UTC em duas partes, como o SGP4 espera (a época do TLE é UTC)
+        dias = np.floor(instantes / 86400.0)
+        jd = 2440587.5 + dias
+        fracao = instantes / 86400.0 - dias
+
+        erro, r, _ = SatrecArray(satelites).sgp4(jd, fracao)
+
+        # TEME -> ITRF: rotação em z pelo tempo sideral (UT1 ~ UTC; movimento do polo desprezado)
+        theta, _ = theta_GMST1982(jd, fracao)
+        c, s = np.cos(theta), np.sin(theta)
+        x = c * r[..., 0] + s * r[..., 1] - self.observador[0]
+        y = -s * r[..., 0] + c * r[..., 1] - self.observador[1]
+        z = r[..., 2] - self.observador[2]
+
+        # Horizonte local: leste, norte, zênite
+        leste, norte, zenite = (b[0] * x + b[1] * y + b[2] * z for b in self.horizonte)
+        alt = np.degrees(np.arctan2(zenite, np.hypot(leste, norte)))
+        azi = np.degrees(np.arctan2(leste, norte)) % 360.0
+        if self.refracao:
+            alt = refract(alt, self.refracao['temperature_C'], self.refracao['pressure_mbar'])
+        falha = erro != 0
+        alt[falha] = np.nan
+        azi[falha] = np.nan
+        return alt, azi
+
+    def fonte(self, indice):
+        # Função instantes -> (alt, azi) de um satélite, para o PathTable
+        def calcular(instantes):
+            alt, azi = self.altaz(instantes, [indice])
+            return alt[0], azi[0]
+        return calcular
+
+    def velocidades_maximas(self, indice, inicio, fim, altitude_minima=0.0, passo=PASSO_VELOCIDADE_SATELITE):
+        """Maiores |vel_alt| e |vel_azi| (graus/s) do satélite entre inicio e fim, acima de `altitude_minima`."""
+        instantes = np.arange(inicio, fim + passo, passo)
+        alt, azi = self.fonte(indice)(instantes)
+        # NaN (SGP4 falhou) não conta como velocidade
+        vel_alt = np.nan_to_num(np.abs(np.gradient(alt, passo)))
+        vel_azi = np.nan_to_num(np.abs(np.gradient(np.rad2deg(np.unwrap(np.deg2rad(azi))), passo)))
+        acima = np.nan_to_num(alt, nan=-90.0) >= altitude_minima
+        if not acima.any():
+            return 0.0, 0.0
+        return float(vel_alt[acima].max()), float(vel_azi[acima].max())
+
+    def passagens(self, inicio=None, fim=None, altitude_minima=ALTITUDE_MINIMA_PASSAGEM,
+                  passo=PASSO_BUSCA_PASSAGENS, indices=None):
+        """Passagens acima de `altitude_minima` entre inicio e fim (padrão: próximas 12 h), por nascer."""
+        inicio = time.time() if inicio is None else inicio
+        fim = inicio + 12 * 3600 if fim is None else fim
+        instantes = np.arange(inicio, fim + passo, passo)
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices)
+
+        passagens = []
+        for lote in range(0, len(indices), LOTE_SATELITES):
+            inicio_lote = time.perf_counter()
+            lote_indices = indices[lote:lote + LOTE_SATELITES]
+            alt, _ = self.altaz(instantes, lote_indices)
+            acima = np.nan_to_num(alt, nan=-90.0) >= altitude_minima
+            # Trechos acima: +1 onde começam, -1 logo depois de onde terminam
+            bordas = np.diff(acima.astype(np.int8), axis=1, prepend=0, append=0)
+            linhas, comecos = np.nonzero(bordas == 1)
+            _, finais = np.nonzero(bordas == -1)
+            for linha, k0, k1 in zip(linhas, comecos, finais):
+                passagens.append(self._passagem(self.nomes[lote_indices[linha]], instantes, alt[linha],
+                                                k0, k1, altitude_minima))
+            metricas.registrar('passagens_lote', time.perf_counter() - inicio_lote)
+        return sorted(passagens, key=lambda p: p.nascer if p.nascer is not None else inicio)
+
+    @staticmethod
+    def _passagem(nome, instantes, alt, k0, k1, altitude_minima):
+        passo = instantes[1] - instantes[0]
+
+        def cruzamento(k):
+            # Interpolação linear entre as amostras k e k+1 que cercam a altitude mínima
+            return instantes[k] + (altitude_minima - alt[k]) / (alt[k + 1] - alt[k]) * passo
+
+        nascer = float(cruzamento(k0 - 1)) if k0 > 0 else None
+        ocaso = float(cruzamento(k1 - 1)) if k1 < len(instantes) else None
+        k = k0 + int(np.argmax(alt[k0:k1]))
+        culminacao, maxima = float(instantes[k]), float(alt[k])
+        if 0 < k < len(instantes) - 1:
+            # Vértice da parábola pelas três amostras em torno do máximo
+            a, b, c = alt[k - 1], alt[k], alt[k + 1]
+            curvatura = a - 2 * b + c
+            if curvatura < 0:
+                desvio = 0.5 * (a - c) / curvatura
+                culminacao += float(desvio * passo)
+                maxima = float(b - 0.25 * (a - c) * desvio)
+        return Passagem(nome, nascer, culminacao, ocaso, maxima)
+
+# Lista de alvos da interface: corpos da sessão, catálogo e satélites numa só tabela
+CATEGORIA_CORPO = 'Sistema Solar'
+CATEGORIA_ESTRELA = 'Estrelas'
+CATEGORIA_SATELITE = 'Satélites'
+CATEGORIAS_ALVOS = (CATEGORIA_CORPO, CATEGORIA_ESTRELA, CATEGORIA_SATELITE)
+
+class TargetIndex:
+    """Colunas de todos os alvos (nome, magnitude, tipo, alt/az) para filtrar sem percorrer dicts.
+
+    Linhas na ordem de exibição: corpos da sessão, estrelas da mais brilhante
+    à mais fraca e satélites. A busca por texto é incremental: quando o texto
+    novo estende o anterior, só as linhas que já casavam são examinadas.
+    """
+    def __init__(self, trajetorias, catalogo=None, satelites=None):
+        self.trajetorias = trajetorias
+        self.catalogo = catalogo
+        self.satelites = satelites
+
+        corpos = list(trajetorias.nomes)
+        estrelas = np.empty(0, dtype=int)
+        if catalogo is not None:
+            # argsort coloca as magnitudes NaN no fim
+            estrelas = np.argsort(np.asarray(catalogo.mag), kind='stable')
+        n_satelites = len(satelites) if satelites is not None else 0
+
+        nomes = corpos + ([] if catalogo is None else list(np.asarray(catalogo.nome)[estrelas]))
+        if satelites is not None:
+            nomes += satelites.nomes
+        self.nomes = np.array(nomes, dtype=str)
+        self.chaves = np.char.lower(self.nomes)
+        self.categoria = np.repeat(np.arange(len(CATEGORIAS_ALVOS)), [len(corpos), len(estrelas), n_satelites])
+        # Posição da linha na fonte dela (trajetória, catálogo ou arquivo TLE)
+        self.referencia = np.concatenate([np.arange(len(corpos)), estrelas, np.arange(n_satelites)])
+        self.mag = np.full(len(self.nomes), np.nan, dtype=np.float32)
+        self.tipo = np.full(len(self.nomes), '', dtype='U8')
+        if catalogo is not None:
+            fatia = slice(len(corpos), len(corpos) + len(estrelas))
+            self.mag[fatia] = np.asarray(catalogo.mag)[estrelas]
+            self.tipo[fatia] = np.asarray(catalogo.tipo)[estrelas]
+
+        # alt/az do último atualizar(), trocados de uma vez (lidos pela interface)
+        self.posicoes = (np.full(len(self.nomes), np.nan), np.full(len(self.nomes), np.nan))
+        self._busca = ('', np.arange(len(self.nomes)))
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def tipos(self):
+        # Valores aceitos em filtrar(tipo=...): categorias presentes e classes espectrais
+        presentes = [c for i, c in enumerate(CATEGORIAS_ALVOS) if np.any(self.categoria == i)]
+        return presentes + [str(t) for t in np.unique(self.tipo) if t]
+
+    def atualizar(self, instante=None):
+        """alt/az de todas as linhas: tabela de trajetórias, último recálculo do catálogo e SGP4."""
+        instante = time.time() if instante is None else instante
+        alt = np.full(len(self.nomes), np.nan)
+        azi = np.full(len(self.nomes), np.nan)
+
+        # Estrelas registradas depois entram no fim de trajetorias.nomes: só os corpos iniciais contam
+        corpos = self.categoria == 0
+        n_corpos = int(corpos.sum())
+        alt_corpos, azi_corpos, _, _ = self.trajetorias.interpolar(instante)
+        alt[corpos], azi[corpos] = alt_corpos[:n_corpos], azi_corpos[:n_corpos] % 360
+
+        if self.catalogo is not None and self.catalogo.posicoes is not None:
+            _, alt_catalogo, azi_catalogo, _ = self.catalogo.posicoes
+            estrelas = self.categoria == 1
+            referencia = self.referencia[estrelas]
+            alt[estrelas], azi[estrelas] = alt_catalogo[referencia], azi_catalogo[referencia]
+
+        if self.satelites is not None and len(self.satelites):
+            alt_satelites, azi_satelites = self.satelites.altaz(instante)
+            satelites = self.categoria == 2
+            alt[satelites], azi[satelites] = alt_satelites[:, 0], azi_satelites[:, 0]
+
+        self.posicoes = (alt, azi)
+
+    def buscar(self, texto):
+        """Linhas cujo nome contém o texto (sem diferenciar maiúsculas), na ordem de exibição."""
+        chave = texto.strip().lower()
+        anterior, linhas = self._busca
+        if not chave.startswith(anterior):
+            linhas = np.arange(len(self.nomes))
+        if chave != anterior:
+            linhas = linhas[np.char.find(self.chaves[linhas], chave) >= 0]
+            self._busca = (chave, linhas)
+        return linhas
+
+    def filtrar(self, texto='', visivel=False, magnitude_maxima=None, tipo=None):
+        """Linhas que passam na busca e nos filtros; a magnitude só limita as estrelas."""
+        linhas = self.buscar(texto)
+        manter = np.ones(len(linhas), dtype=bool)
+        if visivel:
+            alt, _ = self.posicoes
+            manter &= alt[linhas] > 0
+        if magnitude_maxima is not None:
+            manter &= (self.categoria[linhas] != 1) | (self.mag[linhas] <= magnitude_maxima)
+        if tipo in CATEGORIAS_ALVOS:
+            manter &= self.categoria[linhas] == CATEGORIAS_ALVOS.index(tipo)
+        elif tipo:
+            manter &= self.tipo[linhas] == tipo
+        return linhas[manter]
+
+    def astro(self, linha):
+        """Dict da linha no formato de astros()/encontrar(), para selecionar()."""
+        alt, azi = self.posicoes
+        astro = {'nome': str(self.nomes[linha]), 'altitude': float(alt[linha]), 'azimute': float(azi[linha])}
+        categoria = self.categoria[linha]
+        if categoria == 1:
+            astro['indice'] = int(self.referencia[linha])
+        elif categoria == 2:
+            astro['satelite'] = int(self.referencia[linha])
+        return astro
+
+# Frequências aceitas pelo laço de rastreamento (Hz)
+TAXA_RASTREAMENTO = 1.0
+TAXAS_RASTREAMENTO = [1.0, 2.0, 5.0, 10.0, 20.0]
+TAXA_SATELITE = 10.0  # satélites de órbita baixa cruzam o céu em minutos
+
+# Laço de rastreamento em thread própria, desacoplado do mainloop do Tk
+class TrackingLoop:
+    """Envia correções de velocidade a uma taxa fixa e publica snapshots para a interface."""
+    modo = 'speed'
+
+    def __init__(self, trajetorias, enviar_velocidade, taxa=TAXA_RASTREAMENTO, controlador=None):
+        self.trajetorias = trajetorias
+        self.enviar_velocidade = enviar_velocidade  # callback(vel_alt, vel_azi) -> Future
+        self.taxa = taxa
+        self.controlador = controlador  # ClosedLoopController, ou None para malha aberta
+        self.alvo = None
+        # Fila só com dados de exibição; a interface consome no próprio ritmo
+        self.snapshots = queue.Queue(maxsize=32)
+        self.gravador = None  # TelemetryRecorder (gravacao.py), opcional
+        self._parar = threading.Event()
+        self._thread = None
+
+    @property
+    def ativo(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def set_taxa(self, taxa):
+        # Vale a partir do próximo tick
+        self.taxa = min(max(float(taxa), TAXAS_RASTREAMENTO[0]), TAXAS_RASTREAMENTO[-1])
+
+    def start(self, alvo):
+        self.stop()
+        self.alvo = alvo
+        if self.controlador is not None:
+            self.controlador.reiniciar()
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name="rastreamento", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._parar.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _executar(self):
+        # Agendamento por prazo absoluto no relógio monotônico: o atraso de um
+        # tick não se acumula nos seguintes
+        proximo = time.monotonic()
+        while not self._parar.is_set():
+            self._tick()
+
+            periodo = 1.0 / self.taxa
+            proximo += periodo
+            espera = proximo - time.monotonic()
+            if espera < 0:
+                # Ticks perdidos são descartados em vez de executados em rajada
+                proximo += math.ceil(-espera / periodo) * periodo
+                espera = proximo - time.monotonic()
+            self._parar.wait(espera)
+
+    def _tick(self):
+        inicio = time.perf_counter()
+        instante = time.time()
+        snapshot = {'nome': self.alvo, 'instante': instante, 'erro': None}
+        try:
+            alt, azi, vel_alt, vel_azi = self.trajetorias.amostra(self.alvo, instante)
+            snapshot.update(altitude=alt, azimute=azi, vel_alt=vel_alt, vel_azi=vel_azi)
+            self._comandar(instante, snapshot)
+        except Exception as e:
+            snapshot['erro'] = str(e)
+            log.warning("Erro no rastreamento: %s", e)
+        self._publicar(snapshot)
+        if self.gravador is not None:
+            self.gravador.registrar_tick(snapshot, self.modo, 1.0 / self.taxa)
+        metricas.registrar('tick', time.perf_counter() - inicio)
+
+    def _comandar(self, instante, snapshot):
+        # Um SPEED por tick (malha fechada reenvia só quando a velocidade muda)
+        controlador = self.controlador
+        if controlador is not None:
+            comando = controlador.calcular(self.alvo, instante, 1.0 / self.taxa)
+            snapshot.update(comando)
+            if comando['enviar']:
+                futuro = self.enviar_velocidade(comando['cmd_alt'], comando['cmd_azi'])
+                controlador.registrar_envio(futuro, instante, comando['cmd_alt'], comando['cmd_azi'])
+        elif abs(snapshot['vel_alt']) > 0.0001 or abs(snapshot['vel_azi']) > 0.0001:
+            self.enviar_velocidade(snapshot['vel_alt'], snapshot['vel_azi'])
+
+    def _publicar(self, snapshot):
+        # Fila cheia: descarta o snapshot mais antigo, só o mais recente importa
+        while True:
+            try:
+                self.snapshots.put_nowait(snapshot)
+                return
+            except queue.Full:
+                try:
+                    self.snapshots.get_nowait()
+                except queue.Empty:
+                    pass
+
+# Tipos de evento reconhecidos na saída do firmware (readmeArduino.md)
+EVENTO_RECEBIDO = 'recebido'
+EVENTO_POSICAO = 'posicao'
+EVENTO_POSICAO_ATUAL = 'posicao_atual'
+EVENTO_CALIBRACAO = 'calibracao'
+EVENTO_ERRO = 'erro'
+EVENTO_PROTOCOLO = 'protocolo'
+EVENTO_FILA = 'fila'
+EVENTO_IDENTIFICACAO = 'identificacao'
+EVENTO_TEXTO = 'texto'
+
+# Eventos cujos dois campos são uma posição (alt, azi)
+EVENTOS_POSICAO = (EVENTO_RECEBIDO, EVENTO_POSICAO, EVENTO_POSICAO_ATUAL)
+
+# O firmware rotula os campos na ordem do comando POS (azimute primeiro),
+# então o "Alt" impresso é o azimute do host e o "Azi" é a altitude.
+# O azimute informado está no referencial da montagem (inclui azimuth_offset)
+PADROES_TELEMETRIA = [
+    (EVENTO_RECEBIDO, re.compile(r'^Recebido -> Alt: (-?[\d.]+)\S* \| Azi: (-?[\d.]+)')),
+    (EVENTO_POSICAO, re.compile(r'^Posição atingida -> Alt: (-?[\d.]+)\S* \| Azi: (-?[\d.]+)')),
+    (EVENTO_POSICAO_ATUAL, re.compile(r'^Posição -> Alt: (-?[\d.]+)\S* \| Azi: (-?[\d.]+)')),
+    (EVENTO_CALIBRACAO, re.compile(r'^Calibração concluída')),
+    (EVENTO_ERRO, re.compile(r'^Erro:')),
+    (EVENTO_PROTOCOLO, re.compile(r'^PROTO (\d+)')),
+    (EVENTO_FILA, re.compile(r'^FILA (\d+) (\d+)')),  # vagas livres, millis() do Arduino
+    (EVENTO_IDENTIFICACAO, re.compile(r'^ID (\S+)')),  # IDENTIFICADOR gravado no sketch
+]
+
+# Evento da telemetria que conclui cada comando
+CONCLUSAO_COMANDOS = {
+    EVENTO_POSICAO: 'POS',
+    EVENTO_POSICAO_ATUAL: 'SPEED',
+    EVENTO_CALIBRACAO: 'CALIBRATE',
+    EVENTO_PROTOCOLO: 'PROTO',
+    EVENTO_FILA: 'FILA',
+    EVENTO_IDENTIFICACAO: 'ID',
+}
+
+# Erros do firmware que rejeitam um comando com resposta esperada; os demais
+# (ex.: "Erro: Fila cheia", de um SEG sem resposta) não concluem nenhum pendente
+ERROS_COMANDOS = [
+    (re.compile(r'^Erro: Posição fora dos limites'), 'POS'),
+]
+# Quadro binário descartado: o seq identifica os comandos que ele levava
+PADRAO_ERRO_QUADRO = re.compile(r'^Erro: (?:Quadro inválido|Quadro incompleto|CRC) (\d+)')
+QUADROS_LEMBRADOS = 16  # últimos quadros enviados cujos comandos podem ser rejeitados pelo seq
+ERRO_LEITURA_SERIAL = "Erro ao ler da serial"  # publicado pelo SerialReader quando a porta cai
+
+TelemetryEvent = namedtuple('TelemetryEvent', ['tipo', 'instante', 'linha', 'alt', 'azi'])
+
+def parse_telemetria(linha, instante):
+    for tipo, padrao in PADROES_TELEMETRIA:
+        m = padrao.match(linha)
+        if m:
+            if tipo in EVENTOS_POSICAO:
+                return TelemetryEvent(tipo, instante, linha, float(m.group(2)), float(m.group(1)))
+            return TelemetryEvent(tipo, instante, linha, None, None)
+    return TelemetryEvent(EVENTO_TEXTO, instante, linha, None, None)
+
+# Buffer circular de eventos de telemetria com assinantes
+class TelemetryBuffer:
+    """Guarda os últimos eventos e os repassa aos assinantes (na thread de leitura)."""
+    def __init__(self, capacidade=1024):
+        self._eventos = deque(maxlen=capacidade)
+        self._assinantes = []
+        self._total = 0  # Eventos publicados desde o início
+        self._cond = threading.Condition()
+
+    def assinar(self, callback):
+        # Os callbacks rodam na thread de leitura e devem ser rápidos
+        with self._cond:
+            self._assinantes.append(callback)
+        return lambda: self._remover(callback)
+
+    def _remover(self, callback):
+        with self._cond:
+            if callback in self._assinantes:
+                self._assinantes.remove(callback)
+
+    def publicar(self, evento):
+        with self._cond:
+            self._eventos.append(evento)
+            self._total += 1
+            assinantes = list(self._assinantes)
+            self._cond.notify_all()
+        for callback in assinantes:
+            try:
+                callback(evento)
+            except Exception:
+                log.exception("Erro em assinante da telemetria")
+
+    def ultimo(self, tipo=None):
+        with self._cond:
+            for evento in reversed(self._eventos):
+                if tipo is None or evento.tipo == tipo:
+                    return evento
+        return None
+
+    def eventos_desde(self, instante):
+        with self._cond:
+            return [e for e in self._eventos if e.instante > instante]
+
+    def aguardar(self, tipo, timeout=None):
+        # Bloqueia até chegar um novo evento do tipo pedido
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            vistos = self._total
+            while True:
+                novos = min(self._total - vistos, len(self._eventos))
+                for evento in list(self._eventos)[len(self._eventos) - novos:]:
+                    if evento.tipo == tipo:
+                        return evento
+                vistos = self._total
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return None
+                self._cond.wait(restante)
+
+# Leitor da serial: bloqueia na porta e drena tudo o que houver de uma vez
+class SerialReader:
+    def __init__(self, telemetria):
+        self.telemetria = telemetria
+        self.conexao = None
+        self._thread = None
+
+    def abrir(self, conexao):
+        # Uma thread por conexão: termina com o fechar(), e a linha incompleta
+        # de uma porta não passa para a seguinte (reconexão)
+        self.fechar()
+        self.conexao = conexao
+        self._thread = threading.Thread(target=self._executar, args=(conexao,), name="serial-leitura", daemon=True)
+        self._thread.start()
+
+    def fechar(self):
+        # A thread sai na volta seguinte: read() retorna no timeout da porta ou falha com ela fechada
+        self.conexao = None
+        self._thread = None
+
+    def _executar(self, conexao):
+        pendente = bytearray()
+        while self.conexao is conexao and conexao.is_open:
+            try:
+                # read(1) bloqueia até o timeout da porta; o resto do buffer vem junto
+                dados = conexao.read(conexao.in_waiting or 1)
+            except Exception as e:
+                if self.conexao is conexao:  # Não foi o fechar() que derrubou a leitura
+                    self.fechar()
+                    self.telemetria.publicar(TelemetryEvent(EVENTO_ERRO, time.time(), f"{ERRO_LEITURA_SERIAL}: {e}", None, None))
+                break
+            if not dados:
+                continue
+
+            instante = time.time()
+            inicio = time.perf_counter()
+            pendente += dados
+            *linhas, pendente = pendente.split(b'\n')
+            for linha in linhas:
+                texto = linha.decode('utf-8', errors='replace').strip()
+                if texto:
+                    self.telemetria.publicar(parse_telemetria(texto, instante))
+            # Da leitura ao fim dos assinantes (parse, futures, controlador, interface)
+            metricas.registrar('serial_leitura', time.perf_counter() - inicio)
+
+# Porta da montagem simulada (simulador.py), usada com RASTREAMENTO_SIMULADOR=1
+PORTA_SIMULADOR = 'SIM'
+
+# Prazos máximos para a confirmação do firmware (segundos)
+TIMEOUT_POS = 600.0
+TIMEOUT_CALIBRACAO = 120.0
+TIMEOUT_SPEED = 2.0
+TIMEOUT_PROTOCOLO = 1.0
+TIMEOUT_IDENTIFICACAO = 1.0
+TIMEOUT_ENCERRAMENTO = 2.0  # espera pela thread de escrita ao fechar o enlace
+BANNER_FIRMWARE = "Sistema de rastreamento pronto"  # impresso no setup() do sketch
+
+# Protocolo binário opcional (negociado com "PROTO"; sem resposta, segue em texto).
+# Quadro little-endian: AA 55 | versão u8 | seq u16 | n u8 | n registros | CRC-16/CCITT u16
+# Registro fixo de 13 bytes: comando u8 | t_ms u32 | a f32 | b f32
+# t_ms só é usado pelo SEG (versão 2): millis() do Arduino em que a velocidade
+# entra em vigor; os demais comandos executam ao receber (t_ms = 0).
+# O CRC cobre do byte de versão até o último registro.
+PROTOCOLO_BINARIO = True
+VERSAO_PROTOCOLO = 2
+VERSAO_SEGMENTOS = 2  # primeira versão com fila de segmentos (SEG/FILA)
+SYNC_QUADRO = b'\xaa\x55'
+CABECALHO_QUADRO = struct.Struct('<BHB')
+REGISTRO_QUADRO = struct.Struct('<BIff')
+MAX_REGISTROS_QUADRO = 4  # mantém o quadro (60 bytes) dentro do buffer serial de 64 bytes do AVR
+COMANDOS_BINARIOS = {'SPEED': 1, 'POS': 2, 'STOP': 3, 'CALIBRATE': 4, 'SEG': 5, 'FILA': 6}
+
+def codificar_registro(comando, t_ms=0):
+    # Linha de texto ("SPEED,1.0,2.0" ou "SEG,t_ms,1.0,2.0") -> registro binário,
+    # ou None se não houver código
+    partes = comando.split(',')
+    codigo = COMANDOS_BINARIOS.get(partes[0])
+    if codigo is None or len(partes) not in (1, 3, 4):
+        return None
+    if len(partes) == 4:
+        t_ms = int(partes[1]) & 0xFFFFFFFF
+        del partes[1]
+    a, b = (float(partes[1]), float(partes[2])) if len(partes) == 3 else (0.0, 0.0)
+    return REGISTRO_QUADRO.pack(codigo, t_ms, a, b)
+
+def montar_quadro(seq, registros, versao=VERSAO_PROTOCOLO):
+    corpo = CABECALHO_QUADRO.pack(versao, seq & 0xFFFF, len(registros)) + b''.join(registros)
+    return SYNC_QUADRO + corpo + struct.pack('<H', binascii.crc_hqx(corpo, 0xFFFF))
+
+# Camada de comandos assíncrona sobre a porta serial
+class SerialLink:
+    """Enfileira escritas numa thread própria e conclui comandos pela resposta do Arduino."""
+    def __init__(self):
+        self.conexao = None
+        self.ao_erro = None  # callback(mensagem) para falhas de escrita
+        self.binario = False  # Ativado quando o firmware confirma o protocolo binário
+        self.versao = 0  # Versão informada pelo firmware (0 = não respondeu ao PROTO)
+        self._seq = 0
+        self._fila = queue.Queue()
+        self._pendentes = deque()  # (tipo, futuro), na ordem de envio
+        self._prazos = []  # heap (limite monotônico, ordem, tipo, futuro, timeout), expirado pela thread de escrita
+        self._quadros = deque(maxlen=QUADROS_LEMBRADOS)  # (seq, [(tipo, futuro)]) dos quadros recentes
+        self._ordem = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def abrir(self, conexao):
+        self.fechar()
+        self.conexao = conexao
+        self.binario = False
+        self.versao = 0
+        # Fila e thread de escrita novas a cada conexão; o fechar() encerra as duas
+        self._fila = queue.Queue()
+        self._thread = threading.Thread(target=self._escrever, args=(self._fila, conexao),
+                                        name="serial-escrita", daemon=True)
+        self._thread.start()
+
+    def fechar(self):
+        """Encerra a thread de escrita e falha os comandos que aguardavam resposta."""
+        if self._thread is None:
+            return
+        thread, self._thread = self._thread, None
+        self.conexao = None
+        self._fila.put(None)  # Sentinela: a thread escreve o que já estava na fila (ex.: STOP) e sai
+        if thread is not threading.current_thread():
+            thread.join(TIMEOUT_ENCERRAMENTO)
+        self._falhar_pendentes(ConnectionError("Conexão serial fechada"))
+
+    @property
+    def aberto(self):
+        return self.conexao is not None and self.conexao.is_open
+
+    @property
+    def segmentos(self):
+        # A fila de segmentos só existe no protocolo binário a partir da versão 2
+        return self.binario and self.versao >= VERSAO_SEGMENTOS
+
+    def enviar(self, comando, aguardar=None, timeout=None):
+        """Enfileira o comando e retorna um Future.
+
+        Sem `aguardar`, o Future conclui quando a linha é escrita; com um
+        comando de CONCLUSAO_COMANDOS, conclui com o evento de confirmação.
+        """
+        futuro = Future()
+        if not self.aberto:
+            futuro.set_exception(ConnectionError("Conexão serial fechada"))
+            return futuro
+
+        if aguardar is not None:
+            # Registrado antes da escrita para não perder uma resposta rápida
+            with self._lock:
+                self._pendentes.append((aguardar, futuro))
+                if timeout is not None:
+                    # Sem uma thread por comando: o put abaixo acorda a escrita, que recalcula a espera
+                    self._ordem += 1
+                    heapq.heappush(self._prazos, (time.monotonic() + timeout, self._ordem, aguardar, futuro, timeout))
+
+        self._fila.put((comando, futuro, aguardar))
+        return futuro
+
+    def enviar_velocidade(self, vel_alt, vel_azi):
+        """Envia SPEED (graus/s); o Future conclui com a posição que o Arduino informa ao recebê-lo."""
+        safe_vel_alt = limitar(vel_alt * FATOR_VELOCIDADE, VELOCIDADE_MAXIMA_COMANDO)
+        safe_vel_azi = limitar(vel_azi * FATOR_VELOCIDADE, VELOCIDADE_MAXIMA_COMANDO)
+        return self.enviar(f"SPEED,{safe_vel_alt:.6f},{safe_vel_azi:.6f}", aguardar='SPEED', timeout=TIMEOUT_SPEED)
+
+    def negociar(self):
+        """Pergunta a versão do protocolo; firmware antigo não responde e o link segue em texto."""
+        futuro = self.enviar("PROTO", aguardar='PROTO', timeout=TIMEOUT_PROTOCOLO)
+
+        def concluir(f):
+            if not f.cancelled() and f.exception() is None:
+                versao = int(re.match(r'^PROTO (\d+)', f.result().linha).group(1))
+                # Quadros saem na maior versão que os dois lados entendem
+                self.versao = min(versao, VERSAO_PROTOCOLO)
+                self.binario = PROTOCOLO_BINARIO and self.versao >= 1
+
+        futuro.add_done_callback(concluir)
+        return futuro
+
+    def processar_evento(self, evento):
+        # Assinante da telemetria: conclui o comando pendente correspondente
+        if evento.tipo == EVENTO_ERRO:
+            self._rejeitar(evento.linha)
+        elif evento.tipo in CONCLUSAO_COMANDOS:
+            pendente = self._retirar(CONCLUSAO_COMANDOS[evento.tipo])
+            if pendente:
+                self._resolver(pendente[1], resultado=evento)
+
+    def _rejeitar(self, linha):
+        # Só falha os comandos que podem ter causado o erro, nunca o mais antigo às cegas
+        if linha.startswith(ERRO_LEITURA_SERIAL):
+            self._falhar_pendentes(ConnectionError(linha))  # Nenhuma resposta vai mais chegar
+            return
+        m = PADRAO_ERRO_QUADRO.match(linha)
+        if m:
+            for _, futuro in self._retirar_quadro(int(m.group(1))):
+                self._resolver(futuro, erro=RuntimeError(linha))
+            return
+        for padrao, tipo in ERROS_COMANDOS:
+            if padrao.match(linha):
+                pendente = self._retirar(tipo)
+                if pendente:
+                    self._resolver(pendente[1], erro=RuntimeError(linha))
+                return
+
+    def _retirar_quadro(self, seq):
+        # Comandos pendentes do quadro `seq` (o mais recente com esse número)
+        with self._lock:
+            for numero, itens in reversed(self._quadros):
+                if numero == seq:
+                    self._quadros.remove((numero, itens))
+                    retirados = [item for item in itens if item in self._pendentes]
+                    for item in retirados:
+                        self._pendentes.remove(item)
+                    return retirados
+        return []
+
+    def _retirar(self, tipo=None):
+        # Remove o comando pendente mais antigo (do tipo dado, se informado)
+        with self._lock:
+            for item in self._pendentes:
+                if tipo is None or item[0] == tipo:
+                    self._pendentes.remove(item)
+                    return item
+        return None
+
+    def _falhar_pendentes(self, erro):
+        with self._lock:
+            pendentes = list(self._pendentes)
+            self._pendentes.clear()
+            self._prazos.clear()
+        for _, futuro in pendentes:
+            self._resolver(futuro, erro=erro)
+
+    def _expirar(self, tipo, futuro, timeout):
+        with self._lock:
+            if (tipo, futuro) in self._pendentes:
+                self._pendentes.remove((tipo, futuro))
+        self._resolver(futuro, erro=TimeoutError(f"{tipo}: sem resposta do Arduino em {timeout:g} s"))
+
+    def _expirar_prazos(self):
+        """Expira os comandos vencidos; retorna os segundos até o próximo prazo (None sem prazos)."""
+        vencidos = []
+        with self._lock:
+            agora = time.monotonic()
+            while self._prazos and (self._prazos[0][0] <= agora or self._prazos[0][3].done()):
+                _, _, tipo, futuro, timeout = heapq.heappop(self._prazos)
+                if not futuro.done():
+                    vencidos.append((tipo, futuro, timeout))
+            espera = self._prazos[0][0] - agora if self._prazos else None
+        # Fora do lock: os callbacks dos Futures podem enviar outros comandos
+        for tipo, futuro, timeout in vencidos:
+            self._expirar(tipo, futuro, timeout)
+        return espera
+
+    def _resolver(self, futuro, resultado=None, erro=None):
+        try:
+            if erro is not None:
+                futuro.set_exception(erro)
+            else:
+                futuro.set_result(resultado)
+        except InvalidStateError:
+            pass  # Já concluído (por exemplo, expirou antes da resposta)
+
+    def _escrever(self, fila, conexao):
+        encerrar = False
+        while not encerrar:
+            # Espera o próximo comando ou o próximo prazo de resposta, o que vier antes
+            try:
+                primeiro = fila.get(timeout=self._expirar_prazos())
+            except queue.Empty:
+                continue
+
+            # Junta o que já estiver na fila para enviar em lote
+            lote = [primeiro]
+            while True:
+                try:
+                    lote.append(fila.get_nowait())
+                except queue.Empty:
+                    break
+            if None in lote:
+                encerrar = True
+                lote = [item for item in lote if item is not None]
+
+            # Em modo binário, comandos consecutivos com código viram um só
+            # quadro; os demais seguem como linhas de texto, na mesma ordem
+            grupo, registros = [], []
+            for item in lote:
+                if item[1].done():
+                    continue
+                registro = codificar_registro(item[0]) if self.binario else None
+                if registro is not None:
+                    grupo.append(item)
+                    registros.append(registro)
+                    if len(registros) == MAX_REGISTROS_QUADRO:
+                        self._transmitir_quadro(conexao, registros, grupo)
+                        grupo, registros = [], []
+                    continue
+                if grupo:
+                    self._transmitir_quadro(conexao, registros, grupo)
+                    grupo, registros = [], []
+                self._transmitir(conexao, f"{item[0]}\n".encode('utf-8'), [item])
+            if grupo:
+                self._transmitir_quadro(conexao, registros, grupo)
+
+    def _transmitir_quadro(self, conexao, registros, itens):
+        self._seq = (self._seq + 1) & 0xFFFF
+        with self._lock:
+            self._quadros.append((self._seq, [(aguardar, futuro) for _, futuro, aguardar in itens
+                                              if aguardar is not None]))
+        self._transmitir(conexao, montar_quadro(self._seq, registros, self.versao), itens)
+
+    def _transmitir(self, conexao, dados, itens):
+        # Carimbo de envio usado para medir a latência de ida e volta
+        agora = time.time()
+        for _, futuro, _ in itens:
+            futuro.instante_envio = agora
+        try:
+            inicio = time.perf_counter()
+            conexao.write(dados)
+            metricas.registrar('serial_escrita', time.perf_counter() - inicio)
+        except Exception as e:
+            for _, futuro, aguardar in itens:
+                if aguardar is not None:
+                    with self._lock:
+                        if (aguardar, futuro) in self._pendentes:
+                            self._pendentes.remove((aguardar, futuro))
+                self._resolver(futuro, erro=e)
+            log.error("Falha ao escrever na serial: %s", e)
+            if self.ao_erro:
+                self.ao_erro(str(e))
+            return
+        for _, futuro, aguardar in itens:
+            if aguardar is None:
+                self._resolver(futuro)
+
+# Parâmetros do rastreamento em malha fechada
+FATOR_VELOCIDADE = 10           # escala graus/s -> valor do comando SPEED (o firmware divide)
+VELOCIDADE_MAXIMA_COMANDO = 5.0  # limite do valor enviado no SPEED
+GANHO_CORRECAO = 0.5            # fração do erro de apontamento corrigida por período
+CORRECAO_MAXIMA = 0.01          # graus/s somados à taxa prevista, no máximo
+LIMIAR_REENVIO = 0.0002         # graus/s de variação que justificam um novo SPEED
+INTERVALO_MAXIMO_REENVIO = 2.0  # segundos sem SPEED antes de um reenvio forçado
+IDADE_MAXIMA_POSICAO = 3.0      # segundos; posição informada mais antiga é ignorada
+PASSOS_POR_GRAU = 25000.0 / 360.0  # STEPS_PER_DEGREE do sketch
+# A posição informada é inteira em passos (~52"): erros abaixo de um passo são
+# quantização, e corrigi-los só faz a montagem perseguir ruído
+ZONA_MORTA_CORRECAO = 1.0 / PASSOS_POR_GRAU  # graus
+
+def diferenca_angular(a, b):
+    # Menor diferença a - b em graus, no intervalo [-180, 180)
+    return (a - b + 180.0) % 360.0 - 180.0
+
+def zona_morta(erro, largura=ZONA_MORTA_CORRECAO):
+    # Zero dentro de ±largura e contínua fora dela (aceita arrays)
+    return np.sign(erro) * np.maximum(np.abs(erro) - largura, 0.0)
+
+def limitar(valor, limite):
+    return max(min(valor, limite), -limite)
+
+# Estimativa da latência de ida e volta da serial
+class LatencyEstimator:
+    """Média móvel exponencial do tempo entre a escrita do comando e a resposta do Arduino."""
+    def __init__(self, alfa=0.2, inicial=0.05):
+        self.alfa = alfa
+        self.rtt = inicial
+        self.amostras = 0
+
+    def registrar(self, rtt):
+        if rtt < 0:
+            return
+        self.rtt = rtt if self.amostras == 0 else (1 - self.alfa) * self.rtt + self.alfa * rtt
+        self.amostras += 1
+
+    @property
+    def ida(self):
+        return self.rtt / 2
+
+# Controle em malha fechada com compensação de latência
+class ClosedLoopController:
+    """Prevê o alvo no instante em que o comando vale e corrige pelo erro em relação à posição informada."""
+    def __init__(self, trajetorias, azimuth_offset=0.0):
+        self.trajetorias = trajetorias
+        self.azimuth_offset = azimuth_offset
+        self.latencia = LatencyEstimator()
+        self._posicao = None        # último evento com a posição da montagem
+        self._ultimo_envio = None   # (instante, cmd_alt, cmd_azi)
+
+    def reiniciar(self):
+        self._ultimo_envio = None
+
+    def on_telemetria(self, evento):
+        # Assinante da telemetria (thread de leitura)
+        if evento.tipo in (EVENTO_POSICAO, EVENTO_POSICAO_ATUAL):
+            self._posicao = evento
+
+    def calcular(self, nome, agora, periodo):
+        ida = self.latencia.ida
+
+        # O comando só vale depois de chegar ao Arduino: a taxa de alimentação
+        # direta é a média do alvo no período em que ele estará em vigor
+        t_efeito = agora + ida
+        alt0, azi0, _, _ = self.trajetorias.amostra(nome, t_efeito)
+        alt1, azi1, _, _ = self.trajetorias.amostra(nome, t_efeito + periodo)
+        cmd_alt = (alt1 - alt0) / periodo
+        cmd_azi = diferenca_angular(azi1, azi0) / periodo
+
+        erro_alt = erro_azi = None
+        posicao = self._posicao
+        if posicao is not None and agora - posicao.instante <= IDADE_MAXIMA_POSICAO:
+            # A posição foi medida meia ida-e-volta antes de chegar; desde então
+            # a montagem seguiu a última velocidade comandada
+            vel_alt, vel_azi = self._ultimo_envio[1:] if self._ultimo_envio else (0.0, 0.0)
+            dt = t_efeito - (posicao.instante - ida)
+            erro_alt = alt0 - (posicao.alt + vel_alt * dt)
+            erro_azi = diferenca_angular(azi0 + self.azimuth_offset, posicao.azi + vel_azi * dt)
+            # O snapshot mostra o erro medido; a correção só age além de um passo
+            cmd_alt += limitar(GANHO_CORRECAO * float(zona_morta(erro_alt)) / periodo, CORRECAO_MAXIMA)
+            cmd_azi += limitar(GANHO_CORRECAO * float(zona_morta(erro_azi)) / periodo, CORRECAO_MAXIMA)
+
+        return {
+            'cmd_alt': cmd_alt,
+            'cmd_azi': cmd_azi,
+            'erro_alt': erro_alt,
+            'erro_azi': erro_azi,
+            'latencia': self.latencia.rtt,
+            'enviar': self._deve_enviar(agora, cmd_alt, cmd_azi),
+        }
+
+    def _deve_enviar(self, agora, cmd_alt, cmd_azi):
+        # Só reenvia quando a velocidade muda de fato ou a última ficou antiga
+        if self._ultimo_envio is None:
+            return True
+        instante, ultimo_alt, ultimo_azi = self._ultimo_envio
+        return (agora - instante >= INTERVALO_MAXIMO_REENVIO
+                or abs(cmd_alt - ultimo_alt) > LIMIAR_REENVIO
+                or abs(cmd_azi - ultimo_azi) > LIMIAR_REENVIO)
+
+    def registrar_envio(self, futuro, instante, cmd_alt, cmd_azi):
+        self._ultimo_envio = (instante, cmd_alt, cmd_azi)
+        futuro.add_done_callback(self._medir_latencia)
+
+    def _medir_latencia(self, futuro):
+        if futuro.cancelled() or futuro.exception() is not None:
+            return
+        envio = getattr(futuro, 'instante_envio', None)
+        if envio is not None:
+            self.latencia.registrar(futuro.result().instante - envio)
+
+# Planejamento de movimento no host: segmentos de velocidade com horário
+VELOCIDADE_MAXIMA_EIXO = 5.0 / PASSOS_POR_GRAU  # graus/s (setMaxSpeed do sketch)
+ACELERACAO_EIXO = 0.2 / PASSOS_POR_GRAU         # graus/s² (setAcceleration do sketch)
+# O runSpeed() do SEG troca a velocidade na hora (a aceleração só vale no POS);
+# degraus até aqui são aceitos sem rampa, como já faz o SPEED
+VELOCIDADE_PARTIDA_EIXO = 2.0 / PASSOS_POR_GRAU  # graus/s
+DURACAO_SEGMENTO = 1.0       # segundos de cada segmento de velocidade
+HORIZONTE_SEGMENTOS = 8      # segmentos mantidos à frente na fila do Arduino
+TAMANHO_FILA_FIRMWARE = 16   # TAMANHO_FILA do sketch
+TAXA_STREAMING = 1.0         # Hz de reabastecimento da fila
+TIMEOUT_FILA = 1.0
+PADRAO_FILA = re.compile(r'^FILA (\d+) (\d+)')
+
+class MotionPlanner:
+    """Converte a trajetória prevista do alvo em segmentos (início, vel_alt, vel_azi).
+
+    Cada segmento persegue o alvo com velocidade e aceleração limitadas por
+    eixo: de longe pela curva de frenagem, de perto fechando o erro em um
+    segmento. Degraus de até `partida` graus/s entram direto, então a saída
+    do apontamento (montagem parada) já começa na taxa de rastreamento;
+    acima disso a velocidade segue a rampa.
+    """
+    def __init__(self, trajetorias, duracao=DURACAO_SEGMENTO, velocidade_maxima=VELOCIDADE_MAXIMA_EIXO,
+                 aceleracao=ACELERACAO_EIXO, partida=VELOCIDADE_PARTIDA_EIXO):
+        self.trajetorias = trajetorias
+        self.duracao = duracao
+        self.velocidade_maxima = velocidade_maxima
+        self.aceleracao = aceleracao
+        self.partida = partida
+        self.nome = None
+        self.instante = None               # fim do último segmento planejado
+        self.comandada = np.zeros(2)       # (alt, azi) integrando só as velocidades enviadas
+        self.desvio = np.zeros(2)          # posição real estimada - comandada
+        self.velocidade = np.zeros(2)
+        self._historico = deque(maxlen=4 * TAMANHO_FILA_FIRMWARE)  # (início, alt, azi, vel_alt, vel_azi)
+        self._lock = threading.Lock()
+
+    @property
+    def posicao(self):
+        return self.comandada + self.desvio
+
+    def reiniciar(self, nome, instante, alt, azi, vel_alt=0.0, vel_azi=0.0):
+        with self._lock:
+            self.nome = nome
+            self.instante = instante
+            self.comandada = np.array([alt, azi % 360.0])
+            self.desvio = np.zeros(2)
+            self.velocidade = np.array([vel_alt, vel_azi], dtype=float)
+            self._historico.clear()
+            self._historico.append((instante, alt, azi % 360.0, vel_alt, vel_azi))
+
+    def adiar(self, instante):
+        # Plano atrasado (host travou): a montagem seguiu a última velocidade até aqui
+        with self._lock:
+            if instante > self.instante:
+                self.comandada = self.comandada + self.velocidade * (instante - self.instante)
+                self.comandada[1] %= 360.0
+                self.instante = instante
+
+    def proximo(self):
+        """Planeja o próximo segmento e retorna (início, vel_alt, vel_azi) em graus/s."""
+        with self._lock:
+            inicio, dt = self.instante, self.duracao
+            alt0, azi0, _, _ = self.trajetorias.amostra(self.nome, inicio)
+            alt1, azi1, _, _ = self.trajetorias.amostra(self.nome, inicio + dt)
+            vel_alvo = np.array([(alt1 - alt0) / dt, diferenca_angular(azi1, azi0) / dt])
+            posicao = self.posicao
+            erro = np.array([alt0 - posicao[0], diferenca_angular(azi0, posicao[1])])
+
+            # Velocidade relativa que ainda permite frear até o alvo sem ultrapassá-lo
+            aproximacao = np.minimum(np.abs(erro) / dt, np.sqrt(2 * self.aceleracao * np.abs(erro)))
+            desejada = vel_alvo + np.sign(erro) * aproximacao
+            passo = max(self.aceleracao * dt, self.partida)
+            velocidade = np.clip(desejada, self.velocidade - passo, self.velocidade + passo)
+            velocidade = np.clip(velocidade, -self.velocidade_maxima, self.velocidade_maxima)
+
+            self._historico.append((inicio, *self.comandada, *velocidade))
+            self.comandada = self.comandada + velocidade * dt
+            self.comandada[1] %= 360.0
+            self.velocidade = velocidade
+            self.instante = inicio + dt
+            return inicio, float(velocidade[0]), float(velocidade[1])
+
+    def planejada(self, instante):
+        """Posição (alt, azi) em que o plano põe a montagem no instante, ou None antes do plano."""
+        with self._lock:
+            for inicio, alt, azi, vel_alt, vel_azi in reversed(self._historico):
+                if inicio <= instante:
+                    dt = instante - inicio
+                    return (alt + vel_alt * dt + self.desvio[0],
+                            (azi + vel_azi * dt + self.desvio[1]) % 360.0)
+        return None
+
+    def corrigir(self, instante, alt, azi, ganho=GANHO_CORRECAO):
+        """Desloca o plano pela diferença entre a posição medida e a planejada; retorna o erro."""
+        planejada = self.planejada(instante)
+        if planejada is None:
+            return None
+        erro = np.array([alt - planejada[0], diferenca_angular(azi, planejada[1])])
+        with self._lock:
+            # Os próximos segmentos compensam; os já enfileirados não mudam.
+            # Como no ClosedLoopController, erros de até um passo são quantização
+            self.desvio = self.desvio + ganho * zona_morta(erro)
+        return erro
+
+# Abastecimento da fila de segmentos do Arduino
+class SegmentStreamer(TrackingLoop):
+    """Mantém a fila de segmentos do Arduino abastecida com o plano do MotionPlanner.
+
+    Mesmo agendamento e snapshots do TrackingLoop, mas cada tick só completa a
+    fila, respeitando as vagas que o Arduino informa no FILA. Os segmentos
+    levam o horário de início no relógio do Arduino (millis), estimado pelas
+    respostas do FILA, então o jitter do host não afeta a execução.
+    """
+    modo = 'segmentos'
+
+    def __init__(self, trajetorias, link, planejador, azimuth_offset=0.0, taxa=TAXA_STREAMING, controlador=None):
+        super().__init__(trajetorias, None, taxa, controlador)
+        self.link = link
+        self.planejador = planejador
+        self.azimuth_offset = azimuth_offset
+        self.latencia = LatencyEstimator()
+        self.segmentos_enviados = 0
+        self.velocidade_montagem = np.zeros(2)  # velocidade em vigor no Arduino, no fim do que foi enviado
+        self._posicao = None   # último evento com a posição da montagem
+        self._erro = None      # último erro medido contra o plano
+        self._livres = 0
+        self._consulta = None  # Future do FILA em andamento
+        self._relogio = None   # millis() do Arduino - milissegundos Unix do host
+
+    def start(self, alvo):
+        self.stop()
+        # O plano parte de onde a montagem está: última posição informada,
+        # avançada pela velocidade que ela mantinha
+        inicio = time.time()
+        vel_alt, vel_azi = self.velocidade_montagem
+        posicao = self._posicao
+        if posicao is not None:
+            dt = inicio - posicao.instante
+            alt = posicao.alt + vel_alt * dt
+            azi = posicao.azi - self.azimuth_offset + vel_azi * dt
+        else:
+            # Sem posição informada, supõe a montagem no alvo agora
+            alt, azi, _, _ = self.trajetorias.amostra(alvo, inicio)
+        self.planejador.reiniciar(alvo, inicio, alt, azi, vel_alt, vel_azi)
+        self._erro = None
+        self._consulta = None
+        self._livres = 0
+        super().start(alvo)
+
+    def stop(self):
+        super().stop()
+        if self.planejador.nome is not None:
+            # A fila termina de executar e o Arduino mantém a última velocidade
+            self.velocidade_montagem = self.planejador.velocidade.copy()
+
+    def montagem_parada(self):
+        # POS ou STOP: o Arduino descarta a fila e para os motores
+        self.velocidade_montagem = np.zeros(2)
+
+    def on_telemetria(self, evento):
+        # Assinante da telemetria (thread de leitura)
+        if evento.tipo in (EVENTO_RECEBIDO, EVENTO_POSICAO):
+            self.montagem_parada()
+        if evento.tipo in (EVENTO_POSICAO, EVENTO_POSICAO_ATUAL):
+            self._posicao = evento
+            if self.ativo and self.controlador is not None and evento.tipo == EVENTO_POSICAO_ATUAL:
+                instante = evento.instante - self.latencia.ida
+                self._erro = self.planejador.corrigir(instante, evento.alt, evento.azi - self.azimuth_offset)
+
+    def _comandar(self, instante, snapshot):
+        self._abastecer(instante)
+        if self._erro is not None:
+            snapshot.update(erro_alt=float(self._erro[0]), erro_azi=float(self._erro[1]))
+        snapshot.update(latencia=self.latencia.rtt, segmentos=self.segmentos_enviados)
+
+    def _abastecer(self, agora):
+        if self._relogio is None and self._consulta is None:
+            # Sem o relógio do Arduino nada pode ser enviado: o primeiro FILA é
+            # esperado neste tick em vez de deixar a montagem parada até o próximo
+            self._consulta = self.link.enviar("FILA", aguardar='FILA', timeout=TIMEOUT_FILA)
+            wait([self._consulta], timeout=TIMEOUT_FILA)
+        consulta = self._consulta
+        if consulta is not None:
+            if not consulta.done():
+                return  # As vagas só são conhecidas depois da resposta do FILA
+            self._consulta = None
+            if consulta.cancelled() or consulta.exception() is not None:
+                self._livres = 0
+            else:
+                self._sincronizar(consulta)
+
+        if self._relogio is not None and self._livres > 0:
+            # Segmentos com início no passado seriam executados todos de uma vez: o
+            # primeiro que falta começa quando chega, e até lá vale a velocidade anterior
+            self.planejador.adiar(agora + self.latencia.ida)
+            limite = agora + HORIZONTE_SEGMENTOS * self.planejador.duracao
+            enviados = 0
+            while enviados < self._livres and self.planejador.instante < limite:
+                inicio, vel_alt, vel_azi = self.planejador.proximo()
+                valor_alt = limitar(vel_alt * FATOR_VELOCIDADE, VELOCIDADE_MAXIMA_COMANDO)
+                valor_azi = limitar(vel_azi * FATOR_VELOCIDADE, VELOCIDADE_MAXIMA_COMANDO)
+                self.link.enviar(f"SEG,{self._millis(inicio)},{valor_alt:.6f},{valor_azi:.6f}")
+                if self.gravador is not None:
+                    self.gravador.registrar_comando('seg', inicio, vel_alt=vel_alt, vel_azi=vel_azi,
+                                                    periodo=self.planejador.duracao)
+                enviados += 1
+            self._livres -= enviados
+            self.segmentos_enviados += enviados
+            if enviados:
+                log.debug("%d segmentos enviados até %.1f s à frente", enviados, self.planejador.instante - agora)
+
+        # Cada consulta devolve as vagas, o relógio do Arduino e a posição atual
+        self._consulta = self.link.enviar("FILA", aguardar='FILA', timeout=TIMEOUT_FILA)
+
+    def _sincronizar(self, futuro):
+        evento = futuro.result()
+        livres, millis = map(int, PADRAO_FILA.match(evento.linha).groups())
+        self._livres = livres
+
+        envio = getattr(futuro, 'instante_envio', None)
+        if envio is None:
+            return
+        rtt = evento.instante - envio
+        self.latencia.registrar(rtt)
+        # millis() foi lido cerca de meia ida-e-volta antes de a linha chegar
+        deslocamento = millis - (evento.instante - rtt / 2) * 1000.0
+        if self._relogio is None:
+            self._relogio = deslocamento
+        else:
+            # Média móvel acompanha a deriva do cristal; a diferença é tomada
+            # módulo 2^32 porque millis() dá a volta a cada ~49 dias
+            diferenca = (deslocamento - self._relogio + 2**31) % 2**32 - 2**31
+            self._relogio += 0.2 * diferenca
+
+    def _millis(self, instante):
+        return int(round(instante * 1000.0 + self._relogio)) & 0xFFFFFFFF
+
+
+# Montagem padrão
+PORTAS_SERIAIS = ['COM6']
+BAUD_SERIAL = 115200
+
+# Apontamento: limites de giro e modelo de tempo dos eixos
+LIMITES_AZIMUTE = (-360.0, 360.0)  # graus enviados no POS (limite do sketch); reduza se os cabos não aguentam
+EIXOS_SIMULTANEOS = False          # o sketch move um eixo de cada vez
+ITERACOES_INTERCEPTACAO = 3
+
+Movimento = namedtuple('Movimento', 'alt azi duracao')  # azi no referencial da montagem, já desenrolado
+
+class SlewPlanner:
+    """Prevê o tempo de um POS e escolhe o caminho de azimute mais curto dentro dos limites.
+
+    O firmware aceita alvos absolutos de -360° a 360°, então 359° -> 1° pode
+    ser enviado como 361° em vez de dar a volta inteira. Cada eixo segue o
+    perfil trapezoidal do AccelStepper (velocidade e aceleração máximas).
+    """
+    def __init__(self, azimuth_offset=0.0, velocidade_maxima=VELOCIDADE_MAXIMA_EIXO, aceleracao=ACELERACAO_EIXO,
+                 limites=LIMITES_AZIMUTE, simultaneos=EIXOS_SIMULTANEOS):
+        if limites[1] - limites[0] < 360.0:
+            raise ValueError("Os limites de azimute precisam cobrir uma volta inteira")
+        self.azimuth_offset = azimuth_offset
+        self.velocidade_maxima = velocidade_maxima
+        self.aceleracao = aceleracao
+        self.limites = limites
+        self.simultaneos = simultaneos
+
+    def duracao_eixo(self, distancia):
+        # Trapezoidal se atinge a velocidade máxima, triangular se não
+        distancia = abs(distancia)
+        v, a = self.velocidade_maxima, self.aceleracao
+        if distancia >= v * v / a:
+            return distancia / v + v / a
+        return 2 * math.sqrt(distancia / a)
+
+    def azimute_montagem(self, azi, atual):
+        """Valor do POS equivalente a `azi` (céu) mais próximo do azimute atual da montagem."""
+        base = (azi + self.azimuth_offset) % 360.0
+        minimo, maximo = self.limites
+        candidatos = [base + 360.0 * k for k in range(-2, 3) if minimo <= base + 360.0 * k <= maximo]
+        return min(candidatos, key=lambda c: abs(c - atual))
+
+    def planejar(self, origem, alt, azi):
+        """Movimento da posição da montagem `origem` (alt, azi) até o alvo (alt, azi do céu)."""
+        destino = self.azimute_montagem(azi, origem[1])
+        duracao_alt = self.duracao_eixo(alt - origem[0])
+        duracao_azi = self.duracao_eixo(destino - origem[1])
+        duracao = max(duracao_alt, duracao_azi) if self.simultaneos else duracao_alt + duracao_azi
+        return Movimento(alt, destino, duracao)
+
+    def interceptar(self, origem, posicao, instante, iteracoes=ITERACOES_INTERCEPTACAO):
+        """Aponta para onde o alvo estará na chegada; posicao(instante) -> (alt, azi) do céu."""
+        movimento = self.planejar(origem, *posicao(instante))
+        for _ in range(iteracoes - 1):
+            movimento = self.planejar(origem, *posicao(instante + movimento.duracao))
+        return movimento
+
+def abrir_porta(porta, baudrate=BAUD_SERIAL):
+    if porta.startswith(PORTA_SIMULADOR):
+        # Import tardio: o simulador importa este módulo. SIM, SIM2, ... são montagens distintas
+        from simulador import VirtualMount
+        return VirtualMount(port=porta)
+    conexao = serial.Serial(
+        porta,
+        baudrate=baudrate,
+        timeout=1,
+        write_timeout=1
+    )
+    time.sleep(2)  # O Arduino reinicia ao abrir a porta
+    return conexao
+
+def listar_portas():
+    # Portas seriais do sistema; a montagem simulada só entra quando pedida
+    from serial.tools import list_ports
+    return [p.device for p in list_ports.comports()]
+
+def abrir_portas(portas, baudrate=BAUD_SERIAL):
+    """Abre as portas em paralelo, então as esperas do reset do Arduino correm juntas.
+
+    Retorna [(porta, conexao)] na ordem de `portas`, sem as que falharam.
+    """
+    def abrir(porta):
+        try:
+            return porta, abrir_porta(porta, baudrate)
+        except Exception as e:
+            log.debug("Porta %s indisponível: %s", porta, e)
+            return porta, None
+
+    if not portas:
+        return []
+    with ThreadPoolExecutor(max_workers=len(portas), thread_name_prefix="porta") as executor:
+        return [(porta, conexao) for porta, conexao in executor.map(abrir, portas) if conexao is not None]
+
+# Efemérides e catálogo, compartilhados pelas montagens do mesmo host
+class SkyModel:
+    """Tabela de trajetórias, catálogo e índice do céu, independentes da montagem.
+
+    Cada TrackingCore usa um; com várias montagens (MountManager) todas
+    compartilham o mesmo, e a tabela é calculada uma vez para todas.
+    """
+    def __init__(self, catalogo=CATALOGO_ESTRELAS, tle=ARQUIVO_TLE):
+        self.trajetorias = TrajectoryEngine()
+        self.arquivo_catalogo = catalogo
+        self.arquivo_tle = tle
+        self.catalogo = None
+        self.indice = None
+        self.satelites = None
+        self.alvos = None  # TargetIndex da lista de alvos da interface
+        self.carregado = False
+        self._lock = threading.Lock()
+
+    def carregar(self):
+        """Lê o kernel e o catálogo e calcula as primeiras posições (bloqueante, só na primeira vez).
+
+        Retorna a lista de astros; sem o kernel levanta FileNotFoundError.
+        """
+        with self._lock:
+            if not self.carregado:
+                # A primeira interpolação abre a sessão de efemérides e monta a tabela
+                self.trajetorias.interpolar()
+
+                # Catálogo de estrelas opcional; o cache .npy evita reprocessar o arquivo
+                catalogo = self.arquivo_catalogo
+                if catalogo and os.path.exists(os.path.expanduser(catalogo)):
+                    self.catalogo = StarCatalog.carregar(catalogo)
+                    self.indice = SkyIndex(self.catalogo.ra, self.catalogo.dec)
+
+                # Satélites opcionais, de um arquivo TLE local
+                tle = self.arquivo_tle
+                if tle and os.path.exists(os.path.expanduser(tle)):
+                    sessao = EphemerisSession.get()
+                    self.satelites = SatelliteCatalog.carregar(tle, latitude=sessao.latitude,
+                                                               longitude=sessao.longitude,
+                                                               elevacao=sessao.elevacao,
+                                                               refracao=sessao.refracao)
+
+                self.alvos = TargetIndex(self.trajetorias, self.catalogo, self.satelites)
+                self.alvos.atualizar()
+                self.carregado = True
+        return self.astros()
+
+    def astros(self):
+        """Astros da sessão e estrelas brilhantes acima do horizonte, com alt/az."""
+        # Consulta a tabela de trajetórias (recalculada só quando a janela expira)
+        astros = self.trajetorias.posicoes()
+
+        # Estrelas brilhantes acima do horizonte, do último recálculo do catálogo
+        if self.catalogo is not None and self.catalogo.posicoes is not None:
+            _, alt, azi, _ = self.catalogo.posicoes
+            for i in self.catalogo.visiveis():
+                astros.append({
+                    'nome': str(self.catalogo.nome[i]),
+                    'altitude': float(alt[i]),
+                    'azimute': float(azi[i]),
+                    'indice': int(i)
+                })
+        return astros
+
+    def encontrar(self, nome):
+        """Astro pelo nome (sem diferenciar maiúsculas), incluindo o catálogo e os satélites."""
+        chave = nome.strip().lower()
+        for nome_astro in self.trajetorias.nomes:
+            if nome_astro.lower() == chave:
+                return {'nome': nome_astro}
+        if self.catalogo is not None:
+            indices = np.flatnonzero(np.char.lower(np.asarray(self.catalogo.nome)) == chave)
+            if len(indices):
+                return {'nome': str(self.catalogo.nome[indices[0]]), 'indice': int(indices[0])}
+        if self.satelites is not None:
+            indice = self.satelites.indice(nome)
+            if indice is not None:
+                return {'nome': self.satelites.nomes[indice], 'satelite': indice}
+        return None
+
+    def atualizar_catalogo(self):
+        # Recalcula alt/az de todo o catálogo e da lista de alvos (bloqueante; chamar fora da interface)
+        if self.catalogo is not None:
+            self.catalogo.atualizar(EphemerisSession.get())
+        if self.alvos is not None:
+            self.alvos.atualizar()
+
+    def registrar(self, astro):
+        # Estrelas do catálogo entram na sessão e na tabela de trajetórias ao serem escolhidas;
+        # satélites ganham uma trajetória densa própria, propagada pelo SGP4
+        if 'indice' in astro:
+            EphemerisSession.get().registrar_estrela(astro['nome'], self.catalogo.estrela(astro['indice']))
+            self.trajetorias.adicionar(astro['nome'])
+        elif 'satelite' in astro and astro['nome'] not in self.trajetorias.caminhos:
+            self.trajetorias.adicionar_caminho(astro['nome'], self.satelites.fonte(astro['satelite']))
+
+    def descrever_campo(self, alt, azi, instante):
+        # Astros da sessão a até RAIO_CAMPO e as estrelas do catálogo mais próximas
+        proximos = {}
+        alts, azis, _, _ = self.trajetorias.interpolar(instante)
+        distancias = separacao_angular(alt, azi, alts, azis)
+        for nome, distancia in zip(self.trajetorias.nomes, distancias):
+            if distancia <= RAIO_CAMPO:
+                proximos[nome] = float(distancia)
+
+        if self.indice is not None:
+            ra, dec = EphemerisSession.get().radec_do_altaz(alt, azi, instante)
+            indices, distancias = self.indice.vizinhos(ra, dec, VIZINHOS_CAMPO)
+            for i, distancia in zip(indices, distancias):
+                proximos.setdefault(str(self.catalogo.nome[i]), float(distancia))
+
+        if not proximos:
+            return "No campo: --"
+        ordenados = sorted(proximos.items(), key=lambda item: item[1])[:VIZINHOS_CAMPO]
+        return "No campo: " + ", ".join(f"{nome} ({distancia:.2f}°)" for nome, distancia in ordenados)
+
+# Núcleo do rastreamento, sem interface gráfica
+class TrackingCore:
+    """Efemérides, seleção de alvo, enlace serial e laço de rastreamento.
+
+    Usado pela interface (rastreamento.py) e pela linha de comando (rastrear.py).
+    Callbacks das threads de serial e de rastreamento chegam pelas assinaturas
+    de `telemetria` e pela fila `tracker.snapshots`. A construção é leve; o
+    kernel e o catálogo só são lidos em `carregar()`. Passando o `ceu` de
+    outro núcleo, efemérides e catálogo são compartilhados (ver MountManager).
+    """
+    def __init__(self, azimuth_offset=None, taxa=TAXA_RASTREAMENTO, catalogo=CATALOGO_ESTRELAS, ceu=None,
+                 tle=ARQUIVO_TLE):
+        # Sem ajuste explícito, vale o do local (SiteProfile)
+        if azimuth_offset is None:
+            azimuth_offset = SiteProfile.atual().azimuth_offset
+        self.azimuth_offset = azimuth_offset
+        self.ceu = ceu if ceu is not None else SkyModel(catalogo, tle)
+        self.trajetorias = self.ceu.trajetorias
+        self.controlador = ClosedLoopController(self.trajetorias, azimuth_offset)
+        self.telemetria = TelemetryBuffer()
+        self.reader = SerialReader(self.telemetria)  # Thread para leitura da serial
+        self.link = SerialLink()
+        # Dois modos de rastreamento: SPEED a cada tick, ou fila de segmentos
+        # planejados quando o firmware a suporta; `tracker` aponta o que está em uso
+        self.laco = TrackingLoop(self.trajetorias, self.enviar_velocidade, taxa, self.controlador)
+        self.planejador = MotionPlanner(self.trajetorias)
+        self.movimentos = SlewPlanner(azimuth_offset)
+        self.movimento = None  # Último POS planejado (Movimento), para exibir a previsão
+        self.streamer = SegmentStreamer(self.trajetorias, self.link, self.planejador, azimuth_offset,
+                                        controlador=self.controlador)
+        self.tracker = self.laco
+        self.taxa = taxa  # escolhida pelo usuário; satélites usam pelo menos TAXA_SATELITE
+        self.usar_segmentos = True
+        self._velocidade_verificada = None  # último satélite cujo pico de velocidade já foi avisado
+        self.telemetria.assinar(self.link.processar_evento)
+        self.telemetria.assinar(self.controlador.on_telemetria)
+        self.telemetria.assinar(self.streamer.on_telemetria)
+        self.telemetria.assinar(self.on_telemetria)
+        self.conexao = None
+        self.porta = None
+        self.identificador = None  # ID informado pelo firmware (a porta, em firmware sem ID)
+        self.posicao_informada = None  # Última posição informada pelo Arduino (alt, azi)
+        self.alvo = None
+        self.calibrado = False
+        self.gravador = None
+        self._cancelar_gravacao = None
+
+    # Efemérides e catálogo (SkyModel, possivelmente compartilhado com outras montagens)
+
+    @property
+    def catalogo(self):
+        return self.ceu.catalogo
+
+    @property
+    def indice(self):
+        return self.ceu.indice
+
+    @property
+    def carregado(self):
+        return self.ceu.carregado
+
+    @property
+    def satelites(self):
+        return self.ceu.satelites
+
+    @property
+    def alvos(self):
+        return self.ceu.alvos
+
+    def carregar(self):
+        """Lê o kernel e o catálogo e calcula as primeiras posições (bloqueante).
+
+        Retorna a lista de astros; sem o kernel levanta FileNotFoundError.
+        """
+        return self.ceu.carregar()
+
+    # Conexão
+
+    def conectar(self, portas=None):
+        """Abre as portas em paralelo e fica com a primeira cujo firmware se identificar; retorna a porta.
+
+        Sem `portas`, tenta PORTAS_SERIAIS e depois as demais portas do sistema.
+        """
+        if portas is None:
+            portas = PORTAS_SERIAIS + [porta for porta in listar_portas() if porta not in PORTAS_SERIAIS]
+        for porta, conexao in abrir_portas(portas):
+            if self.conexao is not None:
+                conexao.close()  # Já identificada em uma porta anterior da lista
+                continue
+            self.conexao = conexao
+            self.porta = porta
+            inicio = time.time()
+            self.link.abrir(conexao)
+            self.reader.abrir(conexao)
+            try:
+                self.identificador = self.identificar(desde=inicio)
+            except ConnectionError as e:
+                log.info("Porta %s ignorada: %s", porta, e)
+                self.desconectar()
+        if self.conexao is None:
+            raise ConnectionError("Nenhuma porta encontrada!")
+        return self.porta
+
+    def identificar(self, timeout=TIMEOUT_IDENTIFICACAO, desde=0.0):
+        """Confirma que a porta tem o firmware do rastreamento; retorna o identificador dele.
+
+        Negocia o protocolo e pede o ID. Firmware sem ID é reconhecido pela
+        resposta ao PROTO ou pelo aviso impresso ao reiniciar, e leva o nome da porta.
+        """
+        protocolo = self.link.negociar()
+        identificacao = self.link.enviar("ID", aguardar='ID', timeout=timeout)
+        try:
+            return re.match(r'^ID (\S+)', identificacao.result().linha).group(1)
+        except Exception:
+            pass
+        try:
+            protocolo.result()
+            return self.porta
+        except Exception:
+            pass
+        if any(evento.linha.startswith(BANNER_FIRMWARE) for evento in self.telemetria.eventos_desde(desde)):
+            return self.porta
+        raise ConnectionError("sem resposta do firmware de rastreamento")
+
+    def desconectar(self):
+        # Encerra as threads de leitura e escrita antes de fechar a porta
+        self.pausar()
+        self.reader.fechar()
+        self.link.fechar()
+        if self.conexao is not None:
+            self.conexao.close()
+        self.conexao = None
+        self.porta = None
+
+    @property
+    def conectado(self):
+        return self.link.aberto
+
+    def calibrar(self):
+        """Envia CALIBRATE; o Future conclui com a confirmação do Arduino."""
+        futuro = self.link.enviar("CALIBRATE", aguardar='CALIBRATE', timeout=TIMEOUT_CALIBRACAO)
+
+        def concluir(f):
+            self.calibrado = not f.cancelled() and f.exception() is None
+            if self.calibrado:
+                self.posicao_informada = (0.0, 0.0)  # CALIBRATE zera as posições dos dois eixos
+
+        futuro.add_done_callback(concluir)
+        return futuro
+
+    # Alvos
+
+    def astros(self):
+        """Astros da sessão e estrelas brilhantes acima do horizonte, com alt/az."""
+        return self.ceu.astros()
+
+    def encontrar(self, nome):
+        """Astro pelo nome (sem diferenciar maiúsculas), incluindo todo o catálogo."""
+        return self.ceu.encontrar(nome)
+
+    def atualizar_catalogo(self):
+        # Recalcula alt/az do catálogo e da lista de alvos (bloqueante; chamar fora da interface)
+        self.ceu.atualizar_catalogo()
+
+    def selecionar(self, astro):
+        """Define o alvo e envia POS para a posição atual dele.
+
+        Retorna (altitude, azimute, futuro); o Future conclui quando o Arduino
+        atinge a posição.
+        """
+        self.pausar()
+        self.alvo = astro['nome']
+        self.registrar(astro)
+
+        # Mira onde o astro estará ao fim do apontamento, pelo caminho de azimute mais curto
+        nome = astro['nome']
+        self.movimento = self.movimentos.interceptar(
+            self.posicao_montagem(), lambda instante: self.trajetorias.prever(nome, instante), time.time())
+        altitude = self.movimento.alt
+        azimute = (self.movimento.azi - self.azimuth_offset) % 360
+        return altitude, azimute, self.enviar_posicao(altitude, azimute, self.movimento.azi)
+
+    def posicao_montagem(self):
+        # (alt, azi) da montagem como o Arduino conta; ao ligar os dois eixos estão em zero
+        return self.posicao_informada if self.posicao_informada is not None else (0.0, 0.0)
+
+    def registrar(self, astro):
+        self.ceu.registrar(astro)
+
+    # Movimento
+
+    def rastrear(self):
+        if self.alvo is None:
+            raise ValueError("Selecione um astro primeiro!")
+        self.pausar()
+        if self.satelite:
+            # Segmentos de 1 s não acompanham um satélite: SPEED a TAXA_SATELITE ou mais
+            agora = time.time()
+            self.verificar_velocidade(self.alvo, agora, agora + JANELA_CAMINHO)
+            self.tracker = self.laco
+        else:
+            self.tracker = self.streamer if self.usar_segmentos and self.link.segmentos else self.laco
+        self.laco.set_taxa(self._taxa_laco())
+        self.tracker.start(self.alvo)
+
+    @property
+    def satelite(self):
+        # Alvos com trajetória densa própria (PathTable) são satélites
+        return self.alvo is not None and self.alvo in self.trajetorias.caminhos
+
+    def _taxa_laco(self):
+        return max(self.taxa, TAXA_SATELITE) if self.satelite else self.taxa
+
+    def verificar_velocidade(self, nome, inicio, fim):
+        """Avisa (uma vez por satélite) se a passagem exige mais que a velocidade máxima dos eixos.
+
+        Retorna (vel_alt, vel_azi) de pico em graus/s, ou None se `nome` não é um satélite.
+        """
+        indice = self.satelites.indice(nome) if self.satelites is not None else None
+        if indice is None:
+            return None
+        pico = self.satelites.velocidades_maximas(indice, inicio, fim)
+        limite = self.movimentos.velocidade_maxima
+        if max(pico) > limite and self._velocidade_verificada != nome:
+            self._velocidade_verificada = nome
+            log.warning("%s exige até %.2f°/s em altitude e %.2f°/s em azimute; os eixos vão até %.3f°/s "
+                        "e a montagem vai ficar para trás nesse trecho", nome, pico[0], pico[1], limite)
+        return pico
+
+    @property
+    def modo(self):
+        return self.tracker.modo
+
+    def pausar(self):
+        self.laco.stop()
+        self.streamer.stop()
+
+    def parar(self):
+        self.pausar()
+        self.alvo = None
+        self.streamer.montagem_parada()
+        # Envia comando STOP para o Arduino
+        return self.link.enviar("STOP")
+
+    def definir_taxa(self, taxa):
+        # Frequência dos SPEED; a fila de segmentos tem ritmo próprio
+        self.taxa = float(taxa)
+        self.laco.set_taxa(self._taxa_laco())
+
+    def definir_malha_fechada(self, ativa):
+        # Troca o modo no próximo tick, sem interromper o rastreamento
+        self.laco.controlador = self.streamer.controlador = self.controlador if ativa else None
+
+    def enviar_velocidade(self, vel_alt, vel_azi):
+        # Chamado pela thread de rastreamento: apenas enfileira a escrita
+        if self.link.aberto:
+            log.debug("Comando SPEED enviado: %.6f, %.6f graus/s", vel_alt, vel_azi)
+        return self.link.enviar_velocidade(vel_alt, vel_azi)
+
+    def enviar_posicao(self, alt, azi, azimute_montagem=None):
+        """Envia POS e retorna um Future concluído quando o Arduino atinge a posição.
+
+        `azimute_montagem` é o valor já desenrolado do SlewPlanner; sem ele o
+        azimute ajustado vai entre 0° e 360°.
+        """
+        if not (-90 <= alt <= 90):
+            log.warning("Coordenadas inválidas: alt=%.2f", alt)
+            futuro = Future()
+            futuro.set_exception(ValueError("Coordenadas inválidas!"))
+            return futuro
+
+        if azimute_montagem is not None:
+            adjusted_azi = azimute_montagem
+        else:
+            adjusted_azi = (azi + self.azimuth_offset) % 360  # Garante que o valor fique entre 0° e 360°
+
+        # Inverte a ordem: primeiro envia o azimute (ajustado) e depois a altitude
+        comando = f"POS,{adjusted_azi:.2f},{alt:.2f}"
+        log.info("Comando POS enviado: %s", comando)
+        if self.gravador is not None:
+            self.gravador.registrar_comando('pos', time.time(), alt, adjusted_azi)
+        return self.link.enviar(comando, aguardar='POS', timeout=TIMEOUT_POS)
+
+    # Telemetria
+
+    def gravar(self, gravador):
+        """Passa ticks, comandos e telemetria ao `gravador` (TelemetryRecorder); None desliga."""
+        if self._cancelar_gravacao is not None:
+            self._cancelar_gravacao()
+            self._cancelar_gravacao = None
+        self.gravador = self.laco.gravador = self.streamer.gravador = gravador
+        if gravador is not None:
+            self._cancelar_gravacao = self.telemetria.assinar(gravador.on_telemetria)
+
+    def on_telemetria(self, evento):
+        # Roda na thread de leitura: só guarda estado
+        if evento.tipo == EVENTO_ERRO:
+            log.warning("Arduino: %s", evento.linha)
+        else:
+            log.debug("Arduino: %s", evento.linha)
+        if evento.tipo in (EVENTO_POSICAO, EVENTO_POSICAO_ATUAL):
+            self.posicao_informada = (evento.alt, evento.azi)
+
+    def descrever_campo(self, alt, azi, instante):
+        return self.ceu.descrever_campo(alt, azi, instante)
+
+# Várias montagens no mesmo host
+class MountManager:
+    """Descobre as montagens nas portas seriais e dá a cada uma seu TrackingCore.
+
+    Cada montagem tem conexão, leitura, enlace e laço de rastreamento
+    próprios; todas usam o mesmo SkyModel, então várias montagens não
+    multiplicam o custo das efemérides.
+    """
+    def __init__(self, azimuth_offset=None, taxa=TAXA_RASTREAMENTO, catalogo=CATALOGO_ESTRELAS,
+                 tle=ARQUIVO_TLE):
+        self.azimuth_offset = azimuth_offset  # None: o do local, como no TrackingCore
+        self.taxa = taxa
+        self.ceu = SkyModel(catalogo, tle)
+        self.montagens = {}  # identificador -> TrackingCore
+        self._lock = threading.Lock()
+
+    def carregar(self):
+        return self.ceu.carregar()
+
+    def descobrir(self, portas=None):
+        """Sonda as portas em paralelo e conecta cada firmware identificado; retorna as novas montagens."""
+        portas = listar_portas() if portas is None else list(portas)
+        with self._lock:
+            em_uso = {nucleo.porta for nucleo in self.montagens.values()}
+        portas = [porta for porta in dict.fromkeys(portas) if porta not in em_uso]
+        if not portas:
+            return {}
+
+        # Abertura (com o reset do Arduino) e identificação de todas as portas ao mesmo tempo
+        with ThreadPoolExecutor(max_workers=len(portas), thread_name_prefix="sonda") as executor:
+            nucleos = list(executor.map(self._sondar, portas))
+
+        novas = {}
+        with self._lock:
+            for nucleo in nucleos:
+                if nucleo is None:
+                    continue
+                if nucleo.identificador in self.montagens or nucleo.identificador in novas:
+                    # Dois sketches gravados com o mesmo IDENTIFICADOR
+                    nucleo.identificador = f"{nucleo.identificador}@{nucleo.porta}"
+                novas[nucleo.identificador] = nucleo
+            self.montagens.update(novas)
+        log.info("Montagens encontradas: %s",
+                 ", ".join(f"{i} ({n.porta})" for i, n in novas.items()) or "nenhuma")
+        return novas
+
+    def _sondar(self, porta):
+        nucleo = TrackingCore(self.azimuth_offset, self.taxa, ceu=self.ceu)
+        try:
+            nucleo.conectar([porta])
+        except ConnectionError:
+            nucleo.desconectar()  # Sem montagem na porta: nada deste núcleo pode ficar rodando
+            return None
+        return nucleo
+
+    def parar(self):
+        """STOP em todas as montagens; retorna os Futures."""
+        with self._lock:
+            nucleos = list(self.montagens.values())
+        return [nucleo.parar() for nucleo in nucleos]
+
+    def desconectar(self):
+        with self._lock:
+            nucleos = list(self.montagens.values())
+            self.montagens.clear()
+        for nucleo in nucleos:
+            nucleo.desconectar()
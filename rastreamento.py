@@ -1,61 +1,67 @@
 import customtkinter as ctk
-from skyfield.api import Loader, Topos
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
-import serial
 import time
 import threading
-from datetime import timedelta
+import queue
+import os
+import logging
+from datetime import datetime
+from nucleo import (
+    TrackingCore, SiteProfile, PORTA_SIMULADOR, TAXA_RASTREAMENTO, TAXAS_RASTREAMENTO,
+    INTERVALO_CATALOGO, MAGNITUDE_LIMITE_LISTA, EVENTO_POSICAO, EVENTO_POSICAO_ATUAL, EVENTO_ERRO,
+    metricas, capturar_perfil
+)
+from agenda import NightScheduler, ObservingSession, preparar_alvos, ESTADO_RASTREANDO, ESTADO_CONCLUIDA
+
+log = logging.getLogger('rastreamento.interface')
 
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("dark-blue")
 
+# Painel de diagnóstico
+INTERVALO_DIAGNOSTICO = 1000  # ms entre atualizações da tabela de tempos
+DURACAO_PERFIL = 10           # segundos de amostragem do botão "Perfil"
+INTERVALO_CAMPO = 1.0         # segundos entre descrições do campo de visão
+
+# Mapa celeste ao vivo
+QUADROS_MAPA = 5             # atualizações por segundo do mapa
+HORIZONTE_CAMINHO = 30 * 60  # segundos de trajetória futura desenhada
+CORES_ASTROS = {'Lua': 'blue', 'Saturno': 'red'}
+
+# Lista de alvos: linhas desenhadas e limite de uma atualização por quadro
+LINHAS_LISTA = 8
+QUADRO_LISTA = 16  # ms (~60 quadros por segundo)
+MAGNITUDES_LISTA = (f"mag ≤ {MAGNITUDE_LIMITE_LISTA:g}", "mag ≤ 4", "mag ≤ 6", "Todas")
+TODOS_TIPOS = "Todos"
+
+def polar(alt, azi):
+    # Theta: azimute em radianos; r: 90 - altitude (zênite no centro, horizonte em r=90)
+    return np.column_stack([np.deg2rad(azi), 90 - np.asarray(alt)])
+
 # Classe para exibir o gráfico do céu
 class SkyPlotFrame(ctk.CTkFrame):
-    def __init__(self, master, **kwargs):
+    """Fundo (grade, horizonte, legendas) desenhado uma vez; marcadores atualizados por blitting."""
+    def __init__(self, master, fonte, quadros=QUADROS_MAPA, **kwargs):
         super().__init__(master, **kwargs)
-        self.figure = plt.Figure(figsize=(6,6), dpi=100)
+        self.fonte = fonte  # callable que retorna os dados do quadro (ver TelescopeControl.sky_map_data)
+        self.intervalo = max(1, int(1000 / quadros))
+        # O matplotlib só é carregado quando o mapa é aberto pela primeira vez
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self.figure = Figure(figsize=(6,6), dpi=100)
         self.ax = self.figure.add_subplot(111, projection='polar')
         self.canvas = FigureCanvasTkAgg(self.figure, master=self)
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
-       
-        self.plot_sky()
-        
 
-    def plot_sky(self):
-        # Carrega dados efemérides do Skyfield
-        load = Loader('~/skyfield-data')
-        planets = load('de421.bsp')
-        ts = load.timescale()
-
-        # Define a localização do observador (Exemplo: Formosa-GO)
-        latitude_observador = -15.541232599693457  # em graus
-        longitude_observador = -47.33334646343277   # em graus
-        observador = planets['earth'] + Topos(latitude_degrees=latitude_observador,
-                                              longitude_degrees=longitude_observador)
-        # Define o instante da observação
-        t = ts.now()
-
-        # Calcula a posição da Lua e de Saturno
-        altaz_lua = (planets['moon'] - observador).at(t).altaz()
-        altaz_saturno = (planets['saturn barycenter'] - observador).at(t).altaz()
-
-        alt_lua, az_lua = altaz_lua[0].degrees, altaz_lua[1].degrees
-        alt_saturno, az_saturno = altaz_saturno[0].degrees, altaz_saturno[1].degrees
-
-        # Converter para coordenadas polares:
-        # Theta: azimute convertido para radianos
-        # r: 90 - altitude, de forma que o zênite (90°) fique no centro (r=0) e o horizonte (0°) no limite (r=90)
-        theta_lua = np.deg2rad(az_lua)
-        r_lua = 90 - alt_lua
-
-        theta_saturno = np.deg2rad(az_saturno)
-        r_saturno = 90 - alt_saturno
-
-        # Limpar o gráfico (caso seja chamado novamente)
-        self.ax.clear()
+        self._fundo = None
+        self._agendado = None
+        self.plot_background()
+        # Qualquer desenho completo (ex.: redimensionar a janela) recaptura o fundo
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.draw()
+        self.update_frame()
 
+    def plot_background(self):
         # Configurar o gráfico polar
         self.ax.set_theta_zero_location("N")  # 0° no topo (Norte)
         self.ax.set_theta_direction(-1)       # Ângulos crescem no sentido horário
@@ -64,9 +70,13 @@ class SkyPlotFrame(ctk.CTkFrame):
         theta = np.linspace(0, 2*np.pi, 100)
         self.ax.plot(theta, np.full_like(theta, 90), color='gray', linestyle='--')
 
-        # Plota as posições dos astros
-        self.ax.scatter(theta_lua, r_lua, color='blue', s=100, label='Lua')
-        self.ax.scatter(theta_saturno, r_saturno, color='red', s=100, label='Saturno')
+        # Artistas animados: não entram no fundo, são redesenhados a cada quadro
+        self.estrelas = self.ax.scatter([], [], color='gray', s=8, animated=True, label='Estrelas')
+        self.caminho, = self.ax.plot([], [], color='green', linewidth=1, animated=True, label='Trajetória')
+        self.corpos = self.ax.scatter([], [], s=100, animated=True, label='Astros')
+        self.montagem, = self.ax.plot([], [], color='orange', marker='+', markersize=16, markeredgewidth=2,
+                                      linestyle='', animated=True, label='Telescópio')
+        self.rotulos = {}
 
         # Configurações adicionais do gráfico
         self.ax.set_rmax(90)
@@ -74,8 +84,193 @@ class SkyPlotFrame(ctk.CTkFrame):
         self.ax.set_rlabel_position(170)
         self.ax.legend(loc='upper right')
 
-        # Atualiza o canvas
-        self.canvas.draw()
+    def _artistas(self):
+        return [self.estrelas, self.caminho, self.corpos, self.montagem] + list(self.rotulos.values())
+
+    def _on_draw(self, event):
+        self._fundo = self.canvas.copy_from_bbox(self.ax.bbox)
+        for artista in self._artistas():
+            self.ax.draw_artist(artista)
+
+    def update_frame(self):
+        inicio = time.perf_counter()
+        dados = self.fonte()
+
+        estrelas = dados.get('estrelas')
+        self.estrelas.set_offsets(polar(*estrelas) if estrelas is not None else np.empty((0, 2)))
+
+        alt, azi = dados.get('caminho') or (np.empty(0), np.empty(0))
+        self.caminho.set_data(np.deg2rad(azi), 90 - alt)
+
+        pontos = polar(dados['alt'], dados['azi'])
+        self.corpos.set_offsets(pontos)
+        self.corpos.set_color([CORES_ASTROS.get(nome, 'yellow') for nome in dados['nomes']])
+        for nome, (theta, r) in zip(dados['nomes'], pontos):
+            if nome not in self.rotulos:
+                self.rotulos[nome] = self.ax.text(0, 0, nome, color='white', fontsize=8, animated=True)
+            self.rotulos[nome].set_position((theta, r))
+
+        montagem = dados.get('montagem')
+        if montagem is not None:
+            self.montagem.set_data([np.deg2rad(montagem[1])], [90 - montagem[0]])
+        else:
+            self.montagem.set_data([], [])
+
+        # Restaura o fundo em cache e redesenha só os artistas animados
+        if self._fundo is not None:
+            self.canvas.restore_region(self._fundo)
+            for artista in self._artistas():
+                self.ax.draw_artist(artista)
+            self.canvas.blit(self.ax.bbox)
+
+        metricas.registrar('mapa', time.perf_counter() - inicio)
+        self._agendado = self.after(self.intervalo, self.update_frame)
+
+    def parar(self):
+        if self._agendado is not None:
+            self.after_cancel(self._agendado)
+            self._agendado = None
+
+# Lista de alvos virtualizada
+class TargetListFrame(ctk.CTkFrame):
+    """Só as linhas à vista existem: um conjunto fixo de botões cujo texto é trocado ao rolar ou filtrar.
+
+    Teclas, rolagem e recálculos do catálogo só marcam a lista como suja; ela
+    é redesenhada uma vez por quadro (QUADRO_LISTA).
+    """
+    def __init__(self, master, ao_selecionar, linhas=LINHAS_LISTA, **kwargs):
+        super().__init__(master, **kwargs)
+        self.ao_selecionar = ao_selecionar
+        self.indice = None                         # TargetIndex do núcleo
+        self.resultado = np.empty(0, dtype=int)    # linhas do índice que passam nos filtros
+        self.topo = 0                              # posição do resultado na primeira linha
+        self.habilitada = False
+        self._refiltrar = False
+        self._agendado = None
+        self._textos = [None] * linhas             # texto exibido em cada botão (None = escondido)
+        self._estado = None
+        self.grid_columnconfigure(0, weight=1)
+
+        # Busca incremental e filtros
+        self.filtros = ctk.CTkFrame(self, fg_color="transparent")
+        self.filtros.grid(row=0, column=0, columnspan=2, pady=(0, 5), sticky="ew")
+        self.busca = ctk.CTkEntry(self.filtros, placeholder_text="🔍 Buscar alvo")
+        self.busca.pack(side="left", fill="x", expand=True, padx=(0, 5))
+        self.busca.bind("<KeyRelease>", lambda evento: self.invalidar(filtros=True))
+        self.visiveis = ctk.CTkSwitch(self.filtros, text="Visíveis", width=60,
+                                      command=lambda: self.invalidar(filtros=True))
+        self.visiveis.select()
+        self.visiveis.pack(side="left", padx=5)
+        self.magnitude_menu = ctk.CTkOptionMenu(self.filtros, values=list(MAGNITUDES_LISTA), width=90,
+                                                command=lambda valor: self.invalidar(filtros=True))
+        self.magnitude_menu.set(MAGNITUDES_LISTA[0])
+        self.magnitude_menu.pack(side="left", padx=5)
+        self.tipo_menu = ctk.CTkOptionMenu(self.filtros, values=[TODOS_TIPOS], width=120,
+                                           command=lambda valor: self.invalidar(filtros=True))
+        self.tipo_menu.pack(side="left", padx=5)
+
+        # Linhas reaproveitadas: nenhum widget é criado ou destruído depois daqui
+        self.botoes = []
+        for k in range(linhas):
+            btn = ctk.CTkButton(self, text="", command=lambda k=k: self._clicar(k), corner_radius=8,
+                                fg_color="#2A2D2E", hover_color="#3D3F41", anchor="w", state="disabled")
+            btn.grid(row=k + 1, column=0, pady=2, sticky="ew")
+            btn.grid_remove()
+            self.botoes.append(btn)
+        self.barra = ctk.CTkScrollbar(self, command=self._rolar)
+        self.barra.grid(row=1, column=1, rowspan=linhas, padx=(5, 0), sticky="ns")
+        self.rodape = ctk.CTkLabel(self, text="⏳ Carregando efemérides...", text_color="#A9A9A9",
+                                   wraplength=400, justify="left")
+        self.rodape.grid(row=linhas + 1, column=0, columnspan=2, sticky="w")
+
+        for widget in [self] + self.botoes:
+            widget.bind("<MouseWheel>", lambda evento: self.rolar(-1 if evento.delta > 0 else 1))
+            widget.bind("<Button-4>", lambda evento: self.rolar(-1))
+            widget.bind("<Button-5>", lambda evento: self.rolar(1))
+
+    def definir_indice(self, indice):
+        self.indice = indice
+        self.tipo_menu.configure(values=[TODOS_TIPOS] + indice.tipos())
+        self.invalidar(filtros=True)
+
+    def habilitar(self, ativa):
+        self.habilitada = ativa
+        self.invalidar()
+
+    def invalidar(self, filtros=False):
+        # Várias chamadas no mesmo quadro resultam num único redesenho
+        self._refiltrar = self._refiltrar or filtros
+        if self._agendado is None:
+            self._agendado = self.after(QUADRO_LISTA, self._redesenhar)
+
+    def rolar(self, linhas):
+        self.topo += linhas
+        self.invalidar()
+
+    def _rolar(self, acao, valor, unidade=None):
+        # Protocolo do yscrollcommand do Tk: ("moveto", fração) ou ("scroll", n, "units"/"pages")
+        if acao == "moveto":
+            self.topo = int(float(valor) * len(self.resultado))
+            self.invalidar()
+        else:
+            self.rolar(int(valor) * (len(self.botoes) if unidade == "pages" else 1))
+
+    def _filtro_magnitude(self):
+        valor = self.magnitude_menu.get()
+        return None if valor == MAGNITUDES_LISTA[-1] else float(valor.split()[-1])
+
+    def _redesenhar(self):
+        self._agendado = None
+        if self.indice is None:
+            return
+        inicio = time.perf_counter()
+        if self._refiltrar:
+            self._refiltrar = False
+            tipo = self.tipo_menu.get()
+            self.resultado = self.indice.filtrar(
+                self.busca.get(),
+                visivel=bool(self.visiveis.get()),
+                magnitude_maxima=self._filtro_magnitude(),
+                tipo=None if tipo == TODOS_TIPOS else tipo
+            )
+        total = len(self.resultado)
+        self.topo = max(0, min(self.topo, total - len(self.botoes)))
+
+        # Só reconfigura o que mudou: texto de cada linha e estado dos botões
+        estado = "normal" if self.habilitada else "disabled"
+        alt, azi = self.indice.posicoes
+        for k, btn in enumerate(self.botoes):
+            i = self.topo + k
+            texto = None
+            if i < total:
+                linha = self.resultado[i]
+                texto = f"{self.indice.nomes[linha]} 🌟  {alt[linha]:.0f}° / {azi[linha]:.0f}°"
+                if not np.isnan(self.indice.mag[linha]):
+                    texto += f"  mag {self.indice.mag[linha]:.1f}"
+            if texto != self._textos[k]:
+                if texto is None:
+                    btn.grid_remove()
+                else:
+                    btn.configure(text=texto)
+                    if self._textos[k] is None:
+                        btn.grid()
+                self._textos[k] = texto
+            if estado != self._estado:
+                btn.configure(state=estado)
+        self._estado = estado
+
+        if total:
+            self.barra.set(self.topo / total, min(1.0, (self.topo + len(self.botoes)) / total))
+            self.rodape.configure(text=f"{self.topo + 1}–{min(total, self.topo + len(self.botoes))} de {total} alvos")
+        else:
+            self.barra.set(0.0, 1.0)
+            self.rodape.configure(text="Nenhum alvo com esses filtros")
+        metricas.registrar('lista', time.perf_counter() - inicio)
+
+    def _clicar(self, k):
+        i = self.topo + k
+        if self.indice is not None and i < len(self.resultado):
+            self.ao_selecionar(self.indice.astro(self.resultado[i]))
 
 class TelescopeControl(ctk.CTk):
     def __init__(self):
@@ -86,21 +281,26 @@ class TelescopeControl(ctk.CTk):
         self.title("Controle do Telescópio Espacial 🌌")
         self.geometry("1000x800")
         self.attributes('-fullscreen', True)
-        self.serial_connection = None
-        self.serial_thread = None  # Thread para leitura da serial
         self.selected_astro = None
-        self.last_correction_time = time.time()
         self.moving_to_position = False  # Flag para movimento POS
-        self.astros = []
-        self.zero_position = (0, 0)
-        self.azimuth_offset = 21.0  # Ajuste manual de 21° no início
+        self.nucleo = TrackingCore()  # Efemérides, serial e rastreamento, sem interface
+        self.nucleo.link.ao_erro = lambda msg: self.call_in_ui(self.show_error, msg)
+        self.nucleo.telemetria.assinar(self.on_telemetry)
+        self.sky_window = None
+        self.sky_plot = None
+        self.diagnostics_window = None
+        self.agenda = NightScheduler()  # Janelas da noite em cache entre uma sessão e outra
+        self.session = None
+        self.ui_calls = queue.Queue()  # Callbacks de outras threads executados no mainloop
+        self.posicao_campo = None      # último evento de posição, descrito pelo poll_ui
+        self.campo_descrito = 0.0      # time.monotonic() da última descrição do campo
         
         self.create_widgets()
         
-        self.astros = self.get_astro_data()
-        self.update_astro_buttons()
+        # A janela aparece já; kernel, catálogo e primeiras posições vêm de uma thread
+        self.load_ephemeris()
         
-        self.after(1000, self.update_data)
+        self.after(100, self.poll_ui)
     
     def create_widgets(self):
         COLOR_BACKGROUND = "#000000"  # preto
@@ -123,9 +323,10 @@ class TelescopeControl(ctk.CTk):
         self.main_frame.grid_rowconfigure(0, weight=0)  # Título
         self.main_frame.grid_rowconfigure(1, weight=1)  # Conteúdo principal
         self.main_frame.grid_rowconfigure(2, weight=0)  # Botão "Visualizar Mapa Celeste"
+        self.main_frame.grid_rowconfigure(3, weight=0)  # Botão "Diagnóstico"
 
         # Título de localização, ocupando as duas colunas
-        self.localizacao = ctk.CTkLabel(self.main_frame, text="Localização: Formosa-GO", font=("Arial", 15, "bold"), text_color=COLOR_TEXT_MAIN)
+        self.localizacao = ctk.CTkLabel(self.main_frame, text=f"Localização: {SiteProfile.atual().nome}", font=("Arial", 15, "bold"), text_color=COLOR_TEXT_MAIN)
         self.localizacao.grid(row=0, column=0, columnspan=2, padx=10, pady=5, sticky="ew")
 
         # -----------------------------
@@ -143,10 +344,9 @@ class TelescopeControl(ctk.CTk):
         self.connection_status = ctk.CTkLabel(self.connection_frame, text="⭕ Desconectado", text_color=COLOR_ERROR)
         self.connection_status.pack(side="left", padx=10)
 
-        # Lista de astros
-        self.astros_list = ctk.CTkScrollableFrame(self.left_frame, height=200, fg_color=COLOR_BACKGROUND)
+        # Lista de astros (só as linhas à vista são widgets)
+        self.astros_list = TargetListFrame(self.left_frame, self.select_astro, fg_color=COLOR_BACKGROUND)
         self.astros_list.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
-        self.astro_buttons = []
 
         # Frame para controles de rastreamento (iniciar/pausar)
         self.track_frame = ctk.CTkFrame(self.left_frame, fg_color=COLOR_BACKGROUND)
@@ -174,6 +374,28 @@ class TelescopeControl(ctk.CTk):
         )
         self.btn_stop.pack(side="right", padx=5)
 
+        # Frequência de correção do rastreamento (Hz)
+        self.rate_menu = ctk.CTkOptionMenu(
+            self.track_frame,
+            values=[f"{taxa:g} Hz" for taxa in TAXAS_RASTREAMENTO],
+            command=lambda valor: self.nucleo.definir_taxa(valor.split()[0]),
+            width=90,
+            fg_color=COLOR_HIGHLIGHT,
+            button_color=COLOR_HIGHLIGHT
+        )
+        self.rate_menu.set(f"{TAXA_RASTREAMENTO:g} Hz")
+        self.rate_menu.pack(side="right", padx=5)
+
+        # Malha fechada: corrige pela posição informada pelo Arduino
+        self.closed_loop_switch = ctk.CTkSwitch(
+            self.track_frame,
+            text="Malha fechada",
+            command=self.toggle_closed_loop,
+            text_color=COLOR_TEXT_MAIN
+        )
+        self.closed_loop_switch.select()
+        self.closed_loop_switch.pack(side="right", padx=5)
+
         # Informações adicionais (ex: altitude e azimute)
         self.info_frame = ctk.CTkFrame(self.left_frame, fg_color=COLOR_BACKGROUND)
         self.info_frame.grid(row=3, column=0, padx=10, pady=10, sticky="ew")
@@ -181,11 +403,17 @@ class TelescopeControl(ctk.CTk):
         self.lbl_altitude.pack(side="left", padx=20, pady=10)
         self.lbl_azimute = ctk.CTkLabel(self.info_frame, text="Azimute: --", font=("Arial", 14), text_color=COLOR_TEXT_MAIN)
         self.lbl_azimute.pack(side="left", padx=20, pady=10)
+        self.lbl_erro = ctk.CTkLabel(self.info_frame, text="Erro: --", font=("Arial", 14), text_color=COLOR_TEXT_SECONDARY)
+        self.lbl_erro.pack(side="left", padx=20, pady=10)
 
         # Tracking status (opcional)
         self.tracking_status = ctk.CTkLabel(self.left_frame, text="Status: Não está rastreando", font=("Arial", 12), corner_radius=20, text_color=COLOR_TEXT_SECONDARY)
         self.tracking_status.grid(row=4, column=0, padx=10, pady=5, sticky="ew")
 
+        # Objetos no campo / mais próximos do apontamento informado pelo Arduino
+        self.lbl_campo = ctk.CTkLabel(self.left_frame, text="No campo: --", font=("Arial", 12), text_color=COLOR_TEXT_SECONDARY, wraplength=450, justify="left")
+        self.lbl_campo.grid(row=5, column=0, padx=10, pady=5, sticky="ew")
+
         # -----------------------------
         # Coluna DIREITA: Botão de calibrar e controles de movimento (setinhas maiores)
         # -----------------------------
@@ -209,6 +437,23 @@ class TelescopeControl(ctk.CTk):
         )
         self.btn_calibrate.grid(row=0, column=0, padx=10, pady=30, sticky="ew")
 
+        # Sessão automática: planeja a noite e troca de alvo nos horários
+        self.btn_session = ctk.CTkButton(
+            self.right_frame,
+            text="🗓️ Sessão da Noite",
+            command=self.start_session,
+            state="disabled",  # Liberado junto com os astros, após a calibração
+            fg_color=COLOR_HIGHLIGHT,
+            hover_color="#302C63",
+            text_color="white",
+            height=40,
+            corner_radius=20,
+            font=("Arial", 12, "bold")
+        )
+        self.btn_session.grid(row=1, column=0, padx=10, pady=(0, 10), sticky="ew")
+        self.lbl_session = ctk.CTkLabel(self.right_frame, text="", font=("Arial", 12), text_color=COLOR_TEXT_SECONDARY, justify="left")
+        self.lbl_session.grid(row=2, column=0, padx=10, pady=5, sticky="ew")
+
         # Frame para os botões de movimento (setinhas maiores)
         self.arrow_frame = ctk.CTkFrame(self.right_frame, fg_color=COLOR_BACKGROUND)
         self.arrow_frame.grid(row=5, column=0, padx=10, pady=10, sticky="nsew")  # Espaçamento ajustado
@@ -299,61 +544,191 @@ class TelescopeControl(ctk.CTk):
             font=("Arial", 14, "bold")
         )
         self.btn_plot.grid(row=2, column=0, columnspan=2, padx=30, pady=0, sticky="nsew")  # Centralizado na nova linha
+
+        # Painel opcional com os tempos dos caminhos críticos
+        self.btn_diagnostics = ctk.CTkButton(
+            self.main_frame,
+            text="📊 Diagnóstico",
+            command=self.open_diagnostics,
+            fg_color=COLOR_BACKGROUND,
+            text_color=COLOR_TEXT_SECONDARY,
+            hover_color="#1E1E1E",
+            height=28,
+            corner_radius=20,
+            font=("Arial", 12)
+        )
+        self.btn_diagnostics.grid(row=3, column=0, columnspan=2, padx=30, pady=5)
     
     
         
     def plot_sky(self):
-        sky_window = ctk.CTkToplevel(self)  # Cria uma nova janela
-        sky_window.title("Mapa Celeste")
-        sky_window.geometry("600x600")
-        sky_window.attributes('-topmost', True)  # Garante que a janela fique sempre à frente
+        # Reaproveita a janela do mapa se ela já estiver aberta
+        if self.sky_window is not None and self.sky_window.winfo_exists():
+            self.sky_window.lift()
+            return
+
+        if not self.nucleo.carregado:
+            self.show_error("Efemérides ainda não carregadas")
+            return
+
+        self.sky_window = ctk.CTkToplevel(self)  # Cria uma nova janela
+        self.sky_window.title("Mapa Celeste")
+        self.sky_window.geometry("600x600")
+        self.sky_window.attributes('-topmost', True)  # Garante que a janela fique sempre à frente
 
         # Cria a frame para o gráfico na nova janela
-        sky_plot = SkyPlotFrame(sky_window)
-        sky_plot.pack(fill="both", expand=True)
+        self.sky_plot = SkyPlotFrame(self.sky_window, self.sky_map_data)
+        self.sky_plot.pack(fill="both", expand=True)
 
-        # Certifica-se de que ao fechar a janela o gráfico será atualizado
-        sky_window.protocol("WM_DELETE_WINDOW", sky_window.destroy)
+        # Ao fechar a janela a animação é interrompida
+        self.sky_window.protocol("WM_DELETE_WINDOW", self.close_sky_map)
 
-    def calibrate_telescope(self):
-        if self.serial_connection and self.serial_connection.is_open:
+    def close_sky_map(self):
+        self.sky_plot.parar()
+        self.sky_window.destroy()
+        self.sky_window = None
+        self.sky_plot = None
+
+    def open_diagnostics(self):
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            return
+
+        janela = ctk.CTkToplevel(self)
+        janela.title("Diagnóstico")
+        janela.geometry("560x360")
+        self.lbl_timings = ctk.CTkLabel(janela, text="", font=("Courier", 13), justify="left", anchor="nw")
+        self.lbl_timings.pack(fill="both", expand=True, padx=10, pady=10)
+
+        botoes = ctk.CTkFrame(janela, fg_color="transparent")
+        botoes.pack(fill="x", padx=10, pady=10)
+        ctk.CTkButton(botoes, text="Exportar CSV", width=110, command=lambda: self.export_timings('csv')).pack(side="left", padx=5)
+        ctk.CTkButton(botoes, text="Exportar JSON", width=110, command=lambda: self.export_timings('json')).pack(side="left", padx=5)
+        ctk.CTkButton(botoes, text="Zerar", width=70, command=metricas.limpar).pack(side="left", padx=5)
+        self.btn_profile = ctk.CTkButton(botoes, text=f"Perfil {DURACAO_PERFIL} s", width=110, command=self.capture_profile)
+        self.btn_profile.pack(side="right", padx=5)
+        self.lbl_diagnostics = ctk.CTkLabel(janela, text="", font=("Arial", 11), text_color="gray")
+        self.lbl_diagnostics.pack(fill="x", padx=10, pady=(0, 10))
+
+        self.diagnostics_window = janela
+        janela.protocol("WM_DELETE_WINDOW", self.close_diagnostics)
+        self.update_diagnostics()
+
+    def close_diagnostics(self):
+        self.diagnostics_window.destroy()
+        self.diagnostics_window = None
+
+    def update_diagnostics(self):
+        # Atualiza a tabela enquanto o painel estiver aberto
+        if self.diagnostics_window is None:
+            return
+        linhas = [f"{'caminho':<22}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        for nome, r in metricas.resumo().items():
+            linhas.append(f"{nome:<22}{r['n']:>6}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['max_ms']:>10.3f}")
+        self.lbl_timings.configure(text="\n".join(linhas))
+        self.after(INTERVALO_DIAGNOSTICO, self.update_diagnostics)
+
+    def export_timings(self, formato):
+        caminho = f"diagnostico-{datetime.now():%Y%m%d-%H%M%S}.{formato}"
+        try:
+            metricas.exportar(caminho)
+            self.lbl_diagnostics.configure(text=f"Exportado para {os.path.abspath(caminho)}")
+        except OSError as e:
+            self.lbl_diagnostics.configure(text=f"❌ Erro ao exportar: {e}")
+
+    def capture_profile(self):
+        # Amostragem de todas as threads numa thread própria; a interface segue respondendo
+        caminho = f"perfil-{datetime.now():%Y%m%d-%H%M%S}.txt"
+        self.btn_profile.configure(state="disabled")
+        self.lbl_diagnostics.configure(text=f"Capturando perfil por {DURACAO_PERFIL} s...")
+
+        def capturar():
             try:
-                self.serial_connection.write(b"CALIBRATE\n")
-                self.connection_status.configure(text="✅ Calibração iniciada...", text_color="blue")
-                
-                # Simula a conclusão da calibração (substitua pela lógica real)
-                time.sleep(25)  # Simula o tempo de calibração
-                self.calibrated = True  # Marca a calibração como concluída
-                
-                # Exibe a mensagem de calibração
-                self.connection_status.configure(text="✅ Norte e Altitude Calibrados!", text_color="blue")
-                print("[PYTHON] Comandos de calibração enviados: Norte e Altitude")
-                
-                # Remove a mensagem após 15 segundos
-                self.after(15000, self.clear_calibration_message)
-                
-                # Habilita os botões dos astros após a calibração
-                self.update_astro_buttons()
-            except Exception as e:
-                self.connection_status.configure(text=f"❌ Erro: {str(e)}", text_color="red")
-                self.calibrated = False  # Marca a calibração como falha
+                capturar_perfil(DURACAO_PERFIL, caminho)
+                texto = f"Perfil gravado em {os.path.abspath(caminho)}"
+            except OSError as e:
+                texto = f"❌ Erro no perfil: {e}"
+            self.call_in_ui(self.on_profile_done, texto)
+
+        threading.Thread(target=capturar, name="perfil", daemon=True).start()
+
+    def on_profile_done(self, texto):
+        if self.diagnostics_window is not None:
+            self.btn_profile.configure(state="normal")
+            self.lbl_diagnostics.configure(text=texto)
+
+    def sky_map_data(self):
+        # Dados do quadro vindos das fontes compartilhadas, sem recalcular efemérides
+        nucleo = self.nucleo
+        instante = time.time()
+        alt, azi, _, _ = nucleo.trajetorias.interpolar(instante)
+        # Nomes só são acrescentados: as primeiras len(alt) linhas são as da tabela devolvida
+        dados = {'nomes': list(nucleo.trajetorias.nomes)[:len(alt)], 'alt': alt, 'azi': azi}
+
+        if nucleo.posicao_informada is not None:
+            alt_montagem, azi_montagem = nucleo.posicao_informada
+            dados['montagem'] = (alt_montagem, (azi_montagem - nucleo.azimuth_offset) % 360)
+
+        if self.current_astro is not None:
+            dados['caminho'] = nucleo.trajetorias.caminho(self.current_astro, instante, instante + HORIZONTE_CAMINHO)
+
+        if nucleo.catalogo is not None and nucleo.catalogo.posicoes is not None:
+            _, alt_estrelas, azi_estrelas, _ = nucleo.catalogo.posicoes
+            indices = nucleo.catalogo.visiveis()
+            dados['estrelas'] = (alt_estrelas[indices], azi_estrelas[indices])
+        return dados
+
+    def calibrate_telescope(self):
+        if not self.nucleo.conectado:
+            self.show_error("Conexão serial fechada")
+            return
+
+        self.btn_calibrate.configure(state="disabled")
+        self.connection_status.configure(text="✅ Calibração iniciada...", text_color="blue")
+        log.info("Comandos de calibração enviados: Norte e Altitude")
+
+        # A calibração termina quando o Arduino confirma, sem bloquear a interface
+        futuro = self.nucleo.calibrar()
+        futuro.add_done_callback(lambda f: self.call_in_ui(self.on_calibration_done, f))
+
+    def on_calibration_done(self, futuro):
+        self.btn_calibrate.configure(state="normal")
+        erro = futuro.exception()
+        if erro is not None:
+            self.show_error(erro)
+            self.calibrated = False  # Marca a calibração como falha
+            return
+
+        self.calibrated = True  # Marca a calibração como concluída
+
+        # Exibe a mensagem de calibração
+        self.connection_status.configure(text="✅ Norte e Altitude Calibrados!", text_color="blue")
+
+        # Remove a mensagem após 15 segundos
+        self.after(15000, self.clear_calibration_message)
+
+        # Habilita os botões dos astros após a calibração
+        self.update_target_list()
     
     def send_command(self, command):
-        if self.serial_connection and self.serial_connection.is_open:
-            try:
-                self.serial_connection.write(f"{command}\n".encode())
-                self.connection_status.configure(text=f"✅ Comando enviado: {command}", text_color="blue")
-                print(f"[PYTHON] Comando enviado: {command}")
-            except Exception as e:
-                self.connection_status.configure(text=f"❌ Erro: {str(e)}", text_color="red")
+        if self.nucleo.conectado:
+            self.nucleo.link.enviar(command)
+            self.connection_status.configure(text=f"✅ Comando enviado: {command}", text_color="blue")
+            log.info("Comando enviado: %s", command)
         else:
-            self.connection_status.configure(text="❌ Erro: Conexão serial fechada", text_color="red")
+            self.show_error("Conexão serial fechada")
+
+    def show_error(self, erro):
+        self.connection_status.configure(text=f"❌ Erro: {str(erro)}", text_color="red")
+
+    def call_in_ui(self, funcao, *args):
+        # Seguro a partir de qualquer thread: executado no próximo poll_ui
+        self.ui_calls.put((funcao, args))
 
-                
     def clear_calibration_message(self):
         """Remove a mensagem de calibração após 15 segundos."""
-        if self.serial_connection and self.serial_connection.is_open:
-            self.connection_status.configure(text=f"✅ Conectado em {self.serial_connection.port}", text_color="green")
+        if self.nucleo.conectado:
+            self.connection_status.configure(text=f"✅ Conectado em {self.nucleo.porta}", text_color="green")
         else:
             self.connection_status.configure(text="⭕ Desconectado", text_color="red")
 
@@ -367,36 +742,121 @@ class TelescopeControl(ctk.CTk):
         if self.tracking_active:
             self.btn_track.configure(text="⏸ Pausar Rastreamento", fg_color="#AA0000", hover_color="#880000")
             self.tracking_status.configure(text=f"Status: Rastreando {self.current_astro}", text_color="green")
-            self.track_astro()
+            self.nucleo.rastrear()
         else: # Pausa o rastreamento
+            self.nucleo.pausar()
             self.btn_track.configure(text="🔄 Retomar Rastreamento", fg_color="#00AA00", hover_color="#008800")
             self.tracking_status.configure(text="Status: Rastreamento pausado", text_color="orange")
 
+    def poll_ui(self):
+        inicio = time.perf_counter()
+        # Executa no mainloop os callbacks vindos das threads de serial
+        try:
+            while True:
+                funcao, args = self.ui_calls.get_nowait()
+                funcao(*args)
+        except queue.Empty:
+            pass
+
+        # Consome os snapshots do laço de rastreamento e exibe apenas o mais recente
+        snapshot = None
+        try:
+            while True:
+                snapshot = self.nucleo.tracker.snapshots.get_nowait()
+        except queue.Empty:
+            pass
+
+        if snapshot is not None and self.tracking_active:
+            if snapshot['erro']:
+                self.show_error(snapshot['erro'])
+            elif 'altitude' in snapshot:
+                self.lbl_altitude.configure(text=f"Altitude: {snapshot['altitude']:.2f}°")
+                self.lbl_azimute.configure(text=f"Azimute: {snapshot['azimute']:.2f}°")
+                if snapshot.get('erro_alt') is not None:
+                    self.lbl_erro.configure(
+                        text=f"Erro: {snapshot['erro_alt']:+.3f}° / {snapshot['erro_azi']:+.3f}° "
+                             f"({snapshot['latencia'] * 1000:.0f} ms)")
+
+        self.update_field()
+
+        metricas.registrar('interface', time.perf_counter() - inicio)
+        self.after(100, self.poll_ui)
+
+    def update_field(self):
+        # A busca no catálogo é cara: no máximo uma descrição por INTERVALO_CAMPO
+        evento = self.posicao_campo
+        agora = time.monotonic()
+        if evento is None or agora - self.campo_descrito < INTERVALO_CAMPO:
+            return
+        self.posicao_campo = None
+        self.campo_descrito = agora
+        texto = self.nucleo.descrever_campo(evento.alt, evento.azi - self.nucleo.azimuth_offset, evento.instante)
+        self.lbl_campo.configure(text=texto)
+
+    def toggle_closed_loop(self):
+        # Troca o modo no próximo tick, sem interromper o rastreamento
+        ativa = bool(self.closed_loop_switch.get())
+        self.nucleo.definir_malha_fechada(ativa)
+        if not ativa:
+            self.lbl_erro.configure(text="Erro: --")
+
+    def update_target_list(self):
+        # Os botões não são recriados: a lista só troca o estado no próximo quadro
+        self.astros_list.habilitar(self.calibrated)
+        self.btn_session.configure(state="normal" if self.calibrated else "disabled")
+
+    def start_session(self):
+        dialogo = ctk.CTkInputDialog(text="Alvos da sessão, separados por vírgula:", title="Sessão da Noite")
+        texto = dialogo.get_input()
+        if not texto:
+            return
+        nomes = [nome.strip() for nome in texto.split(',') if nome.strip()]
+        self.btn_session.configure(state="disabled")
+        self.lbl_session.configure(text="⏳ Calculando janelas da noite...")
+
+        # As buscas do almanac rodam fora do mainloop (instantâneas com o cache da noite)
+        def planejar():
+            try:
+                plano = self.agenda.planejar(preparar_alvos(self.nucleo, nomes), inicio=time.time(),
+                                             movimentos=self.nucleo.movimentos, origem=self.nucleo.posicao_montagem())
+                self.call_in_ui(self.on_session_planned, plano)
+            except Exception as e:
+                self.call_in_ui(self.on_session_failed, e)
 
-    def track_astro(self):
-        if self.tracking_active and self.current_astro:
-            self.update_tracking_data() # Chama a função correta
-            self.after(5000, self.track_astro)  # Atualiza a cada 5 segundos
+        threading.Thread(target=planejar, name="agenda", daemon=True).start()
 
-    def update_astro_buttons(self):
-        for btn in self.astro_buttons:
-            btn.destroy()
-        self.astro_buttons = []
-        
-        for astro in self.astros:
-            btn = ctk.CTkButton(
-                self.astros_list,
-                text=f"{astro['nome']} 🌟",
-                command=lambda a=astro: self.select_astro(a),
-                corner_radius=8,
-                fg_color="#2A2D2E",
-                hover_color="#3D3F41",
-                state="normal" if self.calibrated else "disabled"
-            )
-            btn.pack(fill="x", pady=2)
-            self.astro_buttons.append(btn)
+    def on_session_planned(self, plano):
+        self.btn_session.configure(state="normal")
+        if not plano:
+            self.lbl_session.configure(text="Nenhum alvo acima da altitude mínima no restante da noite")
+            return
+        linhas = [f"{datetime.fromtimestamp(o.inicio):%H:%M} - {datetime.fromtimestamp(o.fim):%H:%M}  {o.nome}" for o in plano]
+        self.lbl_session.configure(text="\n".join(linhas))
+        if self.session is not None:
+            self.session.stop()
+        self.session = ObservingSession(self.nucleo, plano, lambda o, estado: self.call_in_ui(self.on_session_update, o, estado))
+        self.btn_stop.configure(state="normal")
+        self.session.start()
+
+    def on_session_failed(self, erro):
+        self.btn_session.configure(state="normal")
+        self.lbl_session.configure(text="")
+        self.show_error(erro)
+
+    def on_session_update(self, observacao, estado):
+        if estado == ESTADO_CONCLUIDA:
+            self.session = None
+            self.stop_tracking()
+            self.tracking_status.configure(text="Status: Sessão concluída", text_color="green")
+            return
+        self.current_astro = observacao.nome
+        self.tracking_active = estado == ESTADO_RASTREANDO
+        self.tracking_status.configure(text=f"Status: Sessão - {observacao.nome} {estado}", text_color="green" if self.tracking_active else "orange")
 
     def stop_tracking(self):
+        if self.session is not None:
+            self.session.stop()
+            self.session = None
         self.tracking_active = False
         self.moving_to_position = False # Limpa o flag de movimento POS
         self.current_astro = None
@@ -405,169 +865,141 @@ class TelescopeControl(ctk.CTk):
         self.btn_track.configure(text="🔄 Iniciar Rastreamento", fg_color="green", state="disabled") # Restaura o texto do botão
         self.btn_stop.configure(state="disabled")
 
-        # Envia comando STOP para o Arduino
-        self.send_command("STOP")
+        # Interrompe o laço e envia comando STOP para o Arduino
+        self.nucleo.parar()
+        if self.nucleo.conectado:
+            self.connection_status.configure(text="✅ Comando enviado: STOP", text_color="blue")
+            log.info("Comando enviado: STOP")
+        else:
+            self.show_error("Conexão serial fechada")
 
         self.lbl_altitude.configure(text="Altitude: --")
         self.lbl_azimute.configure(text="Azimute: --")
+        self.lbl_erro.configure(text="Erro: --")
         self.tracking_status.configure(text="Status: Não está rastreando", text_color="gray") # Restaura a mensagem de status
 
-    def get_astro_data(self):
-        loader = Loader('~/skyfield-data')
-        planets = loader('de421.bsp')
-        ts = loader.timescale()
-    
-        # Coordenadas fixas de Formosa-GO
-        latitude_observador = -15.541232599693457
-        longitude_observador = -47.33334646343277
-    
-        observador = planets['earth'] + Topos(
-            latitude_degrees=latitude_observador,
-            longitude_degrees=longitude_observador
-        )
-    
-        astros = {}
-        agora = ts.now()
-        futuro = ts.from_datetime(agora.utc_datetime() + timedelta(seconds=10))
-
-        for nome, corpo in [
-            ('Lua', planets['moon']),
-            ('Saturno', planets['saturn barycenter'])
-        ]:
-            pos_atual = (corpo - observador).at(agora).altaz()
-            pos_futura = (corpo - observador).at(futuro).altaz()
-        
-            astros[nome] = {
-                'nome': nome,
-                'altitude': pos_atual[0].degrees,
-                'azimute': pos_atual[1].degrees,
-                'vel_alt': (pos_futura[0].degrees - pos_atual[0].degrees) / 10,
-                'vel_azi': (pos_futura[1].degrees - pos_atual[1].degrees) / 10
-            }
-
-        return list(astros.values())
-
-    def connect_arduino(self):
-        try:
-            portas = ['COM6']
-            for porta in portas:
-                try:
-                    self.serial_connection = serial.Serial(
-                        porta,
-                        baudrate=115200,
-                        timeout=1,
-                        write_timeout=1
-                    )
-                    time.sleep(2)
-                    self.connection_status.configure(text=f"✅ Conectado em {porta}", text_color="green")
-                    
-                    self.btn_calibrate.configure(state="normal")
-                    
-                    if self.serial_thread is None:
-                        self.serial_thread = threading.Thread(target=self.read_from_serial, daemon=True)
-                        self.serial_thread.start()
-                    return
-                except Exception:
-                    continue
-            raise Exception("Nenhuma porta encontrada!")
-        except Exception as e:
-            self.connection_status.configure(text=f"❌ Erro: {str(e)}", text_color="red")
-            self.btn_track.configure(state="disabled")
-            self.btn_stop.configure(state="disabled")
-            self.btn_calibrate.configure(state="disabled")
-
-    def read_from_serial(self):
-        while True:
+    def load_ephemeris(self):
+        # Leitura do kernel e primeiro cálculo fora do mainloop
+        def carregar():
             try:
-                if self.serial_connection and self.serial_connection.is_open:
-                    line = self.serial_connection.readline().decode('utf-8').strip()
-                    if line:
-                        print(f"[ARDUINO OUTPUT] {line}")
+                astros = self.nucleo.carregar()
+                self.call_in_ui(self.on_ephemeris_loaded, astros)
             except Exception as e:
-                print(f"Erro ao ler da serial: {e}")
-            time.sleep(0.1)
+                self.call_in_ui(self.on_ephemeris_failed, e)
+
+        threading.Thread(target=carregar, name="efemerides", daemon=True).start()
+
+    def on_ephemeris_loaded(self, astros):
+        self.astros_list.definir_indice(self.nucleo.alvos)
+        self.update_target_list()
+        # Mesmo sem catálogo: corpos e satélites da lista também nascem e se põem
+        self.refresh_catalog()
 
-    def send_velocity_command(self, vel_alt, vel_azi):
-        if self.serial_connection and self.serial_connection.is_open:
+    def on_ephemeris_failed(self, erro):
+        log.error("Erro ao carregar efemérides: %s", erro)
+        self.astros_list.rodape.configure(text=f"❌ {erro}", text_color="red")
+        self.show_error("Efemérides indisponíveis")
+
+    def refresh_catalog(self):
+        # Recalcula alt/az da lista de alvos (e do catálogo, se houver) fora do mainloop.
+        # O próximo cálculo só é agendado quando este termina: dois nunca se sobrepõem
+        def calcular():
             try:
-                fator = 10
-                safe_vel_alt = max(min(vel_alt * fator, 5.0), -5.0)
-                safe_vel_azi = max(min(vel_azi * fator, 5.0), -5.0)
-                comando = f"SPEED,{safe_vel_alt:.6f},{safe_vel_azi:.6f}\n"
-                self.serial_connection.write(comando.encode('utf-8'))
-                print(f"[PYTHON] Comando SPEED enviado: {comando.strip()}")
+                self.nucleo.atualizar_catalogo()
+                self.call_in_ui(self.on_catalog_refreshed)
             except Exception as e:
-                self.connection_status.configure(text=f"❌ Erro: {str(e)}", text_color="red")
+                self.call_in_ui(self.on_catalog_failed, e)
+
+        threading.Thread(target=calcular, name="catalogo", daemon=True).start()
+
+    def on_catalog_refreshed(self):
+        # Novas alt/az mudam quem está visível: refiltra e atualiza os rótulos no lugar
+        self.astros_list.invalidar(filtros=True)
+        self.after(INTERVALO_CATALOGO * 1000, self.refresh_catalog)
+
+    def on_catalog_failed(self, erro):
+        self.show_error(erro)
+        self.after(INTERVALO_CATALOGO * 1000, self.refresh_catalog)
 
-    def send_position_command(self, alt, azi):
-        if self.serial_connection and self.serial_connection.is_open:
+    def connect_arduino(self):
+        # Abrir as portas e esperar o handshake leva segundos: fora do mainloop
+        portas = None  # PORTAS_SERIAIS e depois as demais portas, abertas em paralelo
+        if os.environ.get('RASTREAMENTO_SIMULADOR'):
+            portas = [PORTA_SIMULADOR]
+
+        def conectar():
             try:
-                adjusted_azi = (azi + self.azimuth_offset) % 360  # Garante que o valor fique entre 0° e 360°
-                
-                if not (-90 <= alt <= 90):
-                    print("Coordenadas inválidas!")
-                    return
-            
-                # Inverte a ordem: primeiro envia o azimute (ajustado) e depois a altitude
-                comando = f"POS,{adjusted_azi:.2f},{alt:.2f}\n"
-                self.serial_connection.write(comando.encode('utf-8'))
-                print(f"[PYTHON] Comando POS enviado: {comando.strip()}")
-                time.sleep(10)
+                porta = self.nucleo.conectar(portas)
+                self.call_in_ui(self.on_connected, porta)
             except Exception as e:
-                print(f"Erro crítico ao enviar POS: {str(e)}")
+                self.call_in_ui(self.on_connect_failed, e)
+
+        self.btn_connect.configure(state="disabled")
+        self.connection_status.configure(text="⏳ Procurando montagens...", text_color="orange")
+        threading.Thread(target=conectar, name="conexao", daemon=True).start()
+
+    def on_connected(self, porta):
+        self.btn_connect.configure(state="normal")
+        if self.nucleo.identificador != porta:
+            porta = f"{porta} ({self.nucleo.identificador})"
+        self.connection_status.configure(text=f"✅ Conectado em {porta}", text_color="green")
+        self.btn_calibrate.configure(state="normal")
+
+    def on_connect_failed(self, erro):
+        self.btn_connect.configure(state="normal")
+        self.connection_status.configure(text=f"❌ Erro: {str(erro)}", text_color="red")
+        self.btn_track.configure(state="disabled")
+        self.btn_stop.configure(state="disabled")
+        self.btn_calibrate.configure(state="disabled")
+
+    def on_telemetry(self, evento):
+        # Roda na thread de leitura: só guarda o evento; o campo é descrito no poll_ui
+        if evento.tipo in (EVENTO_POSICAO, EVENTO_POSICAO_ATUAL) and self.nucleo.carregado:
+            self.posicao_campo = evento
+        elif evento.tipo == EVENTO_ERRO:
+            self.call_in_ui(self.show_error, evento.linha)
 
     def select_astro(self, astro):
         self.current_astro = astro['nome']
         self.selected_astro = astro['nome']
+
+        # O núcleo registra estrelas do catálogo e envia POS para a posição atual
+        altitude, azimute, futuro = self.nucleo.selecionar(astro)
         
-        print(f"\n[DEBUG] Movendo para {astro['nome']}:")
-        print(f"Altitude: {astro['altitude']:.2f}°")
-        print(f"Azimute: {astro['azimute']:.2f}°")
+        log.debug("Movendo para %s: Altitude %.2f° | Azimute %.2f°", astro['nome'], altitude, azimute)
         
-        self.lbl_altitude.configure(text=f"Altitude: {astro['altitude']:.2f}°")
-        self.lbl_azimute.configure(text=f"Azimute: {astro['azimute']:.2f}°")
+        self.lbl_altitude.configure(text=f"Altitude: {altitude:.2f}°")
+        self.lbl_azimute.configure(text=f"Azimute: {azimute:.2f}°")
         
-        self.btn_track.configure(state="normal")
+        # O rastreamento só é liberado quando o Arduino confirma a posição
+        self.tracking_active = False
+        self.btn_track.configure(text="🔄 Iniciar Rastreamento", state="disabled")
         self.btn_stop.configure(state="normal")
+        self.moving_to_position = True
+        self.tracking_status.configure(text=f"Status: Movendo para {astro['nome']}... (≈ {self.nucleo.movimento.duracao / 60:.0f} min)", text_color="orange")
         
-        self.send_position_command(astro['altitude'], astro['azimute'])
-        self.after(3000, lambda: self.btn_track.configure(state="normal")) # Habilita após 1 segundo
-        self.after(3000, lambda: self.btn_stop.configure(state="normal"))
-        
-
-    def update_data(self):
-        if self.tracking_active and self.current_astro:
-            try:
-                self.astros = self.get_astro_data()
-                astro = next((a for a in self.astros if a['nome'] == self.current_astro), None)
-                if astro:
-                    vel_azi = astro['vel_azi']
-                    vel_alt = astro['vel_alt']
+        futuro.add_done_callback(lambda f, nome=astro['nome']: self.call_in_ui(self.on_position_reached, nome, f))
 
-                    fator = 2
-                    safe_vel_alt = max(min(vel_alt * fator, 5.0), -5.0)
-                    safe_vel_azi = max(min(vel_azi * fator, 5.0), -5.0)
+    def on_position_reached(self, nome, futuro):
+        # Ignora respostas de um alvo que já foi trocado ou interrompido
+        if not self.moving_to_position or nome != self.current_astro:
+            return
+        self.moving_to_position = False
 
-                    if abs(safe_vel_azi) > 0.0001 or abs(safe_vel_alt) > 0.0001:
-                        self.send_velocity_command(safe_vel_alt, safe_vel_azi)
+        erro = futuro.exception()
+        if erro is not None:
+            log.error("Erro crítico ao enviar POS: %s", erro)
+            self.show_error(erro)
+            self.tracking_status.configure(text="Status: Não está rastreando", text_color="gray")
+            return
 
-                    self.lbl_altitude.configure(text=f"Altitude: {astro['altitude']:.2f}°")
-                    self.lbl_azimute.configure(text=f"Azimute: {astro['azimute']:.2f}°")
-            except Exception as e:
-                print(f"Erro no rastreamento: {str(e)}")
-                
-    def update_tracking_data(self): # Função renomeada e corrigida
-        if self.tracking_active and self.current_astro:
-            try:
-                self.astros = self.get_astro_data()
-                astro = next((a for a in self.astros if a['nome'] == self.current_astro), None)
-                if astro:
-                    self.send_velocity_command(astro['vel_alt'], astro['vel_azi']) # Envia velocidades diretamente
-                    self.lbl_altitude.configure(text=f"Altitude: {astro['altitude']:.2f}°")
-                    self.lbl_azimute.configure(text=f"Azimute: {astro['azimute']:.2f}°")
-            except Exception as e:
-                print(f"Erro no rastreamento: {str(e)}")
+        self.btn_track.configure(state="normal")
+        self.tracking_status.configure(text=f"Status: {nome} posicionado", text_color="green")
+        
 
 if __name__ == "__main__":
+    # Nível do log pelo ambiente (ex.: RASTREAMENTO_LOG=DEBUG mostra cada comando e resposta)
+    logging.basicConfig(level=os.environ.get('RASTREAMENTO_LOG', 'INFO').upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     app = TelescopeControl()
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,304 @@
+import argparse
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import as_completed
+from datetime import date, datetime
+
+from nucleo import (
+    TrackingCore, MountManager, PORTAS_SERIAIS, TAXA_RASTREAMENTO, SiteProfile, CATALOGO_ESTRELAS,
+    ARQUIVO_TLE, ALTITUDE_MINIMA_PASSAGEM, metricas, capturar_perfil
+)
+from gravacao import gravar
+from agenda import (
+    NightScheduler, ObservingSession, preparar_alvos, ALTITUDE_MINIMA_SESSAO, DURACAO_OBSERVACAO
+)
+
+INTERVALO_STATUS = 1.0  # segundos entre linhas de status
+LIMITE_PASSAGENS = 50   # passagens listadas por --passagens
+MARGEM_PASSAGEM = 30.0  # segundos a mais de antecedência no apontamento para um satélite
+
+def ultimo_snapshot(tracker):
+    snapshot = None
+    try:
+        while True:
+            snapshot = tracker.snapshots.get_nowait()
+    except queue.Empty:
+        pass
+    return snapshot
+
+def hora(instante, segundos=False):
+    if instante is None:
+        return '--:--:--' if segundos else '--:--'
+    return datetime.fromtimestamp(instante).strftime('%H:%M:%S' if segundos else '%H:%M')
+
+def descrever_passagem(passagem):
+    return (f"{hora(passagem.nascer, True)} - {hora(passagem.ocaso, True)}  {passagem.nome} "
+            f"(máx. {passagem.altitude_maxima:.0f}° às {hora(passagem.culminacao, True)})")
+
+def aguardar_passagem(nucleos, astro, passagem):
+    # Parte a tempo de o apontamento mais lento terminar quando o satélite nasce
+    if passagem.nascer is None:
+        return
+    antecedencia = 0.0
+    for n in nucleos.values():
+        n.registrar(astro)
+        movimento = n.movimentos.interceptar(
+            n.posicao_montagem(), lambda instante: n.trajetorias.prever(astro['nome'], instante), passagem.nascer)
+        antecedencia = max(antecedencia, movimento.duracao)
+    partida = passagem.nascer - antecedencia - MARGEM_PASSAGEM
+    if partida > time.time():
+        print(f"Aguardando a passagem: apontamento às {hora(partida, True)}")
+        time.sleep(partida - time.time())
+
+def imprimir_status(snapshot, prefixo=''):
+    if snapshot['erro']:
+        print(f"{prefixo}Erro no rastreamento: {snapshot['erro']}", file=sys.stderr)
+    elif snapshot.get('erro_alt') is not None:
+        print(f"{prefixo}Altitude: {snapshot['altitude']:.2f}° | Azimute: {snapshot['azimute']:.2f}° | "
+              f"Erro: {snapshot['erro_alt']:+.3f}° / {snapshot['erro_azi']:+.3f}° "
+              f"({snapshot['latencia'] * 1000:.0f} ms)")
+    else:
+        print(f"{prefixo}Altitude: {snapshot['altitude']:.2f}° | Azimute: {snapshot['azimute']:.2f}°")
+
+def apontar(apontamentos):
+    """Envia POS a todas as montagens e inicia o rastreamento de cada uma assim que chega.
+
+    `apontamentos` é [(nucleo, astro, prefixo)].
+    """
+    pendentes = {}
+    for nucleo, astro, prefixo in apontamentos:
+        altitude, azimute, futuro = nucleo.selecionar(astro)
+        print(f"{prefixo}Movendo para {astro['nome']}: Altitude {altitude:.2f}° | Azimute {azimute:.2f}° "
+              f"(previsto {nucleo.movimento.duracao:.0f} s)")
+        pendentes[futuro] = (nucleo, astro, prefixo)
+
+    for futuro in as_completed(pendentes):
+        futuro.result()
+        nucleo, astro, prefixo = pendentes[futuro]
+        nucleo.rastrear()
+        if nucleo.modo == 'segmentos':
+            print(f"{prefixo}Rastreando {astro['nome']} com fila de segmentos (Ctrl+C para parar)")
+        else:
+            print(f"{prefixo}Rastreando {astro['nome']} a {nucleo.tracker.taxa:g} Hz (Ctrl+C para parar)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Rastreamento sem interface gráfica (ex.: Raspberry Pi junto à montagem)")
+    alvos = parser.add_mutually_exclusive_group(required=True)
+    alvos.add_argument('--alvo', '--target', action='append',
+                       help="astro (ex.: Saturno) ou estrela do catálogo; com --descobrir, um por montagem")
+    alvos.add_argument('--sessao', nargs='+', metavar='ALVO',
+                       help="sessão automática da noite: planeja e rastreia os alvos nos horários")
+    alvos.add_argument('--satelite', metavar='NOME',
+                       help="satélite do arquivo TLE: espera a próxima passagem e a rastreia até o ocaso")
+    alvos.add_argument('--passagens', action='store_true',
+                       help="lista as próximas passagens de todos os satélites do arquivo TLE")
+    parser.add_argument('--tle', default=ARQUIVO_TLE, help="arquivo TLE local com os satélites")
+    parser.add_argument('--horas', type=float, default=12.0, help="horas à frente na busca de passagens")
+    parser.add_argument('--porta', '--port', action='append',
+                        help="porta serial, pode ser repetida (padrão: COM6; SIM, SIM2... usam montagens simuladas)")
+    parser.add_argument('--descobrir', action='store_true',
+                        help="conecta todas as montagens encontradas nas portas, cada uma rastreando um --alvo")
+    parser.add_argument('--taxa', '--rate', type=float, default=TAXA_RASTREAMENTO, help="correções por segundo (Hz)")
+    parser.add_argument('--offset', type=float, help="ajuste de azimute da montagem (graus; padrão: o do local)")
+    parser.add_argument('--local', metavar='ARQUIVO',
+                        help="local e montagem em JSON (padrão: $RASTREAMENTO_LOCAL ou ~/skyfield-data/local.json)")
+    parser.add_argument('--calibrar', action='store_true', help="envia CALIBRATE antes de apontar")
+    parser.add_argument('--malha-aberta', action='store_true', help="não corrige pela posição informada")
+    parser.add_argument('--sem-segmentos', action='store_true',
+                        help="envia SPEED a cada tick mesmo com firmware que aceita a fila de segmentos")
+    parser.add_argument('--sem-catalogo', action='store_true', help="não carrega o catálogo de estrelas")
+    parser.add_argument('--duracao', type=float, help="segundos de rastreamento (padrão: até Ctrl+C)")
+    parser.add_argument('--data', type=date.fromisoformat, help="noite da sessão, AAAA-MM-DD (padrão: a atual)")
+    parser.add_argument('--duracao-alvo', type=float, default=DURACAO_OBSERVACAO / 60,
+                        help="minutos de rastreamento por alvo na sessão")
+    parser.add_argument('--altitude-minima', type=float,
+                        help=f"altitude mínima (graus) de um alvo na sessão ({ALTITUDE_MINIMA_SESSAO:g}°) "
+                             f"ou de uma passagem ({ALTITUDE_MINIMA_PASSAGEM:g}°)")
+    parser.add_argument('--gravar', metavar='DIRETORIO',
+                        help="grava comandos e telemetria da sessão (ver reproduzir.py); uma subpasta por montagem")
+    parser.add_argument('--log', default='WARNING', help="nível do log (DEBUG mostra cada comando e resposta)")
+    parser.add_argument('--diagnostico', metavar='ARQUIVO', help="grava os tempos dos caminhos críticos ao sair (.csv ou .json)")
+    parser.add_argument('--perfil', type=float, metavar='SEGUNDOS', help="amostra as pilhas das threads no início do rastreamento")
+    parser.add_argument('--arquivo-perfil', default='perfil.txt', help="destino do perfil (formato collapsed/flamegraph)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.descobrir and args.sessao:
+        parser.error("--sessao usa uma montagem só; combine --descobrir com --alvo")
+    if args.alvo and len(args.alvo) > 1 and not args.descobrir:
+        parser.error("vários --alvo só com --descobrir")
+
+    # O local vale para o processo inteiro: definido antes de criar a sessão de efemérides
+    try:
+        local = SiteProfile.carregar(args.local)
+    except (OSError, ValueError) as e:
+        print(f"❌ Erro no local: {e}", file=sys.stderr)
+        return 1
+    SiteProfile.definir(local)
+
+    catalogo = None if args.sem_catalogo else CATALOGO_ESTRELAS
+    # Com --descobrir cada montagem ganha seu núcleo do MountManager; sem ele, um núcleo só
+    if args.descobrir:
+        gerente, nucleo = MountManager(args.offset, args.taxa, catalogo, args.tle), None
+        ceu = gerente.ceu
+    else:
+        gerente, nucleo = None, TrackingCore(args.offset, args.taxa, catalogo, tle=args.tle)
+        ceu = nucleo.ceu
+
+    try:
+        ceu.carregar()
+    except FileNotFoundError as e:
+        print(f"❌ Erro: {e}", file=sys.stderr)
+        return 1
+
+    sessao = passagem = None
+    if (args.satelite or args.passagens) and ceu.satelites is None:
+        print(f"❌ Erro: arquivo TLE não encontrado: {args.tle}", file=sys.stderr)
+        return 1
+    if args.passagens:
+        # Todos os satélites de uma vez, em lotes vetorizados do SGP4
+        inicio = time.time()
+        altitude_minima = ALTITUDE_MINIMA_PASSAGEM if args.altitude_minima is None else args.altitude_minima
+        passagens = ceu.satelites.passagens(inicio, inicio + args.horas * 3600, altitude_minima)
+        print(f"{len(passagens)} passagens acima de {altitude_minima:g}° de {len(ceu.satelites)} satélites "
+              f"nas próximas {args.horas:g} h (calculadas em {time.time() - inicio:.1f} s)")
+        for p in passagens[:LIMITE_PASSAGENS]:
+            print(f"  {descrever_passagem(p)}")
+        return 0
+
+    if args.sessao:
+        try:
+            nomes = preparar_alvos(nucleo, args.sessao)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.altitude_minima is None:
+            args.altitude_minima = ALTITUDE_MINIMA_SESSAO
+        agenda = NightScheduler(altitude_minima=args.altitude_minima)
+        data = agenda.data_da_sessao(args.data)  # Depois do amanhecer, a próxima noite
+        plano = agenda.planejar(nomes, data, args.duracao_alvo * 60, inicio=time.time(),
+                                movimentos=nucleo.movimentos, origem=nucleo.posicao_montagem())
+        inicio_noite, fim_noite = agenda.noite(data)
+        print(f"Noite de {data:%d/%m}: {hora(inicio_noite)} - {hora(fim_noite)}")
+        for observacao in plano:
+            print(f"  {hora(observacao.inicio)} - {hora(observacao.fim)}  {observacao.nome} "
+                  f"(apontamento ≈ {observacao.apontamento / 60:.0f} min)")
+        for nome in sorted(set(nomes) - {o.nome for o in plano}):
+            print(f"  {nome}: sem janela acima de {args.altitude_minima:g}° no restante da noite")
+        if not plano:
+            return 0
+        sessao = ObservingSession(nucleo, plano, ao_mudar=lambda o, estado: print(
+            f"{estado.capitalize()}: {o.nome}" if o is not None else "Sessão concluída"))
+    elif args.satelite:
+        astro = ceu.encontrar(args.satelite)
+        if astro is None or 'satelite' not in astro:
+            parser.error(f"satélite desconhecido: {args.satelite}")
+        agora = time.time()
+        altitude_minima = ALTITUDE_MINIMA_PASSAGEM if args.altitude_minima is None else args.altitude_minima
+        passagens = ceu.satelites.passagens(agora, agora + args.horas * 3600, altitude_minima,
+                                            indices=[astro['satelite']])
+        if not passagens:
+            print(f"{astro['nome']}: sem passagem acima de {altitude_minima:g}° nas próximas {args.horas:g} h")
+            return 0
+        passagem = passagens[0]
+        print(f"Próxima passagem: {descrever_passagem(passagem)}")
+        astros = [astro]
+    else:
+        astros = []
+        for nome in args.alvo:
+            astro = ceu.encontrar(nome)
+            if astro is None:
+                parser.error(f"astro desconhecido: {nome}")
+            astros.append(astro)
+
+    if gerente is not None:
+        # Portas abertas e identificadas em paralelo; cada montagem com seu próprio núcleo
+        montagens = gerente.descobrir(args.porta)
+        if not montagens:
+            print("❌ Erro: Nenhuma montagem encontrada!", file=sys.stderr)
+            return 1
+        nucleos = dict(sorted(montagens.items()))
+        for identificador, n in nucleos.items():
+            print(f"✅ {identificador} conectada em {n.porta}")
+    else:
+        try:
+            porta = nucleo.conectar(args.porta or PORTAS_SERIAIS)
+        except ConnectionError as e:
+            print(f"❌ Erro: {e}", file=sys.stderr)
+            return 1
+        print(f"✅ Conectado em {porta}")
+        nucleos = {'': nucleo}
+
+    for n in nucleos.values():
+        n.definir_malha_fechada(not args.malha_aberta)
+        n.usar_segmentos = not args.sem_segmentos
+        if passagem is not None:
+            # Satélite: o núcleo já rastreia por SPEED a TAXA_SATELITE; o aviso de
+            # velocidade usa a passagem inteira, não só os próximos minutos
+            agora = time.time()
+            n.verificar_velocidade(passagem.nome, passagem.nascer or agora, passagem.ocaso or agora + args.horas * 3600)
+    prefixos = {i: f"[{i}] " if i else '' for i in nucleos}
+    gravadores = {}
+    if args.gravar:
+        for identificador, n in nucleos.items():
+            gravadores[identificador] = gravar(n, os.path.join(args.gravar, identificador))
+
+    try:
+        if args.calibrar:
+            for identificador, futuro in [(i, n.calibrar()) for i, n in nucleos.items()]:
+                futuro.result()
+                print(f"✅ {prefixos[identificador]}Norte e Altitude Calibrados!")
+
+        if sessao is not None:
+            sessao.start()
+        else:
+            if passagem is not None:
+                aguardar_passagem(nucleos, astros[0], passagem)
+            # Sem alvos suficientes, as montagens restantes seguem o último
+            apontar([(n, astros[min(k, len(astros) - 1)], prefixos[i])
+                     for k, (i, n) in enumerate(nucleos.items())])
+        if args.perfil:
+            threading.Thread(target=capturar_perfil, args=(args.perfil, args.arquivo_perfil),
+                             name="perfil", daemon=True).start()
+        duracao = args.duracao
+        if duracao is None and passagem is not None and passagem.ocaso is not None:
+            duracao = passagem.ocaso - time.time()  # Satélite: até o ocaso
+        inicio = time.monotonic()
+        while duracao is None or time.monotonic() - inicio < duracao:
+            if sessao is not None and not sessao.ativa:
+                break
+            time.sleep(INTERVALO_STATUS)
+            for identificador, n in nucleos.items():
+                snapshot = ultimo_snapshot(n.tracker)
+                if snapshot is not None and n.tracker.ativo:
+                    imprimir_status(snapshot, prefixos[identificador])
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"❌ Erro: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if sessao is not None:
+            sessao.stop()
+        # Garante o STOP escrito antes de fechar as portas
+        for futuro in [n.parar() for n in nucleos.values()]:
+            try:
+                futuro.result(timeout=2)
+            except Exception:
+                pass
+        for identificador, gravador in gravadores.items():
+            nucleos[identificador].gravar(None)
+            gravador.fechar()
+            print(f"{prefixos[identificador]}{gravador.registros} registros gravados em {gravador.diretorio}")
+        for n in nucleos.values():
+            n.desconectar()
+        if args.diagnostico:
+            print(f"Tempos gravados em {metricas.exportar(args.diagnostico)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
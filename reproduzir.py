@@ -0,0 +1,45 @@
+import argparse
+import json
+import sys
+
+from gravacao import TelemetryRecording, reproduzir
+
+def imprimir(nome, resumo, unidade='"'):
+    if resumo['n'] == 0:
+        print(f"{nome}: sem amostras")
+        return
+    print(f"{nome}: RMS {resumo['rms']:.1f}{unidade} | max {resumo['max']:.1f}{unidade} | "
+          f"tendência {resumo['tendencia_por_minuto']:+.2f}{unidade}/min ({resumo['n']} ticks)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduz uma sessão gravada (rastrear.py --gravar) mais rápido que o tempo real")
+    parser.add_argument('gravacao', help="diretório da gravação")
+    parser.add_argument('--velocidade', type=float, default=0.0,
+                        help="fator sobre o tempo real (padrão: 0, sem espera)")
+    parser.add_argument('--json', help="grava o resumo neste arquivo")
+    args = parser.parse_args()
+
+    try:
+        gravacao = TelemetryRecording(args.gravacao)
+    except FileNotFoundError as e:
+        print(f"❌ Erro: {e}", file=sys.stderr)
+        return 1
+
+    resultado = reproduzir(gravacao, velocidade=args.velocidade)
+    contagem = ", ".join(f"{n} {tipo}" for tipo, n in resultado['registros'].items() if n)
+    print(f"{len(gravacao.blocos)} blocos, {contagem or 'nenhum registro'} "
+          f"em {resultado['duracao_reproducao']:.2f} s")
+    imprimir("Erro de apontamento gravado", resultado['erro_gravado'])
+    imprimir("Alvo gravado x efemérides atuais", resultado['efemerides'])
+    imprimir("Comando atual x gravado (alt)", resultado['comando_alt'], '"/s')
+    imprimir("Comando atual x gravado (azi)", resultado['comando_azi'], '"/s')
+    if resultado['alvos_ignorados']:
+        print(f"Sem efemérides para: {', '.join(resultado['alvos_ignorados'])}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+import heapq
+import math
+import struct
+import binascii
+import threading
+import time
+from collections import deque
+
+from nucleo import (
+    SYNC_QUADRO, CABECALHO_QUADRO, REGISTRO_QUADRO, MAX_REGISTROS_QUADRO,
+    COMANDOS_BINARIOS, VERSAO_PROTOCOLO, FATOR_VELOCIDADE
+)
+
+# Constantes do sketch (readmeArduino.md)
+STEPS_PER_REV = 25000.0
+STEPS_PER_DEGREE = STEPS_PER_REV / 360.0
+VELOCIDADE_MAXIMA = 5.0   # passos/s (setMaxSpeed)
+ACELERACAO = 0.2          # passos/s² (setAcceleration)
+TOLERANCE = 0.1           # graus
+TAMANHO_FILA = 16         # segmentos aguardando o horário de início
+
+# Enlace serial simulado
+BAUD = 115200
+LATENCIA_SERIAL = 0.002   # segundos de atraso fixo em cada sentido (USB/driver)
+
+CODIGOS_COMANDOS = {codigo: nome for nome, codigo in COMANDOS_BINARIOS.items()}
+
+# Eixo de passo com o comportamento do AccelStepper usado no sketch
+class Eixo:
+    def __init__(self, velocidade_maxima=VELOCIDADE_MAXIMA, aceleracao=ACELERACAO):
+        self.velocidade_maxima = velocidade_maxima
+        self.aceleracao = aceleracao
+        self.posicao = 0.0      # passos (contínuo; currentPosition() trunca)
+        self.velocidade = 0.0   # passos/s em modo runSpeed
+        self._instante = time.monotonic()
+
+    def avancar(self, agora):
+        self.posicao += self.velocidade * (agora - self._instante)
+        self._instante = agora
+
+    def definir_velocidade(self, agora, velocidade):
+        # setSpeed() limita ao setMaxSpeed()
+        self.avancar(agora)
+        self.velocidade = max(min(velocidade, self.velocidade_maxima), -self.velocidade_maxima)
+
+    def parar(self, agora):
+        self.avancar(agora)
+        self.velocidade = 0.0
+
+    def posicionar(self, agora, passos):
+        self.posicao = float(passos)
+        self.velocidade = 0.0
+        self._instante = agora
+
+    def passos(self):
+        return int(self.posicao)
+
+    def duracao_movimento(self, alvo):
+        # Perfil trapezoidal (ou triangular) do moveTo()/run() partindo do repouso
+        distancia = abs(alvo - self.posicao)
+        if distancia == 0:
+            return 0.0
+        if distancia >= self.velocidade_maxima ** 2 / self.aceleracao:
+            return distancia / self.velocidade_maxima + self.velocidade_maxima / self.aceleracao
+        return 2 * math.sqrt(distancia / self.aceleracao)
+
+class VirtualMount:
+    """Montagem simulada com interface de porta pyserial e o protocolo do sketch.
+
+    Modela os dois eixos (velocidade máxima, aceleração, STEPS_PER_DEGREE),
+    o POS bloqueante do firmware e a latência/banda da serial nos dois sentidos.
+    """
+    def __init__(self, passos_por_grau=STEPS_PER_DEGREE, velocidade_maxima=VELOCIDADE_MAXIMA,
+                 aceleracao=ACELERACAO, latencia=LATENCIA_SERIAL, baud=BAUD, timeout=1.0, port='SIM'):
+        self.port = port
+        self.timeout = timeout
+        self.is_open = True
+        self.passos_por_grau = passos_por_grau
+        self.latencia = latencia
+        self.tempo_byte = 10.0 / baud  # 8N1: 10 bits por byte
+
+        # Mesmo mapeamento do sketch: motorVert recebe o 1º campo do POS
+        # (azimute do host) e motorHoriz o 2º (altitude)
+        self.vert = Eixo(velocidade_maxima, aceleracao)
+        self.horiz = Eixo(velocidade_maxima, aceleracao)
+        self.rastreando = False
+        self.fila = deque()        # segmentos (t_ms, campo1, campo2) do SEG
+        self.bytes_recebidos = 0   # tráfego host -> montagem, para os benchmarks
+        self._t0 = time.monotonic()  # origem do millis()
+
+        self._cond = threading.Condition()
+        self._agendados = []    # (instante, ordem, para_montagem, dados)
+        self._ordem = 0
+        self._livre_ida = 0.0   # fim da última transmissão host -> montagem
+        self._livre_volta = 0.0  # fim da última transmissão montagem -> host
+        self._entrada = bytearray()
+        self._saida = bytearray()
+        self._ocupado_ate = 0.0
+        self._conclusao = None  # POS em andamento: (instante, alvo_vert, alvo_horiz, campo1, campo2)
+
+        with self._cond:
+            self._responder(time.monotonic(), "Sistema de rastreamento pronto. Aguardando comandos...")
+        self._thread = threading.Thread(target=self._executar, name="montagem-simulada", daemon=True)
+        self._thread.start()
+
+    # Interface de porta serial (subconjunto usado por SerialLink/SerialReader)
+
+    @property
+    def in_waiting(self):
+        with self._cond:
+            return len(self._saida)
+
+    def write(self, dados):
+        agora = time.monotonic()
+        with self._cond:
+            self.bytes_recebidos += len(dados)
+            self._livre_ida = max(agora + self.latencia, self._livre_ida) + len(dados) * self.tempo_byte
+            self._agendar(self._livre_ida, True, bytes(dados))
+        return len(dados)
+
+    def read(self, n=1):
+        limite = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._cond:
+            while not self._saida and self.is_open:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return b''
+                self._cond.wait(restante)
+            dados = bytes(self._saida[:n])
+            del self._saida[:n]
+            return dados
+
+    def close(self):
+        with self._cond:
+            self.is_open = False
+            self._cond.notify_all()
+
+    # Estado real da montagem, para os benchmarks
+
+    def posicao_real(self):
+        """(alt, azi) em graus no referencial da montagem, no instante atual."""
+        agora = time.monotonic()
+        with self._cond:
+            self.vert.avancar(agora)
+            self.horiz.avancar(agora)
+            return self.horiz.posicao / self.passos_por_grau, self.vert.posicao / self.passos_por_grau
+
+    def definir_posicao(self, alt, azi):
+        # Equivale a uma montagem já apontada e calibrada nesta posição
+        agora = time.monotonic()
+        with self._cond:
+            self.vert.posicionar(agora, azi * self.passos_por_grau)
+            self.horiz.posicionar(agora, alt * self.passos_por_grau)
+
+    # Simulação
+
+    def _agendar(self, instante, para_montagem, dados):
+        self._ordem += 1
+        heapq.heappush(self._agendados, (instante, self._ordem, para_montagem, dados))
+        self._cond.notify_all()
+
+    def _responder(self, agora, texto):
+        # Serial.println() do firmware: "\r\n" no fim, entregue após latência e transmissão
+        dados = (texto + "\r\n").encode('utf-8')
+        self._livre_volta = max(agora, self._livre_volta) + len(dados) * self.tempo_byte
+        self._agendar(self._livre_volta + self.latencia, False, dados)
+
+    def _executar(self):
+        with self._cond:
+            while self.is_open:
+                agora = time.monotonic()
+                while self._agendados and self._agendados[0][0] <= agora:
+                    _, _, para_montagem, dados = heapq.heappop(self._agendados)
+                    if para_montagem:
+                        self._entrada += dados
+                    else:
+                        self._saida += dados
+                        self._cond.notify_all()
+
+                if self._conclusao is not None and agora >= self._conclusao[0]:
+                    self._concluir_movimento()
+                if agora >= self._ocupado_ate:
+                    self._processar(agora)
+                    self._executar_fila(agora)
+
+                proximos = [self._agendados[0][0]] if self._agendados else []
+                if self._conclusao is not None:
+                    proximos.append(self._conclusao[0])
+                if self.fila:
+                    proximos.append(self._instante_millis(self.fila[0][0]))
+                espera = min(proximos) - time.monotonic() if proximos else 0.05
+                self._cond.wait(min(max(espera, 0.0), 0.05))
+
+    def _processar(self, agora):
+        while self._entrada and agora >= self._ocupado_ate:
+            if self._entrada[0] == SYNC_QUADRO[0]:
+                if len(self._entrada) < 6:
+                    return
+                n = self._entrada[5]
+                if self._entrada[1] != SYNC_QUADRO[1] or not 0 < n <= MAX_REGISTROS_QUADRO:
+                    seq = self._entrada[3] | (self._entrada[4] << 8)
+                    del self._entrada[:6]
+                    self._responder(agora, f"Erro: Quadro inválido {seq}")
+                    continue
+                total = 6 + n * REGISTRO_QUADRO.size + 2
+                if len(self._entrada) < total:
+                    return
+                quadro = bytes(self._entrada[:total])
+                del self._entrada[:total]
+                self._executar_quadro(agora, quadro)
+            else:
+                fim = self._entrada.find(b'\n')
+                if fim < 0:
+                    return
+                linha = self._entrada[:fim].decode('utf-8', errors='replace').strip()
+                del self._entrada[:fim + 1]
+                self._executar_texto(agora, linha)
+
+    def _executar_texto(self, agora, linha):
+        partes = linha.split(',')
+        try:
+            if partes[0] in ('POS', 'SPEED') and len(partes) == 3:
+                self._executar_comando(agora, partes[0], float(partes[1]), float(partes[2]))
+            elif partes[0] == 'SEG' and len(partes) == 4:
+                self._executar_comando(agora, 'SEG', float(partes[2]), float(partes[3]), int(partes[1]))
+            elif linha in ('CALIBRATE', 'STOP', 'FILA'):
+                self._executar_comando(agora, linha, 0.0, 0.0)
+            elif linha == 'PROTO':
+                self._responder(agora, f"PROTO {VERSAO_PROTOCOLO}")
+            elif linha == 'ID':
+                # IDENTIFICADOR do sketch; cada porta simulada é uma montagem
+                self._responder(agora, f"ID montagem-{self.port.lower()}")
+        except ValueError:
+            pass  # toFloat() do Arduino devolveria 0; aqui a linha é ignorada
+
+    def _executar_quadro(self, agora, quadro):
+        versao, seq, n = CABECALHO_QUADRO.unpack_from(quadro, 2)
+        corpo = quadro[2:-2]
+        crc, = struct.unpack_from('<H', quadro, len(quadro) - 2)
+        if not 1 <= versao <= VERSAO_PROTOCOLO:
+            self._responder(agora, f"Erro: Quadro inválido {seq}")
+            return
+        if binascii.crc_hqx(corpo, 0xFFFF) != crc:
+            self._responder(agora, f"Erro: CRC {seq}")
+            return
+        for i in range(n):
+            codigo, t_ms, a, b = REGISTRO_QUADRO.unpack_from(quadro, 6 + i * REGISTRO_QUADRO.size)
+            nome = CODIGOS_COMANDOS.get(codigo)
+            if nome is not None:
+                self._executar_comando(agora, nome, a, b, t_ms)
+
+    def _executar_comando(self, agora, nome, a, b, t_ms=0):
+        if nome == 'POS':
+            self.fila.clear()
+            self._iniciar_movimento(agora, a, b)
+        elif nome == 'SPEED':
+            self.fila.clear()
+            self._aplicar_velocidade(agora, a, b)
+            self._informar_posicao(agora)
+        elif nome == 'SEG':
+            if len(self.fila) >= TAMANHO_FILA:
+                self._responder(agora, "Erro: Fila cheia")
+            else:
+                self.fila.append((t_ms, a, b))
+        elif nome == 'FILA':
+            self._responder(agora, f"FILA {TAMANHO_FILA - len(self.fila)} {self._millis(agora)}")
+            self._informar_posicao(agora)
+        elif nome == 'CALIBRATE':
+            self.vert.posicionar(agora, 0)
+            self.horiz.posicionar(agora, 0)
+            self._responder(agora, "Calibração concluída")
+        elif nome == 'STOP':
+            self.fila.clear()
+            self.rastreando = False
+            self.vert.parar(agora)
+            self.horiz.parar(agora)
+            self._responder(agora, "Parada de emergência!")
+
+    def _aplicar_velocidade(self, agora, campo1, campo2):
+        # motorHoriz segue a altitude (1º campo), motorVert o azimute (2º)
+        self.horiz.definir_velocidade(agora, campo1 / FATOR_VELOCIDADE * self.passos_por_grau)
+        self.vert.definir_velocidade(agora, campo2 / FATOR_VELOCIDADE * self.passos_por_grau)
+        self.rastreando = True
+
+    def _informar_posicao(self, agora):
+        # reportPosition() do sketch
+        self.vert.avancar(agora)
+        self.horiz.avancar(agora)
+        self._responder(agora, "Posição -> Alt: {:.4f}° | Azi: {:.4f}".format(
+            self.vert.passos() / self.passos_por_grau, self.horiz.passos() / self.passos_por_grau))
+
+    def _millis(self, agora):
+        return int((agora - self._t0) * 1000) & 0xFFFFFFFF
+
+    def _instante_millis(self, t_ms):
+        # Sem volta do contador: uma simulação não dura 49 dias
+        return self._t0 + t_ms / 1000.0
+
+    def _executar_fila(self, agora):
+        # executarFila() do sketch: segmentos vencidos entram em vigor no próprio horário
+        while self.fila and self._instante_millis(self.fila[0][0]) <= agora:
+            t_ms, campo1, campo2 = self.fila.popleft()
+            self._aplicar_velocidade(max(self._instante_millis(t_ms), self.horiz._instante, self.vert._instante), campo1, campo2)
+
+    def _iniciar_movimento(self, agora, campo1, campo2):
+        self.rastreando = False
+        self.vert.parar(agora)
+        self.horiz.parar(agora)
+        self._responder(agora, f"Recebido -> Alt: {campo1:.2f}° | Azi: {campo2:.2f}")
+
+        alvo_vert = int(campo1 * self.passos_por_grau)
+        alvo_horiz = int(campo2 * self.passos_por_grau)
+        limite = 360.0 * self.passos_por_grau
+        if abs(alvo_vert) > limite or abs(alvo_horiz) > limite:
+            self._responder(agora, "Erro: Posição fora dos limites!")
+            return
+
+        # O firmware move um eixo por vez e não lê a serial até terminar
+        duracao = self.horiz.duracao_movimento(alvo_horiz) + self.vert.duracao_movimento(alvo_vert)
+        self._ocupado_ate = agora + duracao
+        self._conclusao = (self._ocupado_ate, alvo_vert, alvo_horiz, campo1, campo2)
+
+    def _concluir_movimento(self):
+        instante, alvo_vert, alvo_horiz, campo1, campo2 = self._conclusao
+        self._conclusao = None
+        self.vert.posicionar(instante, alvo_vert)
+        self.horiz.posicionar(instante, alvo_horiz)
+
+        atual_vert = alvo_vert / self.passos_por_grau
+        atual_horiz = alvo_horiz / self.passos_por_grau
+        self._responder(instante, f"Posição atingida -> Alt: {atual_vert:.2f}° | Azi: {atual_horiz:.2f}")
+        if abs(campo2 - atual_horiz) <= TOLERANCE and abs(campo1 - atual_vert) <= TOLERANCE:
+            self._responder(instante, "Posição atingida (dentro da tolerância)!")
+        else:
+            self._responder(instante, "Posição não atingida (fora da tolerância)!")